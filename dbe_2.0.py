@@ -27,6 +27,7 @@
 import pandas as pd
 import datetime                  
 import numpy as np
+import dbe_grid
 #import math 
 #import json
 
@@ -45,7 +46,11 @@ eodDataFile = "snp500data_2019-6-18.xlsx"
 sheet = "Data"
 
 # Reads in col headings as str. 
-origDataDF =  pd.read_excel(eodDataFile, sheet, index_col = 0)    
+# The spreadsheet is only parsed the first time. After that it is loaded from
+# a binary copy in .dbe_cache, which is rebuilt if the spreadsheet changes
+# (see dbe_data.py). The dataframe is read-only.
+import dbe_data
+origDataDF = dbe_data.loadPrices(eodDataFile, sheet)
 
 # Do this if you want a smaller dataset for testing, checking post-discovery
 # results, etc.
@@ -55,13 +60,14 @@ origDataDF =  pd.read_excel(eodDataFile, sheet, index_col = 0)
 #   Should include date, open, high, low, close, adjusted close, and volume.
 #   If you imported data from a spreadsheet above don't run this cell.
 
-# Import module to download stock prices from Yahoo!
-import pandas_datareader as web 
+# Import module that keeps downloaded stock prices on disk
+import dbe_prices
 
 # NOTE: this cell need not be run every time a parameter is changed, as the
 # data in this dataframe is not changed elsewhere in the program. Only run
 # this cell when parameters for this cell are changed! Otherwise you are
-# querying Yahoo for data unnecessarily.
+# querying Yahoo for data unnecessarily. The prices are kept in a local
+# store (.dbe_prices), so running it again only downloads the new days.
 
 # Cell Parameters
 tkr = '^IXIC'     # Stock ticker that data will be downloaded for
@@ -73,8 +79,16 @@ tkr = '^IXIC'     # Stock ticker that data will be downloaded for
 startDate = datetime.date(1971, 2, 1)   # start date (yr, mo, day)
 endDate = datetime.date(2019, 8, 2)      # end date
 
-# Download data. Most recent data is on bottom.
-origDataDF = web.DataReader(tkr, 'yahoo', startDate, endDate)
+# Download new data into the store and load it. Most recent data is on
+# bottom.
+refreshed = dbe_prices.refresh([tkr], dbe_prices.YahooProvider(),
+                              start=startDate, end=endDate)
+print(refreshed)
+origDataDF = dbe_prices.loadTicker(tkr)
+if origDataDF is None:
+    raise RuntimeError('No stored data for {}: {}'.format(
+        tkr, refreshed['error'].iloc[0]))
+origDataDF = origDataDF.loc[pd.Timestamp(startDate):pd.Timestamp(endDate)]
 
 #%% Parameters
 reentryPct = 0.01     # If the price drops below (reentryPct * most recent New 
@@ -87,150 +101,122 @@ K = 250               # Starting point for calculations. Should be at least
 series = 'Adj Close'  # Can use 'Close', 'High', 'Low', 'Open', 'Adj Close'
                       # For indices 'Close' = 'Adj Close' (I think)
 
+# The calculations below work on plain NumPy arrays: True/False (bool) and
+# small integer (int8) arrays instead of dataframe columns of 'bull'/'bear'
+# strings and mixed True/False/NaN objects. That takes a fraction of the
+# memory and every comparison is done in C. The labeled dataframe eodDF is
+# only built at the end, for printing and writing to Excel.
+prices = origDataDF[series].values.astype(np.float64)
+low = origDataDF['Low'].values.astype(np.float64)
+adjClose = origDataDF['Adj Close'].values.astype(np.float64)
+numDays = len(prices)
+
 ###################################################                  
 # Have we had a new M-day high in the last N days?
 
-# First copy original downloaded data into new dataframe so we get clean data
-# each time we rerun this cell.                      
-eodDF = origDataDF.copy(deep = True)
-
 # Find new M-day highs (True) and calculate reentry price
-eodDF['MdayHi'] = eodDF[series].rolling(M).max()
-eodDF['newHi'] = np.where(eodDF[series] == eodDF['MdayHi'], True, False)
-eodDF['rePt'] = reentryPct*eodDF['MdayHi']
-
-# Count days since last new M-day high.  
-# I found this soln on Stack Overflow. 
-# First run comparison to find where new contiguous groups begin (True)
-eodDF['dSinceNewHi'] = (eodDF['newHi'] != eodDF['newHi'].shift(1))
+MdayHi = dbe_grid.rollingMax(prices, M)
+newHi = prices == MdayHi
+rePt = reentryPct*MdayHi
 
-# Now use cumsum() (cummulative sum) to count the number of "groups"
-eodDF['dSinceNewHi'] = eodDF['dSinceNewHi'].cumsum()
+# Count days since last new M-day high. 0 on a new high. Before the first new
+# high we count from the first day of data.
+dSinceNewHi = dbe_grid.daysSinceNewHi(newHi)
 
-# Now groupby() with cumcount() to form running count of each group. This 
-# counts first occurance as 0, which is correct when we transition to a new
-# high (Trues), but is 1 too small when we transistion to "not a new high" 
-# (false). We are counting days since a new high (Falses) so add 1.
-eodDF['dSinceNewHi'] = eodDF.groupby('dSinceNewHi').cumcount() + 1
-
-# Finally, all occurances of 'True' in 'newHi' col yield a corresponding 0 in
-# 'dSinceNewHi' col.
-eodDF.loc[eodDF['newHi'] == True, 'dSinceNewHi'] = 0
-
-# Have we had a new M-day high in the last N days?
-eodDF.loc[eodDF['dSinceNewHi'] < N, 'signal'] = 'bull'  
-eodDF.loc[eodDF['signal'] != 'bull', 'signal'] = 'bear'  
+# Have we had a new M-day high in the last N days? True = 'bull'
+bull = dSinceNewHi < N
 
-# Erase any signals prior to start of tracking
-eodDF.loc[eodDF.index.values < eodDF.index.values[K], 'signal'] = np.nan
+# Signal codes: 1 = 'bull', 0 = 'bear', -1 = before start of tracking
+signal = np.where(np.arange(numDays) >= K, bull, -1).astype(np.int8)
 
 # IMPORTANT: we are assuming the signal is an end-of-day signal. So when
 # the signal changes from 'bear' to 'bull' we would purchase the tkr at market
 # close. We would therefor be in the market the following day. So there is a 
-# one-day lag between the signal and returns. The shift moves all signals
-# foward one day. We then change the wording: bull=True, bear=False.
-eodDF['inMkt'] = eodDF['signal'].shift(1)
-eodDF['inMkt'] = eodDF['inMkt'].where(eodDF['inMkt'] == 'bull', False)
-eodDF['inMkt'] = eodDF['inMkt'].where(eodDF['inMkt'] == False, True)
-
-# Set values to False prior to when we start tracking. First possible valid 
-# signal day occurs at index M+N, but we will not be in the market that day.
-eodDF.loc[eodDF.index.values <= eodDF.index.values[K], 'inMkt'] = False
+# one-day lag between the signal and returns. 
+# We are not in the market on or before the day we start tracking (K). First
+# possible valid signal day occurs at index M+N.
+inMkt = np.zeros(numDays, dtype = bool)
+inMkt[K+1:] = bull[K:-1]
 
 ############################################################################
 # Now we calculate reetnry points due to price crossing below user set 
 # threashold. This will trigger if the signal is bear but the price has dropped
 # below a user set percent of the most recent new high. We will then get back 
 # into the market and stay there until a new high is reached again. 
-
-# Create new column in dataframe, populate with NaN
-eodDF['reentrySignal'] = np.nan      
-
-# Retrieve indexes where price is below reentry point and signal is 'bear'. 
-# If the signal rises above the reentry point while the signal is still 'bear'
-# that will not be captured here, so we will forward fill below.
-idxList = eodDF.loc[
-            (eodDF.Low < eodDF.rePt) & (eodDF.signal == 'bear')].index
-
-# We want to be in the market on these days        
-eodDF.loc[idxList, 'reentrySignal'] = True 
-
-# Marker for a new high; turn off reentrySignal
-eodDF.loc[eodDF.dSinceNewHi == 0, 'reentrySignal'] = False
-
-# Now forward fill. True will forward fill until we hit the False marker.
-# False will forward fill until it hits a True.
-eodDF['reentrySignal'] = eodDF['reentrySignal'].fillna(method = 'ffill')
-
-# All is good except that we need to extend the sequence of Trues by 1 so that
-# we can transfer them to the inMkt column. Otherwise we'll be in the market
-# until we hit a new high (good) and then we will be out one day (bad) before
-# jumping back in. 
-
-# This gets the True where we need it.
-eodDF['reentrySignal'] = ( eodDF['reentrySignal'] + 
-                           eodDF['reentrySignal'].shift(1) )
-
-# But now we have a bunch of 2s that should be 1s. Fix that.
-eodDF.loc[ eodDF['reentrySignal'] == 2, 'reentrySignal' ] = 1
-
-# Not necessary, but change back to Trues and Falses
-eodDF.loc[ eodDF['reentrySignal'] == 0, 'reentrySignal' ] = False
-eodDF.loc[ eodDF['reentrySignal'] == 1, 'reentrySignal' ] = True
+# The day after a new high is reached we are still in the market, same as
+# before. See reentryGrid() in dbe_grid.py for how this is done without the
+# forward fill.
+dip = dbe_grid.dipGrid(low, MdayHi, [reentryPct])
+reentrySignal = dbe_grid.reentryGrid(dSinceNewHi, dip, [N], K)[0, 0]
 
 # Now copy the Trues over the inMkt column
-eodDF.loc[ eodDF['reentrySignal'] == True, 'inMkt' ] = True
+inMkt |= reentrySignal
 
 
 #%%###############################
 # Calculate returns and statistics
 
-# Calculate daily tkr returns. shift(1) is previous day's data
-eodDF['tkrRtnDay'] = eodDF['Adj Close']/eodDF['Adj Close'].shift(1) 
+# Calculate daily tkr returns. Day 0 has no previous day (NaN)
+tkrRtnDay = dbe_grid.dailyReturns(adjClose)
 
 # Calculate running return. Note that first valid sell signal occurs at least
 # M+N days after first day of data. Must estable M-day hi followed by N days
 # w/o a new M-day hi. So this col only makes sence for index location 
 # past M+N
-eodDF['tkrCumRtn'] = eodDF['Adj Close']/eodDF['Adj Close'][K]
+tkrCumRtn = adjClose/adjClose[K]
 
 # Calculate running CAGR. 
 # Intermediate calculatioin: years since starting date at M+N index
-days_per_yr = 365.2422
-eodDF['yrs'] = (eodDF.index.values - eodDF.index.values[K]).astype(
-               'timedelta64[D]') / (days_per_yr * np.timedelta64(1, 'D'))
-eodDF['tkrCAGR'] = eodDF['tkrCumRtn']**(1 / eodDF['yrs'])
+yrs = dbe_grid.yearsSince(origDataDF.index.values, K)
+with np.errstate(divide = 'ignore', invalid = 'ignore'):
+    tkrCAGR = tkrCumRtn**(1 / yrs)
 
 # Calculate daily return for algorithm. Same as return for ticker, except 1
 # when inMkt is False
-eodDF['dbeRtnDay'] = eodDF['tkrRtnDay'].where(eodDF['inMkt'] == True, 1) 
+dbeRtnDay = np.where(inMkt, tkrRtnDay, 1.0)
 
-# Calculate cumulative return starting at index K. To do this we will shift
-# returns prior to K "off" the dataframe, then use the "cumprod()" fcn,
-# then shift the cumulative product back into place. This will create "Not a
-# Number" (NaN) entries prior to index K, which is probably a good thing,
-# since those calculations would not be valid anyway.
-eodDF['dbeCumRtn'] = eodDF['dbeRtnDay'].shift(-K).cumprod().shift(K)
+# Calculate cumulative return starting at index K. Entries prior to index K
+# are "Not a Number" (NaN), since those calculations would not be valid.
+dbeCumRtn = dbe_grid.cumRtnGrid(inMkt[np.newaxis, :], tkrRtnDay, K)[0]
 
 # Calculate algorithm CAGR
-eodDF['dbeCAGR'] = eodDF['dbeCumRtn']**(1 / eodDF['yrs'])
+with np.errstate(divide = 'ignore', invalid = 'ignore'):
+    dbeCAGR = dbeCumRtn**(1 / yrs)
 
 # Calculate mean trades per year
-# Determine when trades took place
-eodDF['trade'] = eodDF['inMkt'].shift(-1) - eodDF['inMkt']
-
-# Erase any trades that occured before we start tracking
-eodDF.loc[eodDF.index.values < eodDF.index.values[K], 'trade'] = 0
+# Determine when trades took place: +1 buy, -1 sell. Only count trades from
+# the start of tracking on.
+trade = np.zeros(numDays, dtype = np.int8)
+trade[K:-1] = np.diff(inMkt[K:].astype(np.int8))
 
-# Sum trades: Take absolute value then add
-tradesPerYr = eodDF.trade.abs().sum() / eodDF['yrs'].iloc[-1]
+# Sum trades: count nonzero entries
+tradesPerYr = np.count_nonzero(trade) / yrs[-1]
 
 # Calculate percent of time in the market
 # Count 'bull' and 'bear' days and calculate percent.
-numBulls = len(eodDF[eodDF['signal'] == 'bull'])
-numBears = len(eodDF[eodDF['signal'] == 'bear'])
+numBulls = np.count_nonzero(signal == 1)
+numBears = np.count_nonzero(signal == 0)
 pctInMkt = 100 * numBulls / (numBulls + numBears)
 
+# Labeled view for printing, plotting and writing to Excel. signal becomes
+# 'bull'/'bear' (NaN before tracking starts), stored as a categorical.
+eodDF = origDataDF.copy(deep = True)
+eodDF['MdayHi'] = MdayHi
+eodDF['newHi'] = newHi
+eodDF['rePt'] = rePt
+eodDF['dSinceNewHi'] = dSinceNewHi
+eodDF['signal'] = dbe_grid.signalLabels(signal)
+eodDF['inMkt'] = inMkt
+eodDF['reentrySignal'] = reentrySignal
+eodDF['tkrRtnDay'] = tkrRtnDay
+eodDF['tkrCumRtn'] = tkrCumRtn
+eodDF['yrs'] = yrs
+eodDF['tkrCAGR'] = tkrCAGR
+eodDF['dbeRtnDay'] = dbeRtnDay
+eodDF['dbeCumRtn'] = dbeCumRtn
+eodDF['dbeCAGR'] = dbeCAGR
+eodDF['trade'] = trade
+
 #################################
 # Print parameters and statistics
 #print('Tkr = ', tkr)
@@ -238,73 +224,161 @@ print('M = ', M)
 print('N = ', N)
 print('K = ', K)
 print('Reentry Pct = ', reentryPct)
-print('Tkr CAGR = ', eodDF['tkrCAGR'].iloc[-1])
-print('DBE CAGR = ', eodDF['dbeCAGR'].iloc[-1])
-print('Years = ', eodDF['yrs'].iloc[-1])
+print('Tkr CAGR = ', tkrCAGR[-1])
+print('DBE CAGR = ', dbeCAGR[-1])
+print('Years = ', yrs[-1])
 print('Trades/yr = ', tradesPerYr)
 print('Pct in mkt = ', pctInMkt, '%')
 
+#%%##############################################
+# Quick score. Final statistics and today's signal without building the
+# per-day columns above (see dbe_backtest.py). Columns are only computed
+# when asked for, e.g. bt.dbeCumRtn or bt.frame(['inMkt', 'dbeRtnDay']).
+# Run the parameters cell first.
+
+import dbe_backtest
+
+bt = dbe_backtest.DbeBacktest(origDataDF, M, N, K, reentryPct, series)
+print(bt.latest())
+print(bt.stats())
+
+#%%##############################################
+# Trade ledger: every round trip with entry/exit dates, days held, return
+# and whether the signal or the reentry rule got us in (see dbe_ledger.py).
+# Run the parameters cell first.
+
+import dbe_ledger
+
+ledgerDF = dbe_ledger.runLedger(origDataDF, [(M, N, reentryPct)], K, series)
+print(ledgerDF[['entryDate', 'exitDate', 'holdDays', 'rtn', 'reason',
+                'open']])
+print('Winning trades = ', 100 * (ledgerDF['rtn'] > 1).mean(), '%')
+
+#%%##############################################
+# Live signal. Instead of recomputing the whole history every day, keep the
+# state of the calculation in a file and feed it only the new bars (see
+# dbe_live.py). The first run replays the whole history once.
+
+import os
+import dbe_live
+
+# Parameters
+stateFile = 'dbeState.json'   # Saved state. Delete it if M, N, K, reentryPct
+                              # or series change.
+
+if os.path.exists(stateFile):
+    live = dbe_live.DbeSignal.load(stateFile)
+else:
+    live = dbe_live.DbeSignal(M, N, K, reentryPct)
+
+# Only feed bars after the last one we have seen
+newBars = origDataDF
+if live.lastDate is not None:
+    newBars = origDataDF[origDataDF.index.values > live.lastDate]
+rows = live.updateFromDF(newBars, series)
+live.save(stateFile)
+
+if rows:
+    print('Date = ', rows[-1]['date'])
+    print('Signal = ', rows[-1]['signal'])
+    print('In market = ', rows[-1]['inMkt'])
+print(live.stats())
+
+#%%##############################################
+# Check the live (one bar at a time) calculation against the batch
+# calculation above, bar for bar. Run the parameters cell first.
+
+import dbe_live
+
+live = dbe_live.DbeSignal(M, N, K, reentryPct)
+liveDF = pd.DataFrame(live.updateFromDF(origDataDF, series),
+                      index = origDataDF.index)
+
+checks = [
+    (liveDF['dSinceNewHi'].values == dSinceNewHi).all(),
+    (liveDF['signal'].map({'bull': 1, 'bear': 0}).fillna(-1).values
+     == signal).all(),
+    (liveDF['inMkt'].values == inMkt).all(),
+    (liveDF['reentrySignal'].values == reentrySignal).all(),
+    np.allclose(liveDF['dbeCumRtn'], dbeCumRtn, rtol = 1e-12,
+                equal_nan = True),
+    np.isclose(live.stats()['dbeCAGR'], dbeCAGR[-1]),
+    np.isclose(live.stats()['tradesPerYr'], tradesPerYr),
+    np.isclose(live.stats()['pctInMkt'], pctInMkt),
+    ]
+print('Live matches batch: ', all(checks), checks)
+
+#%%##############################################
+# Chunked run for histories too long to fit in memory (e.g. minute bars).
+# Reads the bars a chunk at a time from a binary store (see dbe_stream.py),
+# so memory use depends on chunkBars, not on the length of the data. Run the
+# parameters cell first.
+
+import dbe_stream
+
+# Parameters
+storePath = None      # Folder of a dbe_data binary store. None = run on
+                      # origDataDF, to check against the results above.
+chunkBars = 250000    # Bars per chunk
+
+if storePath is None:
+    chunks = dbe_stream.frameChunks(origDataDF, chunkBars)
+else:
+    chunks = dbe_stream.storeChunks(storePath, chunkBars)
+streamStats = dbe_stream.streamBacktest(chunks, M, N, K, reentryPct, series)
+print(streamStats)
+
+#%%##############################################
+# Robustness check. Runs the same M, N, K and reentryPct on many
+# block-bootstrapped price histories (see dbe_bootstrap.py) and prints the
+# spread of the results. Run the parameters cell first.
+
+import dbe_bootstrap
+
+# Parameters
+numPaths = 1000       # Number of bootstrapped histories
+blockDays = 20        # Length of the blocks of real days glued together
+seed = 0              # Same seed = same histories, to compare (M, N) values
+
+bootDF = dbe_bootstrap.bootstrap(origDataDF, M, N, K, reentryPct, numPaths,
+                                 blockDays, seed, series)
+bootStats, beat = dbe_bootstrap.summarize(bootDF)
+print(bootStats)
+print('Beat buy and hold on ', 100 * beat, '% of the histories')
+
 #%%############################################## 
-# Run this cell to write output to an Excel file.
-# Kind of slow, so probably don't want to run it
-# unless necessary.
+# Run this cell to write the per-day output to a file (see dbe_export.py).
+# .csv and .parquet are fast. .xlsx is slower but handy for sharing; it is
+# written in constant memory.
+
+import dbe_export
 
 # Parameters
-excelOut = 'dbeCalculations.xlsx'  # Excel file name
-sheetName = 'dbe'                  # Sheet name
+detailOut = 'dbeCalculations.csv'  # File name. Format from the extension.
+sheetName = 'dbe'                  # Sheet name (.xlsx only)
 
-# Write to Excel file
+# Write to file
 # If you don't know which folder this is writing to try typing "pwd" at the 
 # prompt. It should return the current working directory.
-writerObj = pd.ExcelWriter(excelOut)
-eodDF.to_excel(writerObj,'dbe' )       # writes to an excel sheet
-writerObj.save()                       # saves the excel workbook to disk
+dbe_export.exportDayDetail(detailOut, origDataDF, M, N, K, reentryPct,
+                           series, sheet = sheetName)
 
 #%%############################################## 
-# Second (improved) attempt at plotting returns. Trying unsucessfully to get 
-# rid of discontinuity.
+# Plot returns: red = out of market, green = in market, blue = buy and hold.
+# Each color is drawn as one batch of line segments, so the curve has no
+# gaps at the trades (see dbe_plot.py). Long date ranges are downsampled,
+# keeping every high, low and trade.
 
 # Import Modules
 import matplotlib.pyplot as plt
-
-# Definitions
-def plotFcn(group):
-    global ax
-    color = 'r' if (group['color'] < 1).all() else 'g'
-    ax.plot(group.index, group.dbe, c=color, linewidth=1)
+import dbe_plot
 
 # Pick starting, ending dates
 startDate = datetime.date(1951, 6, 1)  # start date (yr, mo, day)
 endDate = datetime.date(2019, 6, 1)     # end date
 
-# Create a new dataframe to hold graph data. Probably other ways to do it but 
-# I found this idea on Stack Overflow. The tricky part is getting the graph to
-# be two-colored; red = out of market, green = in market
-plotDF = pd.DataFrame()
-plotDF['dbe'] = eodDF[startDate : endDate]['dbeRtnDay'].cumprod() 
-plotDF['tkr'] = eodDF[startDate : endDate]['tkrRtnDay'].cumprod()
-
-# Create color map: red = 0, green = 1. Basically red where inMkt = False(0),
-# and green where inMkt = True(1).
-plotDF['color'] = eodDF[startDate : endDate]['inMkt']
-
-# Now find boundries. Make first entry a 0
-plotDF['bdry'] = plotDF['color'] - plotDF['color'].shift(1)
-plotDF['bdry'] = plotDF['bdry'].abs()
-plotDF.loc[ plotDF.index[0], 'bdry']  = 0
-
-# Calculate groups
-plotDF['groups'] = plotDF['bdry'].cumsum()
-
-# Plot returns
 fig, ax = plt.subplots()
-
-# plot of DBE. This throws out the endpoints of the sequences creating a 
-# non-continuous graph
-plotDF.groupby( plotDF['groups'] ).apply(plotFcn)
-
-# add "buy and hold"
-ax.plot(plotDF.index, plotDF.tkr, 'blue', linewidth=1)
+dbe_plot.plotDBE(eodDF, startDate, endDate, ax = ax)
 
 #%%##############################
 # Test code 2
@@ -313,54 +387,18 @@ for x in range(K, eodDF.shape[0]):
     print(eodDF['yrs'][x])
 
 #%%############################################## 
-# Initial attempt at plotting returns
+# Plot returns over a short period
 
 # Import Modules
 import matplotlib.pyplot as plt
-
-# Definitions
-def plotFcn(group):
-    global ax
-    color = 'r' if (group['color'] < 1).all() else 'g'
-    ax.plot(group.index, group.dbe, c=color, linewidth=1)
+import dbe_plot
 
 # Pick starting, ending dates
 startDate = datetime.date(2016, 3, 1)  # start date (yr, mo, day)
 endDate = datetime.date(2016, 7, 1)     # end date
 
-# Create a new dataframe to hold graph data. Probably other ways to do it but 
-# I found this idea on Stack Overflow. The tricky part is getting the graph to
-# be two-colored; red = out of market, green = in market
-plotDF = pd.DataFrame()
-plotDF['dbe'] = eodDF[startDate : endDate]['dbeRtnDay'].cumprod() 
-plotDF['tkr'] = eodDF[startDate : endDate]['tkrRtnDay'].cumprod()
-
-# Create color map: red = -1, green = 1. Basically red where inMkt = False(0),
-# and green where inMkt = True(1), but we want to tack an extra False onto the 
-# beginning of the False sequence due to the lag in reacting to the signal.
-plotDF['color'] = eodDF[startDate : endDate]['inMkt']
-
-# Close, but now we need to tack on that extra False to the begining. This
-# creates sequences of 0s and 2s with a single 1 seperating each sequence.
-# Also, last entry is NaN. Change that to have same value as penultimate entry
-plotDF['color'] = plotDF['color'] + plotDF['color'].shift(-1)
-plotDF.loc[ plotDF.index[-1], 'color']  = plotDF['color'].iloc[-2]
-
-# Now each sequence (0s or 2s) is seperated by a 1. Change the 1s to 0s, then 
-# subtract 1 from everything.
-plotDF['color'] = plotDF['color'].where( plotDF['color'] != 1, 0)
-plotDF['color'] = plotDF['color'] - 1
-
-# Plot returns
 fig, ax = plt.subplots()
-
-# plot of DBE. This throws out the endpoints of the sequences creating a 
-# non-continuous graph
-plotDF.groupby( (plotDF['color'] * plotDF['color'].shift(1) < 0
-                 ).cumsum() ).apply(plotFcn)
-
-# add "buy and hold"
-ax.plot(plotDF.index, plotDF.tkr, 'k', linewidth=1)
+dbe_plot.plotDBE(eodDF, startDate, endDate, ax = ax)
 
 #%%#########################
 
@@ -0,0 +1,183 @@
+# Single-configuration DBE backtest with columns computed on request.
+
+# dbe_2.0.py (and dbe_export.detailColumns) builds about twenty per-day
+# columns for one (M, N, reentryPct), including several that are only for
+# looking at: MdayHi, rePt, yrs, tkrCAGR and dbeCAGR (a power per day),
+# trade, ... When all we want is the final CAGR and today's signal, most of
+# that work is thrown away.
+
+# DbeBacktest holds the price data and the parameters and computes each
+# column the first time it is asked for (and keeps it). Columns only pull in
+# the columns they depend on, e.g. inMkt needs dSinceNewHi but never the
+# CAGR series. stats() takes the summary numbers straight from inMkt and the
+# daily returns, the same way dbe_grid.gridStats does, without building any
+# per-day CAGR or cumulative return series.
+#
+#   bt = dbe_backtest.DbeBacktest(origDataDF, M, N, K, reentryPct)
+#   bt.stats()['dbeCAGR']        # summary only
+#   bt.latest()['signal']        # today's call
+#   bt.dbeCumRtn                 # one column, and what it needs
+#   bt.frame(['inMkt', 'dbeRtnDay'])   # eodDF with just these columns
+
+# Import Modules
+from functools import cached_property
+import numpy as np
+import dbe_grid
+
+# Per-day columns, in the order of eodDF in dbe_2.0.py
+detailNames = ['MdayHi', 'newHi', 'rePt', 'dSinceNewHi', 'signal', 'inMkt',
+               'reentrySignal', 'tkrRtnDay', 'tkrCumRtn', 'yrs', 'tkrCAGR',
+               'dbeRtnDay', 'dbeCumRtn', 'dbeCAGR', 'trade']
+
+
+class DbeBacktest:
+
+    def __init__(self, origDataDF, M, N, K, reentryPct=0,
+                 series='Adj Close'):
+        # Parameters (same meaning as in dbe_2.0.py)
+        self.origDataDF = origDataDF
+        self.M = M
+        self.N = N
+        self.K = K
+        self.reentryPct = reentryPct
+        self.series = series
+
+    # Inputs
+
+    @cached_property
+    def prices(self):
+        return self.origDataDF[self.series].values.astype(np.float64)
+
+    @cached_property
+    def adjClose(self):
+        return self.origDataDF['Adj Close'].values.astype(np.float64)
+
+    # New highs and the signal
+
+    @cached_property
+    def MdayHi(self):
+        return dbe_grid.rollingMax(self.prices, self.M)
+
+    @cached_property
+    def newHi(self):
+        return self.prices == self.MdayHi
+
+    @cached_property
+    def rePt(self):
+        return self.reentryPct * self.MdayHi
+
+    @cached_property
+    def dSinceNewHi(self):
+        return dbe_grid.daysSinceNewHi(self.newHi)
+
+    # True = 'bull', for every day (also before K)
+    @cached_property
+    def bull(self):
+        return self.dSinceNewHi < self.N
+
+    # int8 code (1 = 'bull', 0 = 'bear', -1 = not tracked before K)
+    @cached_property
+    def signal(self):
+        signal = self.bull.astype(np.int8)
+        signal[:self.K] = -1
+        return signal
+
+    @cached_property
+    def reentrySignal(self):
+        if not self.reentryPct:
+            return np.zeros(len(self.prices), dtype=bool)
+        low = self.origDataDF['Low'].values.astype(np.float64)
+        dip = dbe_grid.dipGrid(low, self.MdayHi, [self.reentryPct])
+        return dbe_grid.reentryGrid(self.dSinceNewHi, dip, [self.N],
+                                    self.K)[0, 0]
+
+    @cached_property
+    def inMkt(self):
+        inMkt = dbe_grid.inMktGrid(self.bull[np.newaxis, :], self.K)[0]
+        inMkt |= self.reentrySignal
+        return inMkt
+
+    # Returns
+
+    @cached_property
+    def tkrRtnDay(self):
+        return dbe_grid.dailyReturns(self.adjClose)
+
+    @cached_property
+    def dbeRtnDay(self):
+        return np.where(self.inMkt, self.tkrRtnDay, 1.0)
+
+    @cached_property
+    def dbeCumRtn(self):
+        return dbe_grid.cumRtnGrid(self.inMkt[np.newaxis, :], self.tkrRtnDay,
+                                   self.K)[0]
+
+    @cached_property
+    def tkrCumRtn(self):
+        return self.adjClose / self.adjClose[self.K]
+
+    @cached_property
+    def yrs(self):
+        return dbe_grid.yearsSince(self.origDataDF.index.values, self.K)
+
+    @cached_property
+    def tkrCAGR(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.tkrCumRtn**(1 / self.yrs)
+
+    @cached_property
+    def dbeCAGR(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.dbeCumRtn**(1 / self.yrs)
+
+    @cached_property
+    def trade(self):
+        trade = np.zeros(len(self.inMkt), dtype=np.int8)
+        trade[self.K:-1] = np.diff(self.inMkt[self.K:].astype(np.int8))
+        return trade
+
+    # Summary
+
+    # Final statistics, the same as the printout in dbe_2.0.py. Only needs
+    # inMkt, bull and the daily returns.
+    def stats(self):
+        K = self.K
+        dates = np.asarray(self.origDataDF.index.values[[K, -1]],
+                           dtype='datetime64[D]')
+        yrs = (dates[1] - dates[0]) / (dbe_grid.days_per_yr *
+                                       np.timedelta64(1, 'D'))
+        inMkt = self.inMkt
+        dbeCumRtn = np.prod(np.where(inMkt[K:], self.tkrRtnDay[K:], 1.0))
+        numTrades = np.count_nonzero(inMkt[K+1:] != inMkt[K:-1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return dict(yrs=yrs, dbeCumRtn=dbeCumRtn,
+                        tkrCAGR=(self.adjClose[-1] /
+                                 self.adjClose[K])**(1 / yrs),
+                        dbeCAGR=dbeCumRtn**(1 / yrs),
+                        tradesPerYr=numTrades / yrs,
+                        pctInMkt=100 * np.count_nonzero(self.bull[K:]) /
+                        (len(inMkt) - K))
+
+    # Signal and state of the last day
+    def latest(self):
+        return dict(date=self.origDataDF.index[-1],
+                    signal='bull' if self.bull[-1] else 'bear',
+                    inMkt=bool(self.inMkt[-1]),
+                    reentrySignal=bool(self.reentrySignal[-1]),
+                    dSinceNewHi=int(self.dSinceNewHi[-1]))
+
+    # Per-day columns
+
+    # Dictionary of the named columns (default: all of detailNames)
+    def columns(self, names=None):
+        return {name: getattr(self, name) for name in names or detailNames}
+
+    # eodDF of dbe_2.0.py with only the named columns added to a copy of the
+    # price data. signal is labeled 'bull'/'bear'.
+    def frame(self, names=None):
+        eodDF = self.origDataDF.copy(deep=True)
+        for name, val in self.columns(names).items():
+            eodDF[name] = val
+        if 'signal' in eodDF:
+            eodDF['signal'] = dbe_grid.signalLabels(self.signal)
+        return eodDF
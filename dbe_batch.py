@@ -0,0 +1,152 @@
+# Batch backtest of the DBE strategy over many tickers.
+
+# Each price source (a Yahoo! style .xlsx or .csv file, one ticker per file)
+# is evaluated on its own full history, so series of different lengths and
+# start dates need no padding. K is counted from each ticker's first day.
+# Sources are handled by a process pool with at most a few files in flight
+# per worker, so memory use is bounded no matter how many tickers there are.
+
+# The result is one consolidated table with a row per (ticker, M, N,
+# reentryPct), plus the ticker's own CAGR, years tracked and date range.
+# Sources that can't be used (unreadable, missing columns, too short) are
+# skipped and listed in the table's attrs['failed'] (source -> error); any
+# other error is a bug and is raised.
+
+# Import Modules
+import os
+import sys
+import glob
+import zipfile
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import dbe_grid
+import dbe_data
+
+# Errors that mean a source can't be used, rather than a bug
+sourceErrors = (OSError, pd.errors.ParserError, pd.errors.EmptyDataError)
+
+
+class SourceError(ValueError):
+    pass
+
+
+# List the price files in a folder, or pass a list of files through as is.
+def listSources(sources):
+    if isinstance(sources, str):
+        if os.path.isdir(sources):
+            return sorted(glob.glob(os.path.join(sources, '*.xlsx')) +
+                          glob.glob(os.path.join(sources, '*.csv')))
+        return [sources]
+    return list(sources)
+
+
+# Ticker name used in the results: the file name without extension.
+def tickerName(source):
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+# Load one price file. Spreadsheets go through the binary cache in
+# dbe_data.py. Most recent data should be at the bottom. A file that can't
+# be parsed (no such sheet, not really a spreadsheet, bad CSV) raises
+# SourceError.
+def loadSource(source, sheet='Data'):
+    try:
+        if source.lower().endswith('.csv'):
+            return pd.read_csv(source, index_col=0, parse_dates=True)
+        return dbe_data.loadPrices(source, sheet)
+    except (ValueError, zipfile.BadZipFile) as err:
+        raise SourceError(str(err)) from err
+
+
+# Evaluate one price file over the whole (M, N, reentryPct) grid. Returns the
+# rows of the results table for that ticker.
+def evalSource(source, Mrange, Nrange, reentryPcts, K, series='Adj Close',
+               sheet='Data'):
+    df = loadSource(source, sheet)
+    missing = [c for c in dict.fromkeys([series, 'Adj Close', 'Low'])
+               if c not in df.columns]
+    if missing:
+        raise SourceError('missing columns {}'.format(missing))
+    if len(df) < K + 2:
+        raise SourceError('only {} days of data, need more than K+1'.format(
+                          len(df)))
+
+    cagr, trades, pctInMkt = dbe_grid.runReentryGrid(df, Mrange, Nrange,
+                                                     reentryPcts, K, series)
+
+    yrs = dbe_grid.yearsSince(df.index.values, K)[-1]
+    tkrCAGR = (df['Adj Close'].iloc[-1] / df['Adj Close'].iloc[K])**(1/yrs)
+
+    idx = pd.MultiIndex.from_product([Mrange, Nrange, reentryPcts],
+                                     names=['M', 'N', 'reentryPct'])
+    out = pd.DataFrame({'cagr': cagr.ravel(),
+                        'tradesPerYr': trades.ravel(),
+                        'pctInMkt': pctInMkt.ravel()}, index=idx)
+    out = out.reset_index()
+    out.insert(0, 'ticker', tickerName(source))
+    out['tkrCAGR'] = tkrCAGR
+    out['yrs'] = yrs
+    out['startDate'] = df.index[K]
+    out['endDate'] = df.index[-1]
+    return out
+
+
+# Run the (M, N, reentryPct) grid for every source. sources is a folder or a
+# list of files. Rows come back in the order of the sources, whatever the
+# number of workers. Sources that can't be used (see sourceErrors and
+# SourceError) are reported and skipped; the table's attrs['failed'] maps
+# each of them to its error. Other errors are raised.
+def runBatchGrid(sources, Mrange, Nrange, K, reentryPcts=(0,),
+                 series='Adj Close', sheet='Data', workers=None,
+                 inFlightPerWorker=2):
+    sources = listSources(sources)
+    workers = workers or os.cpu_count() or 1
+    args = (Mrange, Nrange, list(reentryPcts), K, series, sheet)
+    tables = []
+    failed = {}
+
+    def collect(source, result):
+        try:
+            tables.append(result())
+        except sourceErrors + (SourceError,) as err:
+            print('Skipping', source, ':', err, file=sys.stderr)
+            failed[source] = '{}: {}'.format(type(err).__name__, err)
+
+    if workers == 1:
+        for source in sources:
+            collect(source, lambda: evalSource(source, *args))
+    else:
+        # Keep only a few files in flight at a time
+        maxInFlight = workers * inFlightPerWorker
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for source in sources:
+                pending.append((source,
+                                pool.submit(evalSource, source, *args)))
+                if len(pending) >= maxInFlight:
+                    s, f = pending.pop(0)
+                    collect(s, f.result)
+            for s, f in pending:
+                collect(s, f.result)
+
+    if tables:
+        results = pd.concat(tables, ignore_index=True)
+    else:
+        results = pd.DataFrame()
+    results.attrs['failed'] = failed
+    return results
+
+
+# Single configuration (the dbe_2.0.py parameters) for every source. One row
+# per ticker.
+def runBatch(sources, M, N, K, reentryPct=0, series='Adj Close',
+             sheet='Data', workers=None):
+    return runBatchGrid(sources, [M], [N], K, [reentryPct], series, sheet,
+                        workers)
+
+
+# Best (M, N, reentryPct) for each ticker, by CAGR.
+def bestPerTicker(results):
+    best = results.loc[results.groupby('ticker', sort=False)['cagr']
+                       .idxmax()]
+    return best.reset_index(drop=True)
@@ -0,0 +1,339 @@
+# Benchmark suite for the DBE signal and grid pipelines.
+
+# Times each stage of the calculation, records throughput and peak memory,
+# and checks the results against golden numbers from the original programs,
+# so a speedup can't silently change CAGR or trade counts. Needs no network:
+# it uses the bundled snp500data_2019-6-18.xlsx plus synthetic random-walk
+# price series.
+
+# Usage:
+#   python dbe_bench.py                  all stages, 10k/100k/1M bars
+#   python dbe_bench.py --quick          skip the 1M bar series
+#   python dbe_bench.py --json out.json  also save the results
+#
+# Stages (each on every dataset):
+#   load       pd.read_excel vs the binary cache in dbe_data.py (xlsx only)
+#   newHi      rolling M-day max vs the one-pass index in dbe_newhi.py
+#   dSince     cumsum/groupby trick of dbe_2.0.py vs dbe_grid.daysSinceNewHi
+#   reentry    ffill/shift chain of dbe_2.0.py vs dbe_grid.reentryGrid
+#   returns    returns, cumulative return, CAGR, trades, pct in market
+#   original   one full configuration with the original pandas code
+#   grid       full (M, N) grids of growing size with dbe_grid.runGrid
+#
+# Golden numbers (dbe_bench_golden.json) were produced by the original
+# dbe_2.0.py / dbe_loop_1.1.py code on the bundled spreadsheet. If the
+# calculation is changed on purpose, regenerate them with --write-golden.
+
+# Import Modules
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+import dbe_grid
+import dbe_newhi
+import dbe_data
+
+days_per_yr = 365.2422
+here = os.path.dirname(os.path.abspath(__file__))
+eodDataFile = os.path.join(here, 'snp500data_2019-6-18.xlsx')
+goldenFile = os.path.join(here, 'dbe_bench_golden.json')
+
+
+###########################################################################
+# Reference implementation: the calculation of dbe_2.0.py, one column at a
+# time on a dataframe, as it was before the array rewrite. Only changed
+# where newer pandas versions no longer accept the original code, and to
+# floor each date to a whole day before taking the years since K (as
+# dbe_grid.yearsSince does). On daily data that is the same as the
+# original; on the hourly synthetic series it keeps the years from
+# depending on the hour of day K.
+
+def referenceBacktest(origDataDF, M, N, K, reentryPct=0, series='Adj Close'):
+    eodDF = origDataDF.copy(deep = True)
+
+    eodDF['MdayHi'] = eodDF[series].rolling(M).max()
+    eodDF['newHi'] = np.where(eodDF[series] == eodDF['MdayHi'], True, False)
+    eodDF['rePt'] = reentryPct*eodDF['MdayHi']
+
+    eodDF['dSinceNewHi'] = (eodDF['newHi'] != eodDF['newHi'].shift(1))
+    eodDF['dSinceNewHi'] = eodDF['dSinceNewHi'].cumsum()
+    eodDF['dSinceNewHi'] = eodDF.groupby('dSinceNewHi').cumcount() + 1
+    eodDF.loc[eodDF['newHi'] == True, 'dSinceNewHi'] = 0
+
+    signal = np.where(eodDF['dSinceNewHi'] < N, 'bull', 'bear')
+    signal = signal.astype(object)
+    signal[:K] = np.nan
+    eodDF['signal'] = signal
+
+    eodDF['inMkt'] = (eodDF['signal'].shift(1) == 'bull').astype(object)
+    eodDF.loc[eodDF.index.values <= eodDF.index.values[K], 'inMkt'] = False
+
+    reentrySignal = pd.Series(np.nan, index = eodDF.index, dtype = object)
+    idxList = eodDF.loc[
+                (eodDF.Low < eodDF.rePt) & (eodDF.signal == 'bear')].index
+    reentrySignal.loc[idxList] = True
+    reentrySignal.loc[eodDF.dSinceNewHi == 0] = False
+    reentrySignal = reentrySignal.ffill().astype(float)
+    reentrySignal = reentrySignal + reentrySignal.shift(1)
+    eodDF['reentrySignal'] = reentrySignal
+    eodDF.loc[eodDF['reentrySignal'] >= 1, 'inMkt'] = True
+
+    eodDF['tkrRtnDay'] = eodDF['Adj Close']/eodDF['Adj Close'].shift(1)
+    days = eodDF.index.values.astype('datetime64[D]')
+    eodDF['yrs'] = (days - days[K]) / (days_per_yr * np.timedelta64(1, 'D'))
+    eodDF['dbeRtnDay'] = eodDF['tkrRtnDay'].where(eodDF['inMkt'] == True, 1)
+    eodDF['dbeCumRtn'] = eodDF['dbeRtnDay'].shift(-K).cumprod().shift(K)
+    eodDF['dbeCAGR'] = eodDF['dbeCumRtn']**(1 / eodDF['yrs'])
+
+    inMkt = eodDF['inMkt'].astype(float)
+    eodDF['trade'] = inMkt.shift(-1) - inMkt
+    eodDF.loc[eodDF.index.values < eodDF.index.values[K], 'trade'] = 0
+    tradesPerYr = eodDF.trade.abs().sum() / eodDF['yrs'].iloc[-1]
+
+    numBulls = len(eodDF[eodDF['signal'] == 'bull'])
+    numBears = len(eodDF[eodDF['signal'] == 'bear'])
+    pctInMkt = 100 * numBulls / (numBulls + numBears)
+    return eodDF['dbeCAGR'].iloc[-1], tradesPerYr, pctInMkt
+
+
+###########################################################################
+# Data
+
+# Geometric random walk with Yahoo! style columns. Bars are hourly so that a
+# million of them still fits in pandas' date range; only the years between
+# bars change, not the amount of work.
+def randomWalk(numBars, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0002, 0.01, numBars)))
+    low = close * (1 - np.abs(rng.normal(0, 0.005, numBars)))
+    high = close * (1 + np.abs(rng.normal(0, 0.005, numBars)))
+    index = pd.date_range('1900-01-01', periods=numBars, freq='h',
+                          name='Date')
+    return pd.DataFrame({'Open': close, 'High': high, 'Low': low,
+                         'Close': close, 'Adj Close': close,
+                         'Volume': np.full(numBars, 1e6)}, index=index)
+
+
+###########################################################################
+# Measuring
+
+# Run fn(*args) repeat times. Returns the best wall time, the peak memory
+# allocated during one run and the result.
+def measure(fn, *args, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t)
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def record(results, dataset, stage, impl, secs, peak, numBars, configs=1):
+    row = dict(dataset=dataset, stage=stage, impl=impl, secs=secs,
+               peakMB=peak / 1e6, barsPerSec=numBars * configs / secs,
+               configsPerSec=configs / secs)
+    results.append(row)
+    print('{:>10} {:>9} {:>10} {:9.4f} s {:9.1f} MB {:12.3g} bars/s '
+          '{:10.3g} cfg/s'.format(dataset, stage, impl, secs, row['peakMB'],
+                                  row['barsPerSec'], row['configsPerSec']))
+
+
+###########################################################################
+# Stages
+
+def benchStages(results, name, df, M=107, N=134, K=250, reentryPct=0.9,
+                series='Adj Close', repeat=3):
+    numBars = len(df)
+    prices = df[series].values.astype(np.float64)
+    low = df['Low'].values.astype(np.float64)
+    rep = 1 if numBars > 200000 else repeat    # keep the 1M run short
+
+    # New-high detection
+    secs, peak, _ = measure(lambda: df[series].rolling(M).max() == df[series],
+                            repeat=rep)
+    record(results, name, 'newHi', 'rolling', secs, peak, numBars)
+    secs, peak, reach = measure(dbe_newhi.highReach, prices, repeat=rep)
+    record(results, name, 'newHi', 'index', secs, peak, numBars)
+
+    # Days since new high
+    newHi = dbe_newhi.isNewHi(reach, M)
+
+    def groupbyTrick():
+        s = pd.Series(newHi)
+        groups = (s != s.shift(1)).cumsum()
+        d = s.groupby(groups).cumcount() + 1
+        d[s] = 0
+        return d
+    secs, peak, _ = measure(groupbyTrick, repeat=rep)
+    record(results, name, 'dSince', 'groupby', secs, peak, numBars)
+    secs, peak, dSinceNewHi = measure(dbe_grid.daysSinceNewHi, newHi,
+                                      repeat=rep)
+    record(results, name, 'dSince', 'array', secs, peak, numBars)
+
+    # Reentry
+    MdayHi = dbe_grid.rollingMax(prices, M)
+    signal = np.where(dSinceNewHi < N, 'bull', 'bear').astype(object)
+    signal[:K] = np.nan
+
+    def ffillChain():
+        r = pd.Series(np.nan, index=df.index, dtype=object)
+        r[(low < reentryPct * MdayHi) & (signal == 'bear')] = True
+        r[newHi] = False
+        r = r.ffill().astype(float)
+        return (r + r.shift(1)) >= 1
+    secs, peak, _ = measure(ffillChain, repeat=rep)
+    record(results, name, 'reentry', 'ffill', secs, peak, numBars)
+
+    def reentryKernel():
+        dip = dbe_grid.dipGrid(low, MdayHi, [reentryPct])
+        return dbe_grid.reentryGrid(dSinceNewHi, dip, [N], K)
+    secs, peak, reentrySignal = measure(reentryKernel, repeat=rep)
+    record(results, name, 'reentry', 'array', secs, peak, numBars)
+
+    # Returns and statistics
+    tkrRtnDay = dbe_grid.dailyReturns(df['Adj Close'].values)
+    yrs = dbe_grid.yearsSince(df.index.values, K)
+    bull = (dSinceNewHi < N)[np.newaxis, :]
+    inMkt = dbe_grid.inMktGrid(bull, K) | reentrySignal[0]
+    secs, peak, _ = measure(dbe_grid.gridStats, bull, inMkt, tkrRtnDay, yrs,
+                            K, repeat=rep)
+    record(results, name, 'returns', 'array', secs, peak, numBars)
+
+    # One full configuration with the original code
+    secs, peak, _ = measure(referenceBacktest, df, M, N, K, reentryPct,
+                            series, repeat=rep)
+    record(results, name, 'original', 'pandas', secs, peak, numBars)
+
+
+def benchGrids(results, name, df, sizes, K=250, series='Adj Close',
+               repeat=3):
+    numBars = len(df)
+    for size in sizes:
+        Mrange = range(100 - size // 2, 100 - size // 2 + size)
+        Nrange = range(150 - size // 2, 150 - size // 2 + size)
+        secs, peak, _ = measure(dbe_grid.runGrid, df, Mrange, Nrange, K,
+                                series, repeat=repeat)
+        record(results, name, 'grid', '{0}x{0}'.format(size), secs, peak,
+               numBars, size * size)
+
+
+###########################################################################
+# Golden checks
+
+# Check the grid engine against the golden numbers of the original programs
+# on the bundled spreadsheet. Returns the list of failures.
+def checkGolden(df, golden, rtol=1e-12):
+    failures = []
+    for g in golden['configs']:
+        cagr, trades, pct = dbe_grid.runReentryGrid(
+            df, [g['M']], [g['N']], [g['reentryPct']], g['K'],
+            golden['series'])
+        got = dict(cagr=cagr.item(), tradesPerYr=trades.item(),
+                   pctInMkt=pct.item())
+        for key, val in got.items():
+            if not np.isclose(val, g[key], rtol=rtol, atol=0):
+                failures.append((g, key, val))
+    return failures
+
+
+# Check the grid engine against the original code on a synthetic series.
+def checkReference(df, configs, K=250, series='Adj Close', rtol=1e-12):
+    failures = []
+    for M, N, pct in configs:
+        want = referenceBacktest(df, M, N, K, pct, series)
+        got = dbe_grid.runReentryGrid(df, [M], [N], [pct], K, series)
+        for key, w, g in zip(('cagr', 'tradesPerYr', 'pctInMkt'), want, got):
+            if not np.isclose(g.item(), w, rtol=rtol, atol=0):
+                failures.append(((M, N, pct), key, g.item(), w))
+    return failures
+
+
+def writeGolden(df, configs, series='Adj Close'):
+    out = []
+    for M, N, K, pct in configs:
+        cagr, trades, pctInMkt = referenceBacktest(df, M, N, K, pct, series)
+        out.append(dict(M=M, N=N, K=K, reentryPct=pct, cagr=float(cagr),
+                        tradesPerYr=float(trades),
+                        pctInMkt=float(pctInMkt)))
+    with open(goldenFile, 'w') as f:
+        json.dump({'source': os.path.basename(eodDataFile), 'sheet': 'Data',
+                   'series': series, 'configs': out}, f, indent=1)
+
+
+###########################################################################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the DBE signal and grid pipelines.')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the 1M bar series')
+    parser.add_argument('--json', help='save results to this JSON file')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--write-golden', action='store_true',
+                        help='regenerate golden numbers with the original '
+                             'code, then exit')
+    args = parser.parse_args(argv)
+
+    with open(goldenFile) as f:
+        golden = json.load(f)
+
+    if args.write_golden:
+        df = pd.read_excel(eodDataFile, 'Data', index_col=0)
+        writeGolden(df, [(g['M'], g['N'], g['K'], g['reentryPct'])
+                         for g in golden['configs']])
+        return 0
+
+    results = []
+
+    # Bundled S&P 500 data: load stage, then the rest
+    secs, peak, df = measure(lambda: pd.read_excel(eodDataFile, 'Data',
+                                                   index_col=0), repeat=1)
+    record(results, 'snp500', 'load', 'read_excel', secs, peak, len(df))
+    cache = os.path.join(here, dbe_data.cacheDir)
+    secs, peak, _ = measure(dbe_data.loadPrices, eodDataFile, 'Data', cache,
+                            repeat=args.repeat)
+    record(results, 'snp500', 'load', 'cache', secs, peak, len(df))
+
+    benchStages(results, 'snp500', df, repeat=args.repeat)
+    benchGrids(results, 'snp500', df, [10, 50, 100], repeat=args.repeat)
+
+    sizes = [10000, 100000] if args.quick else [10000, 100000, 1000000]
+    synthetic = {}
+    for numBars in sizes:
+        name = 'rw{}k'.format(numBars // 1000)
+        synthetic[name] = walk = randomWalk(numBars)
+        benchStages(results, name, walk, repeat=args.repeat)
+        benchGrids(results, name, walk,
+                   [10, 50] if numBars > 200000 else [10, 50, 100],
+                   repeat=1 if numBars > 200000 else args.repeat)
+
+    # Correctness
+    failures = checkGolden(df, golden)
+    failures += checkReference(synthetic['rw10k'],
+                               [(5, 10, 0), (107, 134, 0.9), (50, 300, 0.95)])
+    print()
+    if failures:
+        print('GOLDEN CHECK FAILED')
+        for f in failures:
+            print('  ', f)
+    else:
+        print('Golden check passed')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'results': results, 'failures': [str(f) for f in
+                                                        failures]},
+                      f, indent=1, default=float)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
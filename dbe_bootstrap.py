@@ -0,0 +1,151 @@
+# Block-bootstrap robustness test of the DBE strategy.
+
+# The grid search picks the (M, N) that did best on the one price history we
+# have. To see how much of that is luck, many alternative histories are made
+# by cutting the real one into blocks of blockDays days and gluing randomly
+# chosen blocks back together (a moving-block bootstrap). Blocks keep the
+# short-term behaviour of the market (volatility clustering, short trends)
+# while the long-term path changes from one history to the next.
+
+# Each bootstrapped day takes the daily return (tkrRtnDay) of the real day it
+# was copied from, and the ratios of the chosen series and the Low to the
+# adjusted close on that day, so the reentry rule sees realistic lows.
+
+# The strategy is evaluated on a whole chunk of paths at once, as 2-D arrays
+# with one row per path and the days along the columns (the same functions as
+# the grid engine in dbe_grid.py). Paths are done chunkPaths at a time so
+# memory stays bounded (only the block starts of all paths, about 1/blockDays
+# of a path each, are kept). The same seed gives the same paths, so different
+# (M, N) values can be compared on exactly the same histories.
+
+# Import Modules
+import math
+import numpy as np
+import pandas as pd
+import dbe_grid
+
+
+# Rolling M-day max along the last axis of a 2-D array (NaN for the first
+# M-1 days). Uses the running max within blocks of M days from the left and
+# from the right (van Herk / Gil-Werman), so the cost does not grow with M.
+def rollingMaxPaths(x, M):
+    numRows, n = x.shape
+    L = math.ceil(n / M) * M
+    padded = np.full((numRows, L), -np.inf)
+    padded[:, :n] = x
+    blocks = padded.reshape(numRows, L // M, M)
+    left = np.maximum.accumulate(blocks, axis=2).reshape(numRows, L)
+    right = np.maximum.accumulate(blocks[:, :, ::-1], axis=2)
+    right = right[:, :, ::-1].reshape(numRows, L)
+    out = np.full(x.shape, np.nan)
+    out[:, M-1:] = np.maximum(right[:, :n-M+1], left[:, M-1:n])
+    return out
+
+
+# reentrySignal for one N and one reentryPct on every path. Same rule as
+# dbe_grid.reentryGrid(), but dSinceNewHi and dip have a row per path.
+def reentryPaths(dSinceNewHi, dip, N, K):
+    numPaths, n = dSinceNewHi.shape
+    idx = np.arange(n)
+    lastHi = idx - dSinceNewHi
+
+    # Next dip day at or after each day (n if none)
+    nextDip = np.full((numPaths, n + 1), n, dtype=np.int32)
+    nextDip[:, :n] = np.where(dip, idx, n)
+    nextDip = np.minimum.accumulate(nextDip[:, ::-1], axis=1)[:, ::-1]
+
+    start = np.minimum(np.maximum(lastHi + N, K), n)
+    marker = np.take_along_axis(nextDip, start, axis=1) <= idx
+    defined = marker | (lastHi >= 0)
+
+    reentrySignal = np.zeros(marker.shape, dtype=bool)
+    reentrySignal[:, 1:] = (defined[:, 1:] & defined[:, :-1] &
+                            (marker[:, 1:] | marker[:, :-1]))
+    return reentrySignal
+
+
+# First source day of every block, one row per path. Blocks start on days
+# where the whole block has valid data.
+def blockStarts(valid, numPaths, numDays, blockDays, rng):
+    window = np.convolve(valid, np.ones(blockDays, dtype=int), 'valid')
+    starts = np.flatnonzero(window == blockDays)
+    if len(starts) == 0:
+        raise ValueError('No {}-day block without missing data'.format(
+                         blockDays))
+    numBlocks = math.ceil(numDays / blockDays)
+    return starts[rng.integers(len(starts), size=(numPaths, numBlocks))]
+
+
+# Source day of every bootstrapped day, one row per path, from the block
+# starts of blockStarts().
+def blockIndexes(first, numDays, blockDays):
+    days = first[:, :, np.newaxis] + np.arange(blockDays)
+    return days.reshape(len(first), -1)[:, :numDays]
+
+
+# Run the strategy on numPaths bootstrapped histories as long as the real
+# one. Returns a dataframe with one row per path: the DBE CAGR, trades per
+# year and percent in the market, and the buy and hold CAGR of the path.
+def bootstrap(origDataDF, M, N, K, reentryPct=0, numPaths=1000,
+              blockDays=20, seed=0, series='Adj Close', maxCells=20000000):
+    adjClose = origDataDF['Adj Close'].values.astype(np.float64)
+    prices = origDataDF[series].values.astype(np.float64)
+    low = origDataDF['Low'].values.astype(np.float64)
+    tkrRtnDay = dbe_grid.dailyReturns(adjClose)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        priceRatio = prices / adjClose
+        lowRatio = low / adjClose
+    numDays = len(adjClose)
+    yrs = dbe_grid.yearsSince(origDataDF.index.values, K)
+
+    # Block starts for every path, drawn up front so the paths don't depend
+    # on the chunk size. Only a chunk's paths are expanded to day indexes.
+    valid = (np.isfinite(tkrRtnDay) & np.isfinite(priceRatio) &
+             np.isfinite(lowRatio))
+    rng = np.random.default_rng(seed)
+    first = blockStarts(valid, numPaths, numDays, blockDays, rng)
+
+    out = np.empty((numPaths, 4))
+    chunkPaths = max(1, maxCells // numDays)
+    for p0 in range(0, numPaths, chunkPaths):
+        days = blockIndexes(first[p0:p0+chunkPaths], numDays, blockDays)
+
+        # Bootstrapped path, starting from the first real adjusted close
+        rtn = tkrRtnDay[days]
+        rtn[:, 0] = np.nan
+        pathAdj = np.empty(days.shape)
+        pathAdj[:, 0] = adjClose[0]
+        pathAdj[:, 1:] = adjClose[0] * np.cumprod(rtn[:, 1:], axis=1)
+        pathPrices = pathAdj * priceRatio[days]
+
+        # Signal and statistics for every path at once
+        MdayHi = rollingMaxPaths(pathPrices, M)
+        dSinceNewHi = dbe_grid.daysSinceNewHi(pathPrices == MdayHi)
+        signal = dSinceNewHi < N
+        inMkt = dbe_grid.inMktGrid(signal, K)
+        if reentryPct:
+            with np.errstate(invalid='ignore'):
+                dip = pathAdj * lowRatio[days] < reentryPct * MdayHi
+            inMkt |= reentryPaths(dSinceNewHi, dip, N, K)
+        _, cagr, tradesPerYr, pctInMkt = dbe_grid.gridStats(signal, inMkt,
+                                                            rtn, yrs, K)
+
+        out[p0:p0+chunkPaths, 0] = cagr
+        out[p0:p0+chunkPaths, 1] = tradesPerYr
+        out[p0:p0+chunkPaths, 2] = pctInMkt
+        out[p0:p0+chunkPaths, 3] = (pathAdj[:, -1] / pathAdj[:, K])**(
+            1 / yrs[-1])
+
+    return pd.DataFrame(out, columns=['cagr', 'tradesPerYr', 'pctInMkt',
+                                      'tkrCAGR'])
+
+
+# Distribution of the bootstrap results: percentiles of every column, plus
+# the share of paths where the strategy beat buy and hold.
+def summarize(results, percentiles=(5, 25, 50, 75, 95)):
+    table = results.quantile(np.asarray(percentiles) / 100)
+    table.index = ['p{}'.format(p) for p in percentiles]
+    table.loc['mean'] = results.mean()
+    table.loc['std'] = results.std()
+    beat = (results['cagr'] > results['tkrCAGR']).mean()
+    return table, beat
@@ -0,0 +1,312 @@
+# Command line entry point for the DBE programs.
+
+# Runs a list of scenarios from a JSON or TOML job file in one process.
+# Every data source is loaded once and shared by all the scenarios that use
+# it. Modules that are slow to import or optional (pandas_datareader,
+# matplotlib, pyarrow, the Excel engines, ...) are only imported when a
+# scenario needs them, so a simple signal check starts in well under a
+# second.
+
+# Usage:
+#   python dbe_cli.py job.json
+#   python dbe_cli.py job.toml --json results.json
+#
+# Job file (JSON shown, TOML has the same structure):
+#   {
+#     "defaults": {"series": "Adj Close", "K": 250},
+#     "data": {
+#       "snp": {"file": "snp500data_2019-6-18.xlsx", "sheet": "Data"},
+#       "nasdaq": {"ticker": "^IXIC", "start": "1971-02-01"}
+#     },
+#     "scenarios": [
+#       {"name": "today", "data": "snp", "mode": "signal",
+#        "M": 122, "N": 214, "reentryPct": 0.9},
+#       {"data": "snp", "mode": "grid", "M": "1:63", "N": "10:100",
+#        "K": 200, "out": "dbeStats.csv", "cache": true}
+#     ]
+#   }
+#
+# "ticker" sources are kept in the dbe_prices store (a "store" folder,
+# default .dbe_prices) and only the new days are downloaded, from Yahoo!
+# or, with a "url" template, as CSV (see dbe_prices.CsvUrlProvider).
+# "data" can also name a file directly. M, N and reentryPct are a number, a
+# list of values or a "start:stop[:step]" range (stop not included). Keys
+# in "defaults" apply to every scenario that doesn't set them. Data files,
+# price stores, "out" files and a "cache" file name are relative to the job
+# file's folder ("cache": true uses the dbe_memo default).
+#
+# Modes (extra keys in brackets):
+#   signal       latest signal and statistics for one (M, N, reentryPct)
+#                [out: per-day detail file]
+#   grid         full grid, best cell [out: grid file, cache: use dbe_memo,
+#                true or a file name]
+#   risk         grid with risk metrics, best cell by CAGR [riskFree]
+#   search       coarse-to-fine search [budget]
+#   bootstrap    block-bootstrap robustness [numPaths, blockDays, seed]
+#   startsweep   results against start date [stride, out]
+#   plot         equity curve picture [out, start, end]
+
+# Import Modules
+import os
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+
+###########################################################################
+# Job file
+
+# Read a .json or .toml job file.
+def readJob(fileName):
+    if fileName.lower().endswith('.toml'):
+        import tomllib
+        with open(fileName, 'rb') as f:
+            return tomllib.load(f)
+    with open(fileName) as f:
+        return json.load(f)
+
+
+# Parameter values: a number, a list or a "start:stop[:step]" range.
+def paramValues(spec):
+    if isinstance(spec, str):
+        return list(range(*[int(p) for p in spec.split(':')]))
+    if isinstance(spec, (list, tuple)):
+        return list(spec)
+    return [spec]
+
+
+# Settings of a data source, by name from the job's "data" section or a file
+# name. Files and price stores are relative to the job file's folder.
+def sourceSpec(source, sources, baseDir='.'):
+    spec = sources.get(source, source)
+    spec = {'file': spec} if isinstance(spec, str) else dict(spec)
+    if 'file' in spec:
+        spec['file'] = os.path.join(baseDir, spec['file'])
+    if 'ticker' in spec:
+        import dbe_prices
+        spec['store'] = os.path.join(baseDir,
+                                     spec.get('store', dbe_prices.priceDir))
+    return spec
+
+
+# Load a data source. .csv and .xlsx files go through dbe_batch.loadSource
+# (binary cache for spreadsheets), "ticker" sources are refreshed in the
+# dbe_prices store and loaded from it.
+def loadData(spec):
+    if 'ticker' in spec:
+        import dbe_prices
+        ticker, store = spec['ticker'], spec['store']
+        if 'url' in spec:
+            provider = dbe_prices.CsvUrlProvider(spec['url'])
+        else:
+            provider = dbe_prices.YahooProvider(spec.get('provider', 'yahoo'))
+        refreshed = dbe_prices.refresh([ticker], provider, store,
+                                       spec.get('start'), spec.get('end'))
+        error = refreshed['error'].iloc[0]
+        df = dbe_prices.loadTicker(ticker, store)
+        if df is None:
+            raise RuntimeError('No stored data for {}: {}'.format(ticker,
+                                                                  error))
+        if error:
+            print('Using stored data for', ticker, ':', error,
+                  file=sys.stderr)
+        start, end = spec.get('start'), spec.get('end')
+        return df.loc[None if start is None else pd.Timestamp(start):
+                      None if end is None else pd.Timestamp(end)]
+    import dbe_batch
+    return dbe_batch.loadSource(spec['file'], spec.get('sheet', 'Data'))
+
+
+###########################################################################
+# Scenario runners. Each gets the price data and the scenario's settings
+# and returns a dictionary of summary values.
+
+def runSignal(df, job):
+    import dbe_backtest
+    M, N, K, pct = job['M'], job['N'], job['K'], job.get('reentryPct', 0)
+    series = job.get('series', 'Adj Close')
+    bt = dbe_backtest.DbeBacktest(df, M, N, K, pct, series)
+    stats, latest = bt.stats(), bt.latest()
+    if 'out' in job:
+        import dbe_export
+        dbe_export.exportDayDetail(job['out'], df, M, N, K, pct, series)
+    return dict(M=M, N=N, reentryPct=pct, date=str(latest['date'].date()),
+                signal=latest['signal'], reentry=latest['reentrySignal'],
+                dSinceNewHi=latest['dSinceNewHi'], cagr=stats['dbeCAGR'],
+                tkrCAGR=stats['tkrCAGR'], tradesPerYr=stats['tradesPerYr'],
+                pctInMkt=stats['pctInMkt'])
+
+
+def _gridArrays(df, job):
+    import dbe_grid
+    Mrange, Nrange = paramValues(job['M']), paramValues(job['N'])
+    pcts = paramValues(job.get('reentryPct', 0))
+    series = job.get('series', 'Adj Close')
+    if job.get('cache'):
+        import dbe_memo
+        cache = job['cache']
+        return dbe_memo.runGridCached(df, Mrange, Nrange, job['K'], series,
+                                      pcts, cache if isinstance(cache, str)
+                                      else dbe_memo.cacheFile)
+    return dbe_grid.runReentryGrid(df, Mrange, Nrange, pcts, job['K'],
+                                   series)
+
+
+# Best cell of [M, N, reentryPct] grids, by the first one
+def _best(job, grids, names):
+    Mrange, Nrange = paramValues(job['M']), paramValues(job['N'])
+    pcts = paramValues(job.get('reentryPct', 0))
+    i, j, k = np.unravel_index(np.nanargmax(grids[0]), grids[0].shape)
+    out = dict(M=Mrange[i], N=Nrange[j], reentryPct=pcts[k],
+               cells=grids[0].size)
+    out.update({name: g[i, j, k] for name, g in zip(names, grids)})
+    return out
+
+
+def runGrid(df, job):
+    cagr, trades, pctInMkt = _gridArrays(df, job)
+    if 'out' in job:
+        import dbe_export
+        dbe_export.exportGrid(job['out'], cagr, trades, pctInMkt,
+                              paramValues(job['M']), paramValues(job['N']),
+                              paramValues(job.get('reentryPct', 0)))
+    return _best(job, (cagr, trades, pctInMkt),
+                 ('cagr', 'tradesPerYr', 'pctInMkt'))
+
+
+def runRisk(df, job):
+    import dbe_metrics
+    risk = dbe_metrics.runRiskGrid(df, paramValues(job['M']),
+                                   paramValues(job['N']), job['K'],
+                                   job.get('series', 'Adj Close'),
+                                   paramValues(job.get('reentryPct', 0)),
+                                   job.get('riskFree', 0.0))
+    names = [name for name, dtype in dbe_metrics.riskMetrics]
+    return _best(job, [risk[name] for name in names], names)
+
+
+def runSearch(df, job):
+    import dbe_search
+    pcts = job.get('reentryPct')
+    best, evaluated = dbe_search.searchGrid(
+        df, paramValues(job['M']), paramValues(job['N']), job['K'],
+        job.get('series', 'Adj Close'),
+        None if pcts is None else paramValues(pcts), job.get('budget', 5000))
+    best = dict(best)
+    best['cells'] = len(evaluated)
+    return best
+
+
+def runBootstrap(df, job):
+    import dbe_bootstrap
+    results = dbe_bootstrap.bootstrap(
+        df, job['M'], job['N'], job['K'], job.get('reentryPct', 0),
+        job.get('numPaths', 1000), job.get('blockDays', 20),
+        job.get('seed', 0), job.get('series', 'Adj Close'))
+    table, beat = dbe_bootstrap.summarize(results)
+    return dict(M=job['M'], N=job['N'], reentryPct=job.get('reentryPct', 0),
+                cagr=table.loc['p50', 'cagr'],
+                cagrP5=table.loc['p5', 'cagr'],
+                cagrP95=table.loc['p95', 'cagr'],
+                tradesPerYr=table.loc['p50', 'tradesPerYr'],
+                pctInMkt=table.loc['p50', 'pctInMkt'],
+                beatBuyHold=beat)
+
+
+def runStartSweep(df, job):
+    import dbe_startsweep
+    curve = dbe_startsweep.startCurve(df, job['M'], job['N'],
+                                      stride=job.get('stride', 1),
+                                      series=job.get('series', 'Adj Close'))
+    if 'out' in job:
+        curve.to_csv(job['out'])
+    return dict(M=job['M'], N=job['N'], cagr=curve['cagr'].median(),
+                cagrP5=curve['cagr'].quantile(0.05),
+                cagrP95=curve['cagr'].quantile(0.95),
+                beatBuyHold=(curve['cagr'] > curve['tkrCAGR']).mean(),
+                cells=len(curve))
+
+
+def runPlot(df, job):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import dbe_backtest
+    import dbe_plot
+    bt = dbe_backtest.DbeBacktest(df, job['M'], job['N'], job['K'],
+                                  job.get('reentryPct', 0),
+                                  job.get('series', 'Adj Close'))
+    eodDF = bt.frame(['inMkt', 'tkrRtnDay', 'dbeRtnDay'])
+    fig, ax = plt.subplots(figsize=(12, 6))
+    dbe_plot.plotDBE(eodDF, job.get('start'), job.get('end'), ax=ax,
+                     logScale=job.get('logScale', False))
+    out = job.get('out', 'dbePlot.png')
+    fig.savefig(out, dpi=job.get('dpi', 100))
+    plt.close(fig)
+    return dict(M=job['M'], N=job['N'], out=out)
+
+
+modes = {'signal': runSignal, 'grid': runGrid, 'risk': runRisk,
+         'search': runSearch, 'bootstrap': runBootstrap,
+         'startsweep': runStartSweep, 'plot': runPlot}
+
+
+###########################################################################
+
+# Output and cache files of a scenario, relative to the job file's folder
+def scenarioPaths(scenario, baseDir='.'):
+    scenario = dict(scenario)
+    if scenario.get('mode') == 'plot':
+        scenario.setdefault('out', 'dbePlot.png')
+    for key in ('out', 'cache'):
+        if isinstance(scenario.get(key), str):
+            scenario[key] = os.path.join(baseDir, scenario[key])
+    return scenario
+
+
+# Run every scenario of a job. Returns a dataframe with one row per
+# scenario. A failing scenario is reported in its 'error' column and the
+# rest still run.
+def runJob(job, baseDir='.'):
+    sources = job.get('data', {})
+    defaults = job.get('defaults', {})
+    loaded = {}
+    rows = []
+    for num, scenario in enumerate(job['scenarios']):
+        scenario = scenarioPaths(dict(defaults, **scenario), baseDir)
+        mode = scenario.get('mode', 'signal')
+        name = scenario.get('name', '{}{}'.format(mode, num))
+        row = dict(name=name, mode=mode)
+        try:
+            source = scenario['data']
+            if source not in loaded:
+                loaded[source] = loadData(sourceSpec(source, sources,
+                                                     baseDir))
+            row.update(modes[mode](loaded[source], scenario))
+        except Exception as err:
+            row['error'] = '{}: {}'.format(type(err).__name__, err)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Run DBE scenarios from a JSON or TOML job file.')
+    parser.add_argument('job', help='job file (.json or .toml)')
+    parser.add_argument('--json', help='save the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    job = readJob(args.job)
+    results = runJob(job, os.path.dirname(os.path.abspath(args.job)))
+    with pd.option_context('display.width', 200,
+                           'display.max_columns', None):
+        print(results.to_string(index=False))
+    if args.json:
+        results.to_json(args.json, orient='records', indent=1)
+    return 1 if 'error' in results and results['error'].notna().any() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# Data loading layer for the DBE programs.
+
+# Reading the .xlsx spreadsheets with pd.read_excel is the slowest part of a
+# short run. Here a spreadsheet is converted once into a small binary store:
+# the dates plus all numeric columns as one float64 .npy array. Later runs
+# memory-map that array and wrap it in a dataframe without copying it, which
+# takes a few milliseconds.
+
+# The store is keyed by a hash of the spreadsheet's contents (and the sheet
+# name), so if the spreadsheet is updated a new store is built automatically
+# and the old one is removed.
+
+# The cached dataframe is read-only. The programs always work on a
+# copy(deep = True) of origDataDF, so this is normally not an issue.
+# Only numeric (and True/False) columns are kept, all as float64. Text
+# columns, such as the 'signal' column in the output spreadsheets, are dropped.
+
+# Import Modules
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+import dbe_profile
+
+# Name of the folder for the binary stores. loadPrices puts it next to the
+# spreadsheet unless it is given another folder.
+cacheDir = '.dbe_cache'
+
+# Bump this if the layout of the store changes. Old stores are then rebuilt.
+storeVersion = 1
+
+
+# Hash of the file contents. Read in blocks so large files don't have to fit
+# in memory.
+def fileHash(fileName, blockSize=1 << 20):
+    h = hashlib.sha256()
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(blockSize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Folder name for a spreadsheet/sheet store. The prefix is used to find and
+# remove stores built from older versions of the same spreadsheet.
+def _storePrefix(eodDataFile, sheet):
+    stem = os.path.splitext(os.path.basename(eodDataFile))[0]
+    return '{}_{}_'.format(stem, sheet)
+
+
+# Convert a dataframe into the binary store in folder path. Columns are
+# stored as rows of a (numCols, numDays) array. Wrapping the transpose of that
+# array in a dataframe gives pandas exactly the layout it uses internally, so
+# no copy is needed when it is loaded back.
+def writeStore(df, path, meta=None):
+    numeric = df.select_dtypes(include=['number', 'bool'])
+    values = np.ascontiguousarray(numeric.values.T, dtype=np.float64)
+    dates = np.asarray(df.index.values, dtype='datetime64[ns]')
+
+    meta = dict(meta or {})
+    meta.update(version=storeVersion, numDays=len(df),
+                columns=[str(c) for c in numeric.columns],
+                indexName=df.index.name)
+
+    # Write into a temporary folder first, then rename it into place, so a
+    # half written store is never picked up by another process.
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent)
+    np.save(os.path.join(tmp, 'values.npy'), values)
+    np.save(os.path.join(tmp, 'dates.npy'), dates)
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Another process built the same store first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# Load a binary store as a read-only dataframe backed by a memory map.
+def readStore(path):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != storeVersion:
+        raise ValueError('Store {} has an old layout'.format(path))
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    dates = np.load(os.path.join(path, 'dates.npy'))
+    index = pd.DatetimeIndex(dates, name=meta['indexName'])
+    return pd.DataFrame(values.T, index=index, columns=meta['columns'],
+                        copy=False)
+
+
+# Load price data from an Excel spreadsheet, using the binary store when it
+# is up to date. Same arguments as the pd.read_excel call in the programs.
+# cache is the folder of the stores (default: cacheDir in the spreadsheet's
+# folder, whatever the working directory).
+def loadPrices(eodDataFile, sheet='Data', cache=None):
+    if cache is None:
+        cache = os.path.join(os.path.dirname(os.path.abspath(eodDataFile)),
+                             cacheDir)
+    with dbe_profile.stage('hash'):
+        digest = fileHash(eodDataFile)
+    prefix = _storePrefix(eodDataFile, sheet)
+    path = os.path.join(cache, prefix + digest[:16])
+
+    if os.path.isdir(path):
+        try:
+            with dbe_profile.stage('readStore'):
+                return readStore(path)
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(path, ignore_errors=True)
+
+    # Build the store. Reads in col headings as str.
+    with dbe_profile.stage('readExcel'):
+        df = pd.read_excel(eodDataFile, sheet, index_col=0)
+    with dbe_profile.stage('writeStore'):
+        writeStore(df, path, meta={'source': os.path.basename(eodDataFile),
+                                   'sheet': sheet, 'sha256': digest})
+
+    # Remove stores built from older versions of this spreadsheet
+    for name in os.listdir(cache):
+        old = name[len(prefix):]
+        if (name.startswith(prefix) and len(old) == 16 and
+                name != os.path.basename(path)):
+            shutil.rmtree(os.path.join(cache, name), ignore_errors=True)
+
+    with dbe_profile.stage('readStore'):
+        return readStore(path)
@@ -0,0 +1,208 @@
+# Export layer for the DBE programs.
+
+# The Excel cells at the end of the programs dump the whole eodDF with
+# pd.ExcelWriter, which is slow, and in dbe_loop_1.1.py it only holds the
+# last grid cell anyway. Here:
+#   * grid results are written to fast formats (.csv, .parquet or .npz),
+#     picked by file extension. Rows can be streamed out one M at a time
+#     while the grid runs, so the whole table is never built in memory.
+#   * an .xlsx file can still be written for sharing, using openpyxl's
+#     write-only (constant memory) mode.
+#   * the per-day detail (what eodDF holds) is regenerated on demand for any
+#     chosen (M, N), instead of always being written.
+
+# .parquet needs pyarrow and .xlsx needs openpyxl. They are only imported
+# when such a file is written.
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import dbe_backtest
+import dbe_grid
+import dbe_profile
+
+
+###########################################################################
+# Row writers. Each takes blocks of rows as a dictionary of equal length
+# column arrays, writes them out and forgets them.
+
+class _CsvWriter:
+
+    def __init__(self, path, columns, sheet=None):
+        self.columns = list(columns)
+        self.f = open(path, 'w', newline='')
+        self.f.write(','.join(self.columns) + '\n')
+
+    def write(self, block):
+        pd.DataFrame(block, columns=self.columns).to_csv(
+            self.f, header=False, index=False)
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetWriter:
+
+    def __init__(self, path, columns, sheet=None):
+        import pyarrow.parquet as pq
+        self.pq = pq
+        self.path = path
+        self.columns = list(columns)
+        self.writer = None          # opened on the first block
+
+    def write(self, block):
+        import pyarrow as pa
+        table = pa.Table.from_pydict({c: np.asarray(block[c])
+                                      for c in self.columns})
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class _XlsxWriter:
+
+    def __init__(self, path, columns, sheet='dbe'):
+        from openpyxl import Workbook
+        self.path = path
+        self.columns = list(columns)
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet(sheet)
+        self.ws.append(self.columns)
+
+    def write(self, block):
+        cols = []
+        for c in self.columns:
+            arr = np.asarray(block[c])
+            if arr.dtype.kind == 'M':
+                vals = list(pd.to_datetime(arr).to_pydatetime())
+            else:
+                vals = arr.tolist()
+            # Excel has no NaN; leave those cells empty
+            cols.append([None if v != v else v for v in vals])
+        for row in zip(*cols):
+            self.ws.append(row)
+
+    def close(self):
+        self.wb.save(self.path)
+
+
+_writers = {'.csv': _CsvWriter, '.parquet': _ParquetWriter,
+            '.xlsx': _XlsxWriter}
+
+
+# Open a row writer for path. The format comes from the file extension.
+def openWriter(path, columns, sheet='dbe'):
+    ext = path[path.rfind('.'):].lower()
+    if ext not in _writers:
+        raise ValueError('Unknown export format: {}'.format(path))
+    return _writers[ext](path, columns, sheet)
+
+
+###########################################################################
+# Grid results
+
+gridColumns = ['M', 'N', 'reentryPct', 'cagr', 'tradesPerYr', 'pctInMkt']
+
+
+# Rows of the long results table for one M. Results have one entry per N,
+# or an (N, reentryPct) array.
+def _gridRows(M, Nrange, reentryPcts, c, t, p):
+    pcts = [0] if reentryPcts is None else list(reentryPcts)
+    numN, numP = len(Nrange), len(pcts)
+    return {'M': np.full(numN * numP, M),
+            'N': np.repeat(np.asarray(Nrange), numP),
+            'reentryPct': np.tile(np.asarray(pcts, dtype=np.float64), numN),
+            'cagr': np.ravel(c), 'tradesPerYr': np.ravel(t),
+            'pctInMkt': np.ravel(p)}
+
+
+# Write finished grids. cagr, trades and pctInMkt are the dataframes from
+# the grid search (rows = M, columns = N), or 3-D [M, N, reentryPct] arrays
+# along with Mrange, Nrange and reentryPcts. .npz keeps the grids as arrays,
+# the other formats write one row per cell.
+def exportGrid(path, cagr, trades, pctInMkt, Mrange=None, Nrange=None,
+               reentryPcts=None, sheet='grid'):
+    if isinstance(cagr, pd.DataFrame):
+        Mrange, Nrange = list(cagr.index), list(cagr.columns)
+    cagr, trades, pctInMkt = (np.asarray(g, dtype=np.float64)
+                              for g in (cagr, trades, pctInMkt))
+
+    if path.lower().endswith('.npz'):
+        extra = {} if reentryPcts is None else {'reentryPct': reentryPcts}
+        np.savez_compressed(path, M=np.asarray(Mrange), N=np.asarray(Nrange),
+                            cagr=cagr, trades=trades, pctInMkt=pctInMkt,
+                            **extra)
+        return
+
+    writer = openWriter(path, gridColumns, sheet)
+    try:
+        for i, M in enumerate(Mrange):
+            with dbe_profile.stage('export'):
+                writer.write(_gridRows(M, Nrange, reentryPcts, cagr[i],
+                                       trades[i], pctInMkt[i]))
+    finally:
+        writer.close()
+
+
+# Run the grid and write each M's rows as soon as they are computed (see
+# dbe_grid.iterGrid). Only one M's results are in memory at a time. Returns
+# the best row (highest CAGR) seen.
+def streamGrid(path, origDataDF, Mrange, Nrange, K, series='Adj Close',
+               reentryPcts=None, sheet='grid'):
+    best = None
+    writer = openWriter(path, gridColumns, sheet)
+    try:
+        for M, c, t, p in dbe_grid.iterGrid(origDataDF, Mrange, Nrange, K,
+                                            series, reentryPcts):
+            rows = _gridRows(M, Nrange, reentryPcts, c, t, p)
+            with dbe_profile.stage('export'):
+                writer.write(rows)
+            i = np.nanargmax(rows['cagr'])
+            if best is None or rows['cagr'][i] > best['cagr']:
+                best = {k: v[i] for k, v in rows.items()}
+    finally:
+        writer.close()
+    return best
+
+
+###########################################################################
+# Per-day detail for one configuration
+
+# Per-day columns for one (M, N, reentryPct), the same columns dbe_2.0.py
+# puts in eodDF (see dbe_backtest.py). Returns a dictionary of arrays;
+# signal is the int8 code (1 = 'bull', 0 = 'bear', -1 = not tracked).
+def detailColumns(origDataDF, M, N, K, reentryPct=0, series='Adj Close'):
+    return dbe_backtest.DbeBacktest(origDataDF, M, N, K, reentryPct,
+                                    series).columns()
+
+
+# Per-day detail as a labeled dataframe, like eodDF in dbe_2.0.py.
+def dayDetail(origDataDF, M, N, K, reentryPct=0, series='Adj Close'):
+    return dbe_backtest.DbeBacktest(origDataDF, M, N, K, reentryPct,
+                                    series).frame()
+
+
+# Write the per-day detail for one configuration, chunkDays rows at a time.
+def exportDayDetail(path, origDataDF, M, N, K, reentryPct=0,
+                    series='Adj Close', chunkDays=10000, sheet='dbe'):
+    cols = detailColumns(origDataDF, M, N, K, reentryPct, series)
+    labels = np.array(['', 'bear', 'bull'], dtype=object)
+    data = {'Date': origDataDF.index.values}
+    data.update({c: origDataDF[c].values for c in origDataDF.columns})
+    data.update(cols)
+    columns = [str(c) for c in data]
+    data = dict(zip(columns, data.values()))
+
+    writer = openWriter(path, columns, sheet)
+    try:
+        for start in range(0, len(origDataDF), chunkDays):
+            block = {c: v[start:start + chunkDays] for c, v in data.items()}
+            block['signal'] = labels[block['signal'] + 1]
+            with dbe_profile.stage('export'):
+                writer.write(block)
+    finally:
+        writer.close()
@@ -0,0 +1,292 @@
+# Vectorized grid engine for the "dying bullish euphoria" (DBE) strategy.
+
+# dbe_loop_1.1.py copies the whole dataframe and rebuilds about ten columns for
+# every (M, N) pair. But for a fixed M every value of N is just a threshold on
+# the same "days since last new M-day high" array (see dSinceNewHi in
+# dbe_2.0.py): we are bullish on day t exactly when dSinceNewHi[t] < N. So we
+# compute the new highs once per M and then evaluate every N at once as rows of
+# a 2-D NumPy array (rows = N values, columns = days). New highs come from the
+# one-pass index in dbe_newhi.py, so each extra M is just one comparison.
+
+# The numbers match the cagr/trades/pctInMkt dataframes of dbe_loop_1.1.py:
+#   * signal[t] is 'bull' when there was a new M-day high in the last N days
+#     (days before the first full N-day window count as 'bull', as they do in
+#     the rolling sum of the original loop)
+#   * inMkt[t] = signal[t-1], and False on or before the tracking start K
+#   * dbeCumRtn is the product of the daily returns from K on, using a return
+#     of 1 on days we are out of the market
+#   * trades are changes in inMkt from day K on, pctInMkt counts 'bull' days
+#     from day K on
+
+# The price-threshold reentry rule of dbe_2.0.py (reentryPct) can be added as
+# a third grid dimension, see reentryGrid() and runReentryGrid() below. The
+# functions that work on inMkt accept any number of leading dimensions, with
+# days always along the last axis.
+
+# Each stage is wrapped in a dbe_profile.stage() hook, which does nothing
+# unless profiling has been turned on (see dbe_profile.py).
+
+# Import Modules
+import pandas as pd
+import numpy as np
+import dbe_newhi
+import dbe_profile
+
+days_per_yr = 365.2422
+
+# Bump this when the way results are calculated changes. Results cached by
+# dbe_memo.py under an older version are then thrown away.
+logicVersion = 1
+
+
+# Count days since the last new high. 0 on a new high. Days before the first
+# new high count from the start of the data (day t gets t+1), which is what
+# the cumsum/groupby trick in dbe_2.0.py produces. Days are along the last
+# axis.
+def daysSinceNewHi(newHi):
+    idx = np.arange(newHi.shape[-1])
+    lastHi = np.maximum.accumulate(np.where(newHi, idx, -1), axis=-1)
+    return idx - lastHi
+
+
+# Years since the tracking start K for every day.
+def yearsSince(dates, K):
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    return (dates - dates[K]) / (days_per_yr * np.timedelta64(1, 'D'))
+
+
+# Daily ticker returns. shift(1) is previous day's data, so day 0 is NaN.
+def dailyReturns(adjClose):
+    adjClose = np.asarray(adjClose, dtype=np.float64)
+    tkrRtnDay = np.empty_like(adjClose)
+    tkrRtnDay[0] = np.nan
+    tkrRtnDay[1:] = adjClose[1:] / adjClose[:-1]
+    return tkrRtnDay
+
+
+# Labels for int8 signal codes (1 = 'bull', 0 = 'bear', -1 = not tracked,
+# shown as NaN). Only used when building dataframes for output; the
+# calculations stay on the codes.
+def signalLabels(signal):
+    return pd.Categorical.from_codes(signal, ['bear', 'bull'])
+
+
+# Signal for every N at once. Rows are N values, columns are days.
+# True = 'bull', False = 'bear'.
+def signalGrid(dSinceNewHi, Nvals):
+    Nvals = np.asarray(Nvals)
+    return dSinceNewHi[np.newaxis, :] < Nvals[:, np.newaxis]
+
+
+# inMkt for every row of a signal grid. There is a one-day lag between the
+# end-of-day signal and returns, and we are never in the market on or before
+# the tracking start K.
+def inMktGrid(signal, K):
+    inMkt = np.zeros(signal.shape, dtype=bool)
+    inMkt[..., K+1:] = signal[..., K:-1]
+    return inMkt
+
+
+# Cumulative DBE return starting at index K for every row. Columns before K
+# are NaN, like the shift(-K).cumprod().shift(K) trick in the scripts.
+def cumRtnGrid(inMkt, tkrRtnDay, K):
+    dbeCumRtn = np.full(inMkt.shape, np.nan)
+    dbeRtnDay = np.where(inMkt[..., K:], tkrRtnDay[..., K:], 1.0)
+    dbeCumRtn[..., K:] = np.cumprod(dbeRtnDay, axis=-1)
+    return dbeCumRtn
+
+
+# Summary statistics for every row of a signal grid. Returns the final
+# cumulative return, CAGR, trades per year and percent in the market, each as
+# a 1-D array with one entry per row.
+def gridStats(signal, inMkt, tkrRtnDay, yrs, K):
+    # Only the final cumulative return is needed, so skip the running product
+    with dbe_profile.stage('cumRtn/CAGR'):
+        dbeRtnDay = np.where(inMkt[..., K:], tkrRtnDay[..., K:], 1.0)
+        cumRtn = np.prod(dbeRtnDay, axis=-1)
+        cagr = cumRtn**(1 / yrs[-1])
+
+    # A trade is any change in inMkt from day K on
+    with dbe_profile.stage('trades'):
+        numTrades = np.count_nonzero(inMkt[..., K+1:] != inMkt[..., K:-1],
+                                     axis=-1)
+        tradesPerYr = numTrades / yrs[-1]
+
+    # Percent of 'bull' days from day K on
+    with dbe_profile.stage('pctInMkt'):
+        numBulls = np.count_nonzero(signal[..., K:], axis=-1)
+        pctInMkt = 100 * numBulls / (signal.shape[-1] - K)
+
+    return cumRtn, cagr, tradesPerYr, pctInMkt
+
+
+# Arrays that every grid cell needs: the new-high index for the chosen price
+# series, the daily ticker returns and the years since the tracking start K.
+def gridInputs(origDataDF, K, series='Adj Close'):
+    prices = origDataDF[series].values.astype(np.float64)
+    with dbe_profile.stage('highReach'):
+        reach = dbe_newhi.highReach(prices)
+    with dbe_profile.stage('returns'):
+        tkrRtnDay = dailyReturns(origDataDF['Adj Close'].values)
+        yrs = yearsSince(origDataDF.index.values, K)
+    return reach, tkrRtnDay, yrs
+
+
+# Days since the last new M-day high and the signal for every N.
+def signalForM(reach, M, Nvals):
+    with dbe_profile.stage('newHi'):
+        dSinceNewHi = daysSinceNewHi(dbe_newhi.isNewHi(reach, M))
+    with dbe_profile.stage('signal'):
+        signal = signalGrid(dSinceNewHi, Nvals)
+    return dSinceNewHi, signal
+
+
+# CAGR, trades per year and percent in the market for one M and every N.
+def statsForM(reach, M, Nvals, tkrRtnDay, yrs, K):
+    dSinceNewHi, signal = signalForM(reach, M, Nvals)
+    with dbe_profile.stage('inMkt'):
+        inMkt = inMktGrid(signal, K)
+    stats = gridStats(signal, inMkt, tkrRtnDay, yrs, K)
+    return stats[1:]
+
+
+# Run the whole (M, N) grid. Returns the cagr, trades and pctInMkt dataframes
+# with the same layout as dbe_loop_1.1.py (rows = M, columns = N).
+def runGrid(origDataDF, Mrange, Nrange, K, series='Adj Close'):
+    reach, tkrRtnDay, yrs = gridInputs(origDataDF, K, series)
+
+    cagr = pd.DataFrame(index=Mrange, columns=Nrange, dtype=np.float64)
+    trades = pd.DataFrame(index=Mrange, columns=Nrange, dtype=np.float64)
+    pctInMkt = pd.DataFrame(index=Mrange, columns=Nrange, dtype=np.float64)
+
+    for i, M in enumerate(dbe_profile.configs(Mrange)):
+        c, t, p = statsForM(reach, M, Nrange, tkrRtnDay, yrs, K)
+        cagr.iloc[i, :] = c
+        trades.iloc[i, :] = t
+        pctInMkt.iloc[i, :] = p
+
+    return cagr, trades, pctInMkt
+
+
+###########################################################################
+# Reentry rule as a third grid dimension.
+
+# dbe_2.0.py reenters the market when the signal is 'bear' and the day's low
+# falls below reentryPct * MdayHi, and stays in until the next new M-day high.
+# It does this with a forward fill of True/False markers:
+#   * False on every new high
+#   * True on days from K on with signal 'bear' and Low < rePt
+# and then extends every run of Trues by one day (the shift/add/fix-up
+# steps). When the forward filled value is still NaN, no reentry happens.
+
+# Between two new highs (the last one at day h) the signal is 'bear' from day
+# h+N on. So the forward filled marker at day t is True exactly when there is
+# a day s in [max(h+N, K), t] with Low[s] < rePt[s]. With the "next such day"
+# precomputed for each reentryPct, that is one lookup per (N, day), for all N
+# and all reentryPct values at once.
+
+
+# Rolling M-day max of the price series (NaN for the first M-1 days), as
+# used for rePt in dbe_2.0.py.
+def rollingMax(prices, M):
+    return pd.Series(prices).rolling(M).max().values
+
+
+# Days with Low < reentryPct * MdayHi for each reentryPct. Rows are reentryPct
+# values, columns are days.
+def dipGrid(low, MdayHi, reentryPcts):
+    pcts = np.asarray(reentryPcts, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        return low[np.newaxis, :] < pcts[:, np.newaxis] * MdayHi[np.newaxis, :]
+
+
+# reentrySignal for every reentryPct and every N. dip comes from dipGrid().
+# Returns a (reentryPct, N, day) boolean array.
+def reentryGrid(dSinceNewHi, dip, Nvals, K):
+    n = len(dSinceNewHi)
+    idx = np.arange(n)
+    lastHi = idx - dSinceNewHi          # -1 before the first new high
+
+    # Next dip day at or after each day (n if none). One extra column so
+    # that start days past the end of the data find "none".
+    nextDip = np.full((dip.shape[0], n + 1), n, dtype=np.int32)
+    nextDip[:, :n] = np.where(dip, idx, n)
+    nextDip = np.minimum.accumulate(nextDip[:, ::-1], axis=1)[:, ::-1]
+
+    # First day the signal is 'bear' since the last new high, and not before K
+    Nvals = np.asarray(Nvals)
+    start = lastHi[np.newaxis, :] + Nvals[:, np.newaxis]
+    start = np.minimum(np.maximum(start, K), n)
+
+    # Forward filled marker: True if there was a dip since start, otherwise
+    # False if there has been a new high, otherwise NaN (not defined)
+    marker = nextDip[:, start] <= idx
+    defined = marker | (lastHi >= 0)
+
+    # Extend each run of Trues by one day. NaN on either day gives no reentry.
+    reentrySignal = np.zeros(marker.shape, dtype=bool)
+    reentrySignal[..., 1:] = (defined[..., 1:] & defined[..., :-1] &
+                              (marker[..., 1:] | marker[..., :-1]))
+    return reentrySignal
+
+
+# CAGR, trades per year and percent in the market for one M and every
+# (N, reentryPct). Each result is an (N, reentryPct) array. reentryPct values
+# are done in chunks of about maxCells (N x day) cells to bound memory.
+def statsForMReentry(reach, M, Nvals, reentryPcts, prices, low, tkrRtnDay,
+                     yrs, K, maxCells=20000000):
+    dSinceNewHi, signal = signalForM(reach, M, Nvals)
+    with dbe_profile.stage('inMkt'):
+        inMkt = inMktGrid(signal, K)
+    with dbe_profile.stage('rollingMax'):
+        MdayHi = rollingMax(prices, M)
+    with dbe_profile.stage('dip'):
+        dip = dipGrid(low, MdayHi, reentryPcts)
+
+    numP = len(dip)
+    out = np.empty((3, len(Nvals), numP))
+    step = max(1, maxCells // signal.size)
+    for i in range(0, numP, step):
+        with dbe_profile.stage('reentry'):
+            reentrySignal = reentryGrid(dSinceNewHi, dip[i:i+step], Nvals,
+                                        K)
+        stats = gridStats(signal, inMkt | reentrySignal, tkrRtnDay, yrs, K)
+        out[0, :, i:i+step] = stats[1].T
+        out[1, :, i:i+step] = stats[2].T
+        out[2, :, i:i+step] = stats[3][:, np.newaxis]
+    return out
+
+
+# Run the whole (M, N, reentryPct) grid. Returns the cagr, trades and
+# pctInMkt grids as 3-D arrays indexed [M, N, reentryPct]. A reentryPct of 0
+# gives the same numbers as runGrid().
+def runReentryGrid(origDataDF, Mrange, Nrange, reentryPcts, K,
+                   series='Adj Close'):
+    reach, tkrRtnDay, yrs = gridInputs(origDataDF, K, series)
+    prices = origDataDF[series].values.astype(np.float64)
+    low = origDataDF['Low'].values.astype(np.float64)
+
+    out = np.empty((3, len(Mrange), len(Nrange), len(reentryPcts)))
+    for i, M in enumerate(dbe_profile.configs(Mrange)):
+        out[:, i] = statsForMReentry(reach, M, Nrange, reentryPcts, prices,
+                                     low, tkrRtnDay, yrs, K)
+    cagr, trades, pctInMkt = out
+    return cagr, trades, pctInMkt
+
+
+# Run the grid one M at a time, yielding (M, cagr, trades, pctInMkt) with one
+# entry per N (per (N, reentryPct) if reentryPcts is given). Lets results be
+# written out as they are computed instead of holding the whole grid.
+def iterGrid(origDataDF, Mrange, Nrange, K, series='Adj Close',
+             reentryPcts=None):
+    reach, tkrRtnDay, yrs = gridInputs(origDataDF, K, series)
+    if reentryPcts is not None:
+        prices = origDataDF[series].values.astype(np.float64)
+        low = origDataDF['Low'].values.astype(np.float64)
+    for M in dbe_profile.configs(Mrange):
+        if reentryPcts is None:
+            c, t, p = statsForM(reach, M, Nrange, tkrRtnDay, yrs, K)
+        else:
+            c, t, p = statsForMReentry(reach, M, Nrange, reentryPcts, prices,
+                                       low, tkrRtnDay, yrs, K)
+        yield M, c, t, p
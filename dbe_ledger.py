@@ -0,0 +1,121 @@
+# Trade ledgers for many DBE configurations at once.
+
+# The scripts only report trades per year, from
+# eodDF['inMkt'].shift(-1) - eodDF['inMkt']. Here every round trip is listed:
+#   * entryDate   close at which the position is bought (the day before the
+#                 first day in the market, where the 'trade' column is +1)
+#   * exitDate    close at which it is sold (the last day in the market,
+#                 where 'trade' is -1). A position still open at the end of
+#                 the data is valued at the last close and flagged 'open'.
+#   * holdDays    days in the market (bars, for data that is not daily)
+#   * rtn         return of the trade as a growth factor (1.05 = made 5%)
+#   * reason      'signal' if we went in because the signal turned 'bull',
+#                 'reentry' if the reentry rule brought us in
+# along with the configuration (M, N, reentryPct) and the day indexes. The
+# reentry rule can already have us in the market on the tracking start K;
+# that position is entered at the close of day K and flagged 'reentry'.
+
+# Entries and exits are found for all configurations at once with np.nonzero
+# on a 2-D inMkt array (rows = configurations, columns = days), so the cost
+# is one pass over the array plus work per trade. The return of a trade is a
+# ratio of the cumulative product of the daily returns, which is just
+# adjClose[exit] / adjClose[entry]. The ledger comes back as one dataframe
+# with a row per trade and typed columns (no Python object per trade).
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import dbe_grid
+import dbe_newhi
+
+ledgerReasons = ['signal', 'reentry']
+
+
+# Round trips of every row of a 2-D inMkt array, from the tracking start K
+# on. bull is the signal for the same rows (True = 'bull'); a buy at the
+# close of a 'bull' day is a signal entry, any other buy came from the
+# reentry rule. Returns a dictionary of arrays with one entry per trade,
+# sorted by row and entry day:
+#   row, entry, exit (day indexes of the buy and sell closes), open,
+#   reason (index into ledgerReasons) and rtn.
+def tradeLedger(inMkt, bull, adjClose, K):
+    held = inMkt[:, K:]
+    numDays = held.shape[-1]
+
+    # Every run of days in the market is a trade. edges[j] is -1 where a run
+    # starts at column j and 1 where one ended at column j-1, so each row
+    # alternates starts and ends, whatever the state on day K.
+    edges = np.zeros((held.shape[0], numDays + 1), dtype=np.int8)
+    edges[:, 1:] = held
+    edges[:, :-1] -= held
+    rows, days = np.nonzero(edges)
+    isStart = edges[rows, days] < 0
+    rows, first, last = rows[isStart], days[isStart], days[~isStart] - 1
+
+    # Buy at the close before the first day in the market (day K itself for
+    # a position already open then), sell at the close of the last one
+    entry = np.maximum(first - 1, 0) + K
+    exit = last + K
+    reason = np.where(bull[rows, entry], 0, 1).astype(np.int8)
+    reason[first == 0] = 1
+
+    adjClose = np.asarray(adjClose, dtype=np.float64)
+    return {'row': rows, 'entry': entry, 'exit': exit,
+            'open': last == numDays - 1, 'reason': reason,
+            'rtn': adjClose[exit] / adjClose[entry]}
+
+
+# Ledger for a list of (M, N, reentryPct) configurations. Configurations
+# with the same M share the new-high and reentry calculations. Returns a
+# dataframe with a row per trade, sorted by configuration and entry date;
+# 'config' is the position in configs.
+def runLedger(origDataDF, configs, K, series='Adj Close'):
+    prices = origDataDF[series].values.astype(np.float64)
+    reach = dbe_newhi.highReach(prices)
+    low = origDataDF['Low'].values.astype(np.float64)
+    adjClose = origDataDF['Adj Close'].values.astype(np.float64)
+    configs = [tuple(c) for c in configs]
+
+    parts = []
+    for M in sorted(set(c[0] for c in configs)):
+        ids = [i for i, c in enumerate(configs) if c[0] == M]
+        Nvals = sorted(set(configs[i][1] for i in ids))
+        pcts = sorted(set(configs[i][2] for i in ids))
+        n = [Nvals.index(configs[i][1]) for i in ids]
+        p = [pcts.index(configs[i][2]) for i in ids]
+
+        dSinceNewHi, signal = dbe_grid.signalForM(reach, M, Nvals)
+        inMkt = dbe_grid.inMktGrid(signal, K)[n]
+        if any(pcts):
+            dip = dbe_grid.dipGrid(low, dbe_grid.rollingMax(prices, M),
+                                   pcts)
+            inMkt |= dbe_grid.reentryGrid(dSinceNewHi, dip, Nvals, K)[p, n]
+
+        ledger = tradeLedger(inMkt, signal[n], adjClose, K)
+        ledger['config'] = np.asarray(ids)[ledger['row']]
+        parts.append(ledger)
+
+    ledger = {key: np.concatenate([part[key] for part in parts])
+              for key in ('config', 'entry', 'exit', 'open', 'reason',
+                          'rtn')}
+    order = np.argsort(ledger['config'], kind='stable')
+    ledger = {key: val[order] for key, val in ledger.items()}
+    params = np.array(configs, dtype=np.float64).reshape(-1, 3)
+    dates = origDataDF.index.values
+    return pd.DataFrame({
+        'config': ledger['config'],
+        'M': params[ledger['config'], 0].astype(np.int64),
+        'N': params[ledger['config'], 1].astype(np.int64),
+        'reentryPct': params[ledger['config'], 2],
+        'entryDate': dates[ledger['entry']],
+        'exitDate': dates[ledger['exit']],
+        'entry': ledger['entry'], 'exit': ledger['exit'],
+        'holdDays': ledger['exit'] - ledger['entry'],
+        'rtn': ledger['rtn'],
+        'reason': pd.Categorical.from_codes(ledger['reason'], ledgerReasons),
+        'open': ledger['open']})
+
+
+# Every (M, N, reentryPct) combination of the given ranges, for runLedger()
+def gridConfigs(Mrange, Nrange, reentryPcts=(0,)):
+    return [(M, N, pct) for M in Mrange for N in Nrange for pct in reentryPcts]
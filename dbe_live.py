@@ -0,0 +1,194 @@
+# Incremental (live) version of the DBE calculation in dbe_2.0.py.
+
+# dbe_2.0.py recomputes the whole history (rolling max, days since new high,
+# reentry forward fill, cumulative returns) to find today's bull/bear call.
+# DbeSignal instead keeps just enough state to take one new daily bar at a
+# time and update the signal, inMkt, reentry state and running statistics:
+#
+#   * a monotonic deque of (day, price) for the M-day max. Prices in the deque
+#     are decreasing, so the front is the M-day high, and each bar is pushed
+#     and popped at most once.
+#   * days since the last new M-day high
+#   * the reentry state (True/False, or None before the first marker) and the
+#     previous day's state, which dbe_2.0.py uses to extend the reentry by a
+#     day
+#   * running totals for the cumulative return, trades and bull days
+#
+# Feeding the whole history through update() gives the same columns as
+# dbe_2.0.py bar for bar. The state can be saved to a JSON file so a nightly
+# job can pick up where it left off without replaying 70 years of data.
+
+# Import Modules
+import json
+import collections
+import numpy as np
+
+days_per_yr = 365.2422
+
+
+class DbeSignal:
+
+    def __init__(self, M, N, K, reentryPct=0):
+        # Parameters (same meaning as in dbe_2.0.py)
+        self.M = M
+        self.N = N
+        self.K = K
+        self.reentryPct = reentryPct
+
+        self.t = -1                    # index of the last bar
+        self.window = collections.deque()   # (day, price), decreasing price
+        self.lastNaN = -1              # last day with a missing price
+        self.dSinceNewHi = 0
+        self.bull = None               # raw signal of the last bar
+        self.reentry = None            # forward filled reentry marker
+        self.inMkt = False
+        self.lastAdj = None            # last adjusted close
+        self.startDate = None          # date at index K
+        self.startAdj = None           # adjusted close at index K
+        self.lastDate = None
+
+        # Running statistics from index K on
+        self.dbeCumRtn = np.nan
+        self.numTrades = 0
+        self.numBulls = 0
+        self.numDays = 0
+
+    # Absorb one new daily bar. price is the series used for new highs
+    # ('Adj Close' by default in dbe_2.0.py), low is the day's low (for the
+    # reentry rule) and adjClose is used for returns. Returns a dictionary
+    # with the same quantities as a row of eodDF in dbe_2.0.py.
+    def update(self, date, price, low, adjClose):
+        self.t += 1
+        t = self.t
+        M = self.M
+
+        # Find new M-day highs. Drop days that have left the window and
+        # prices that can never be the max again.
+        if price != price:       # NaN: no max until it leaves the window
+            self.window.clear()
+            self.lastNaN = t
+        else:
+            while self.window and self.window[-1][1] <= price:
+                self.window.pop()
+            self.window.append((t, price))
+        while self.window and self.window[0][0] <= t - M:
+            self.window.popleft()
+
+        if t - self.lastNaN >= M:
+            MdayHi = self.window[0][1]
+            newHi = self.window[0][0] == t
+        else:
+            MdayHi = np.nan
+            newHi = False
+        rePt = self.reentryPct * MdayHi
+
+        # Count days since last new M-day high
+        self.dSinceNewHi = 0 if newHi else self.dSinceNewHi + 1
+
+        # Have we had a new M-day high in the last N days? There is a one-day
+        # lag between the signal and being in the market.
+        prevBull = self.bull
+        self.bull = self.dSinceNewHi < self.N
+        signal = ('bull' if self.bull else 'bear') if t >= self.K else None
+        prevInMkt = self.inMkt
+        inMkt = t > self.K and prevBull
+
+        # Reentry: a new high turns it off, price below rePt while 'bear'
+        # turns it on, otherwise keep the last state. Extend each run of
+        # Trues by one day, as dbe_2.0.py does.
+        prevReentry = self.reentry
+        if newHi:
+            self.reentry = False
+        elif signal == 'bear' and low < rePt:
+            self.reentry = True
+        reentrySignal = (self.reentry is not None and prevReentry is not None
+                         and (self.reentry or prevReentry))
+        self.inMkt = inMkt = bool(inMkt or reentrySignal)
+
+        # Calculate returns and statistics
+        tkrRtnDay = (adjClose / self.lastAdj if self.lastAdj is not None
+                     else np.nan)
+        self.lastAdj = adjClose
+        dbeRtnDay = tkrRtnDay if inMkt else 1.0
+        date = np.datetime64(date, 'D')
+        self.lastDate = date
+
+        if t == self.K:
+            self.startDate = date
+            self.startAdj = adjClose
+            self.dbeCumRtn = dbeRtnDay
+        elif t > self.K:
+            self.dbeCumRtn *= dbeRtnDay
+            self.numTrades += prevInMkt != inMkt
+        if t >= self.K:
+            self.numBulls += self.bull
+            self.numDays += 1
+
+        return dict(date=date, MdayHi=MdayHi, newHi=newHi, rePt=rePt,
+                    dSinceNewHi=self.dSinceNewHi, signal=signal,
+                    inMkt=inMkt, reentrySignal=reentrySignal,
+                    tkrRtnDay=tkrRtnDay, dbeRtnDay=dbeRtnDay,
+                    dbeCumRtn=self.dbeCumRtn if t >= self.K else np.nan)
+
+    # Running statistics, same as the printout in dbe_2.0.py. NaN until we
+    # are past the tracking start K.
+    def stats(self):
+        if self.startDate is None:
+            yrs = np.nan
+        else:
+            yrs = ((self.lastDate - self.startDate) /
+                   (days_per_yr * np.timedelta64(1, 'D')))
+        out = dict(yrs=yrs, dbeCumRtn=self.dbeCumRtn, tkrCAGR=np.nan,
+                   dbeCAGR=np.nan, tradesPerYr=np.nan, pctInMkt=np.nan)
+        if self.numDays > 0:
+            out['tkrCAGR'] = (self.lastAdj / self.startAdj)**(1 / yrs)
+            out['dbeCAGR'] = self.dbeCumRtn**(1 / yrs)
+            out['tradesPerYr'] = self.numTrades / yrs
+            out['pctInMkt'] = 100 * self.numBulls / self.numDays
+        return out
+
+    # Feed every row of a price dataframe through update(). Returns the list
+    # of rows.
+    def updateFromDF(self, df, series='Adj Close'):
+        rows = []
+        for date, price, low, adj in zip(df.index.values, df[series].values,
+                                         df['Low'].values,
+                                         df['Adj Close'].values):
+            rows.append(self.update(date, float(price), float(low),
+                                    float(adj)))
+        return rows
+
+    # Save/restore the state as plain JSON
+    def toDict(self):
+        d = dict(vars(self))
+        d['window'] = list(self.window)
+        for key in ('startDate', 'lastDate'):
+            d[key] = None if d[key] is None else str(d[key])
+        for key, val in d.items():
+            if isinstance(val, float) and val != val:
+                d[key] = None
+            elif isinstance(val, (np.floating, np.integer, np.bool_)):
+                d[key] = val.item()
+        return d
+
+    @classmethod
+    def fromDict(cls, d):
+        obj = cls(d['M'], d['N'], d['K'], d['reentryPct'])
+        for key, val in d.items():
+            setattr(obj, key, val)
+        obj.window = collections.deque(tuple(w) for w in d['window'])
+        if d['dbeCumRtn'] is None:
+            obj.dbeCumRtn = np.nan
+        for key in ('startDate', 'lastDate'):
+            if d[key] is not None:
+                setattr(obj, key, np.datetime64(d[key], 'D'))
+        return obj
+
+    def save(self, fileName):
+        with open(fileName, 'w') as f:
+            json.dump(self.toDict(), f)
+
+    @classmethod
+    def load(cls, fileName):
+        with open(fileName) as f:
+            return cls.fromDict(json.load(f))
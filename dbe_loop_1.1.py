@@ -17,10 +17,10 @@
 
 
 # Import Modules
-import pandas_datareader as web  # used to download stock prices from Yahoo!
 import pandas as pd
 import datetime                  
 import numpy as np
+import dbe_grid
 #import math
 #import json
 
@@ -44,15 +44,23 @@ sheet = "Data"
 
 # Reads in col headings as str. 
 # Slight modifications to upload a csv file
-origDataDF =  pd.read_excel(eodDataFile, sheet, index_col = 0)     
+# The spreadsheet is only parsed the first time. After that it is loaded from
+# a binary copy in .dbe_cache, which is rebuilt if the spreadsheet changes
+# (see dbe_data.py). The dataframe is read-only.
+import dbe_data
+origDataDF = dbe_data.loadPrices(eodDataFile, sheet)
 
 #%% Download Historical stock prices from Y!. Should include date, open, 
 #   high, low, close, adjusted close, and volume.
 
+# Import module that keeps downloaded stock prices on disk
+import dbe_prices
+
 # NOTE: this cell need not be run every time a parameter is changed, as the
 # data in this dataframe is not changed elsewhere in the program. Only run
 # this cell when parameters for this cell are changed! Otherwise you are
-# querying Yahoo for data unnecessarily.
+# querying Yahoo for data unnecessarily. The prices are kept in a local
+# store (.dbe_prices), so running it again only downloads the new days.
 
 # Cell Parameters
 tkr = 'bam'     # Stock ticker that data will be downloaded for
@@ -63,15 +71,22 @@ tkr = 'bam'     # Stock ticker that data will be downloaded for
 startDate = datetime.date(1980, 3, 17)  # start date (yr, mo, day)
 endDate = datetime.date(2019, 6, 28)     # end date
 
-# Download data. Most recent data is on bottom.
-origDataDF = web.DataReader(tkr, 'yahoo', startDate, endDate)
+# Download new data into the store and load it. Most recent data is on
+# bottom.
+refreshed = dbe_prices.refresh([tkr], dbe_prices.YahooProvider(),
+                              start=startDate, end=endDate)
+print(refreshed)
+origDataDF = dbe_prices.loadTicker(tkr)
+if origDataDF is None:
+    raise RuntimeError('No stored data for {}: {}'.format(
+        tkr, refreshed['error'].iloc[0]))
+origDataDF = origDataDF.loc[pd.Timestamp(startDate):pd.Timestamp(endDate)]
 
 #%% Main Loop
 
 # Parameters
 series = 'Adj Close'  # Can use 'Close', 'High', 'Low', 'Open', 'Adj Close'
                       # For indices 'Close' = 'Adj Close' (I think)
-days_per_yr = 365.2422
 
 # Create a range
 Mrange = range(1,63)  # Range of M values. Looking for new M-day high                 
@@ -86,135 +101,316 @@ Nrange = range(10,100)  # Range of N values. M-day high in last N days
 K = 200
 
 # Create dataframes to hold statistics
-cagr = pd.DataFrame(index = Mrange, columns = Nrange)
-trades = pd.DataFrame(index = Mrange, columns = Nrange)
-pctInMkt = pd.DataFrame(index = Mrange, columns = Nrange)
+cagr = pd.DataFrame(index = Mrange, columns = Nrange, dtype = np.float64)
+trades = pd.DataFrame(index = Mrange, columns = Nrange, dtype = np.float64)
+pctInMkt = pd.DataFrame(index = Mrange, columns = Nrange, dtype = np.float64)
+
+# The loop works on plain NumPy arrays: True/False (bool) arrays instead of
+# dataframe columns of 'bull'/'bear' strings, so nothing is copied per trial
+# and every comparison is done in C. The labeled dataframe eodDF is only built
+# after the loop, for the last (M, N), for writing to Excel.
+prices = origDataDF[series].values.astype(np.float64)
+adjClose = origDataDF['Adj Close'].values.astype(np.float64)
+numDays = len(prices)
+
+# Calculate daily tkr returns. Day 0 has no previous day (NaN)
+# Adjusted close will take stock splits and dividends into account
+tkrRtnDay = dbe_grid.dailyReturns(adjClose)
+
+# Intermediate calculatioin: years since starting date at index K
+yrs = dbe_grid.yearsSince(origDataDF.index.values, K)
 
 # Loop thru parameter values.  
 for M in Mrange:     # Looking for a new M day hi
   print('M = ', M)
+
+  # Find new M-day highs. This only depends on M.
+  MdayHi = dbe_grid.rollingMax(prices, M)
+  newHi = prices == MdayHi
+
+  # Count days since last new M-day high. 0 on a new high.
+  dSinceNewHi = dbe_grid.daysSinceNewHi(newHi)
+
   for N in Nrange:   # in last N days 
     #print('N = ', N)
 
     ###################################################                  
-    # Have we had a new M-day high in the last N days?
-    
-    # First copy original downloaded data into new dataframe so that we
-    # don't modify the original dataframe. 
-    eodDF = origDataDF.copy(deep = True)
-    #eodDF = origDataDF[datetime.date(2009, 3, 17):].copy(deep = True)
-    
-    # Find new M-day highs
-    eodDF['MdayHi'] = eodDF[series].rolling(M).max()
-    eodDF['newHi'] = np.where(eodDF[series] == eodDF['MdayHi'], True, False)
-    
-    # Have we had a new M-day high in the last N days?
-    # Sum last N days of 'NewHi' col. Note True=1, False=0.
-    eodDF['signal'] = eodDF['newHi'].rolling(N).sum()
-    
-    # If sum is 0, no new high in N days (bear). Otherwise 'bull'
-    eodDF['signal'] = eodDF.signal.where(eodDF.signal == 0, 'bull')
-    
-    # Change 0s to 'bear's. If 'bull' keep it. Otherwise 'bear'. 
-    eodDF['signal'] = eodDF.signal.where(eodDF.signal == 'bull', 'bear')
+    # Have we had a new M-day high in the last N days? True = 'bull'. Same
+    # as the rolling N-day sum of newHi being more than 0.
+    bull = dSinceNewHi < N
     
     # IMPORTANT: we are assuming the signal is an end-of-day signal. So when
     # the signal changes from 'bear' to 'bull' we would purchase the tkr at 
     # market close. We would therefor be in the market the following day. So 
-    # there is a one-day lag between the signal and returns. This shift will 
-    # move all signals foward one day. We then change the wording: 
-    # bull=True, bear=False.
-    eodDF['inMkt'] = eodDF['signal'].shift(1)
-    eodDF['inMkt'] = eodDF['inMkt'].where(eodDF['inMkt'] == 'bull', False)
-    eodDF['inMkt'] = eodDF['inMkt'].where(eodDF['inMkt'] == False, True)
-    
-    # Set values to False prior to when we start tracking. If we start tracking
-    # at index K that will be when we get our first signal, but we will not be
-    # in the market on that day. The first possible valid signal occurs at 
-    # index M+N.
-    eodDF.loc[eodDF.index.values <= eodDF.index.values[K], 'inMkt'] = False
+    # there is a one-day lag between the signal and returns. 
+    # We are not in the market on or before the day we start tracking (K).
+    # The first possible valid signal occurs at index M+N.
+    inMkt = np.zeros(numDays, dtype = bool)
+    inMkt[K+1:] = bull[K:-1]
     
     ##################################
     # Calculate returns and statistics
-        
-    # Calculate daily tkr returns. shift(1) is previous day's data
-    # Adjusted close will take stock splits and dividends into account
-    eodDF['tkrRtnDay'] = eodDF['Adj Close']/eodDF['Adj Close'].shift(1) 
-    
-    # Calculate cumulative return. Note that first valid sell signal occurs at 
-    # least M+N days after first day of data. Must estable M-day hi followed 
-    # by N days w/o a new M-day hi. So this column only makes sence for index 
-    # location past M+N
-    
-    # Intermediate calculatioin: years since starting date at M+N index
-    eodDF['yrs'] = (eodDF.index.values - eodDF.index.values[K]).astype(
-                   'timedelta64[D]') / (days_per_yr * np.timedelta64(1, 'D'))
 
     # Calculate daily return for dbe. Same as return for ticker, except 1
     # when inMkt is False
-    eodDF['dbeRtnDay'] = eodDF['tkrRtnDay'].where(eodDF['inMkt'] == True, 1) 
-    
-    # Now calculate cumulative return starting at index K. To do this we will 
-    # shift returns prior to K "off" the dataframe, then apply the "cumprod()" 
-    # fcn, then shift the cumulative product back into place. This will create
-    # "Not a Number" (NaN) entries prior to index K, which is probably a good 
-    # thing since we are not tracking yet.
-    eodDF['dbeCumRtn'] = eodDF['dbeRtnDay'].shift(-K).cumprod().shift(K)
-    
-    # Calculate algorithm CAGR
-    eodDF['dbeCAGR'] = eodDF['dbeCumRtn']**(1 / eodDF['yrs'])
+    dbeRtnDay = np.where(inMkt, tkrRtnDay, 1.0)
     
-    # Calculate mean trades per year
-    # Determine when trades took place
-    eodDF['trade'] = eodDF['inMkt'].shift(-1) - eodDF['inMkt']
+    # Now calculate cumulative return starting at index K. Days before K
+    # are not tracked. Only the final value is needed here.
+    dbeCumRtn = np.prod(dbeRtnDay[K:])
     
-    # Erase any trades that occured before we start tracking
-    eodDF.loc[eodDF.index.values < eodDF.index.values[K], 'trade'] = 0
-    
-    # Sum trades: Take absolute value then add
-    tradesPerYr = eodDF.trade.abs().sum() / eodDF['yrs'].iloc[-1]
+    # Calculate mean trades per year. A trade is any change in inMkt from
+    # the start of tracking on.
+    numTrades = np.count_nonzero(inMkt[K+1:] != inMkt[K:-1])
     
     # Calculate percent of time in the market
-    # Erase any signals prior to start of tracking
-    eodDF.loc[eodDF.index.values < eodDF.index.values[K], 'signal'] = np.nan
-    
-    # Count 'bull' and 'bear' days and calculate percent.
-    numBulls = len(eodDF[eodDF['signal'] == 'bull'])
-    numBears = len(eodDF[eodDF['signal'] == 'bear'])
-    p = 100 * numBulls / (numBulls + numBears)
+    # Count 'bull' days from the start of tracking on.
+    numBulls = np.count_nonzero(bull[K:])
     
     #################################
     # Place statistics into dataframes
-    cagr.loc[M,N] = eodDF['dbeCAGR'].iloc[-1]
-    trades.loc[M,N] = tradesPerYr
-    pctInMkt.loc[M,N] = p
+    cagr.loc[M,N] = dbeCumRtn**(1 / yrs[-1])
+    trades.loc[M,N] = numTrades / yrs[-1]
+    pctInMkt.loc[M,N] = 100 * numBulls / (numDays - K)
+
+# Labeled view of the last trial, for writing to Excel
+signal = np.where(np.arange(numDays) >= K, bull, -1).astype(np.int8)
+trade = np.zeros(numDays, dtype = np.int8)
+trade[K:-1] = np.diff(inMkt[K:].astype(np.int8))
+eodDF = origDataDF.copy(deep = True)
+eodDF['MdayHi'] = MdayHi
+eodDF['newHi'] = newHi
+eodDF['signal'] = dbe_grid.signalLabels(signal)
+eodDF['inMkt'] = inMkt
+eodDF['tkrRtnDay'] = tkrRtnDay
+eodDF['yrs'] = yrs
+eodDF['dbeRtnDay'] = dbeRtnDay
+eodDF['dbeCumRtn'] = dbe_grid.cumRtnGrid(inMkt[np.newaxis, :], tkrRtnDay,
+                                         K)[0]
+with np.errstate(divide = 'ignore', invalid = 'ignore'):
+    eodDF['dbeCAGR'] = eodDF['dbeCumRtn']**(1 / eodDF['yrs'])
+eodDF['trade'] = trade
     
 # Calculate CAGR for the ticker
-tkrRtn = eodDF['Adj Close'][-1] / eodDF['Adj Close'][K]
-yrs = eodDF['yrs'].iloc[-1]
-tkrCAGR = tkrRtn**(1/yrs)
+tkrRtn = adjClose[-1] / adjClose[K]
+totalYrs = yrs[-1]
+tkrCAGR = tkrRtn**(1/totalYrs)
 
 # Print some statistics
 print('Ticker CAGR = ', tkrCAGR)    
-print('Years = ', yrs)
+print('Years = ', totalYrs)
+print('Max CAGR = ', cagr.max())
+
+#%% Vectorized Main Loop
+#   Same grid search as the cell above, but much faster. For a fixed M every
+#   N is just a threshold on the days since the last new M-day high, so all N
+#   values are computed at once (see dbe_grid.py). Gives the same cagr, trades
+#   and pctInMkt dataframes. Run this cell instead of the one above.
+#   NOTE: eodDF is not built here. The export cell below can write the
+#   per-day detail for any (M, N).
+
+# Parameters
+series = 'Adj Close'  # Can use 'Close', 'High', 'Low', 'Open', 'Adj Close'
+                      # For indices 'Close' = 'Adj Close' (I think)
+
+Mrange = range(1,63)    # Range of M values. Looking for new M-day high
+Nrange = range(10,100)  # Range of N values. M-day high in last N days
+K = 200                 # Tracking start point. See cell above.
+workers = 1             # Number of processes. More than 1 splits the M
+                        # values across a process pool (see dbe_parallel.py)
+profile = False         # True prints the time spent in each stage (see
+                        # dbe_profile.py) and saves it to dbeProfile.json
+useCache = False        # True keeps every cell's results on disk (see
+                        # dbe_memo.py), so reruns only compute new cells
+
+if profile:
+    import dbe_profile
+    dbe_profile.enable(memory = True)
+    workers = 1         # Only this process is profiled
+
+if useCache:
+    import dbe_memo
+    cagr, trades, pctInMkt = dbe_memo.runGridCached(origDataDF, Mrange,
+                                                    Nrange, K, series)
+elif workers > 1:
+    import dbe_parallel
+    cagr, trades, pctInMkt = dbe_parallel.runGridParallel(
+        origDataDF, Mrange, Nrange, K, series, workers)
+else:
+    cagr, trades, pctInMkt = dbe_grid.runGrid(origDataDF, Mrange, Nrange, K,
+                                              series)
+
+if profile:
+    print(dbe_profile.report().to_string())
+    dbe_profile.saveReport('dbeProfile.json')
+    dbe_profile.disable()
+
+# Calculate CAGR for the ticker
+totalYrs = dbe_grid.yearsSince(origDataDF.index.values, K)[-1]
+tkrRtn = origDataDF['Adj Close'].iloc[-1] / origDataDF['Adj Close'].iloc[K]
+tkrCAGR = tkrRtn**(1/totalYrs)
+
+# Print some statistics
+print('Ticker CAGR = ', tkrCAGR)
+print('Years = ', totalYrs)
 print('Max CAGR = ', cagr.max())
+
+#%% Heatmaps of the grid results (see dbe_plot.py)
+
+# Import Modules
+import matplotlib.pyplot as plt
+import dbe_plot
+
+fig, axs = plt.subplots(1, 3, figsize = (15, 4))
+dbe_plot.heatmap(cagr, ax = axs[0], title = 'CAGR')
+dbe_plot.heatmap(trades, ax = axs[1], title = 'Trades per year')
+dbe_plot.heatmap(pctInMkt, ax = axs[2], title = 'Percent in market')
+
+#%% Vectorized Main Loop with reentry
+#   Adds the price-threshold reentry rule from dbe_2.0.py as a third grid
+#   dimension. If the price drops below (reentryPct * most recent M-day high)
+#   while the signal is 'bear' we reenter the market until the next new high.
+#   Results are 3-D arrays indexed [M, N, reentryPct]. reentryPct = 0 is the
+#   same as no reentry.
+
+# Parameters
+series = 'Adj Close'
+Mrange = range(1,63)
+Nrange = range(10,100)
+reentryPcts = [0, 0.8, 0.85, 0.9, 0.95]
+K = 200
+workers = 1             # More than 1 runs on a process pool
+useCache = False        # Reuse results saved by earlier runs (dbe_memo.py)
+
+if useCache:
+    import dbe_memo
+    cagr3, trades3, pctInMkt3 = dbe_memo.runGridCached(
+        origDataDF, Mrange, Nrange, K, series, reentryPcts)
+elif workers > 1:
+    import dbe_parallel
+    cagr3, trades3, pctInMkt3 = dbe_parallel.runGridParallel(
+        origDataDF, Mrange, Nrange, K, series, workers,
+        reentryPcts = reentryPcts)
+else:
+    cagr3, trades3, pctInMkt3 = dbe_grid.runReentryGrid(
+        origDataDF, Mrange, Nrange, reentryPcts, K, series)
+
+# Best cell
+i, j, k = np.unravel_index(np.nanargmax(cagr3), cagr3.shape)
+print('Max CAGR = ', cagr3[i, j, k])
+print('M = ', Mrange[i], ' N = ', Nrange[j], ' Reentry Pct = ', reentryPcts[k])
+
+#%% Risk metrics
+#   Max drawdown, volatility, Sharpe and Sortino ratios, longest time out of
+#   the market and worst trade for every (M, N) cell, along with cagr,
+#   trades and pctInMkt (see dbe_metrics.py). risk['maxDrawdown'] etc. are
+#   arrays indexed [M, N], or [M, N, reentryPct] if reentryPcts is given.
+
+import dbe_metrics
+
+# Parameters
+series = 'Adj Close'
+Mrange = range(1,63)
+Nrange = range(10,100)
+reentryPcts = None      # Or a list, e.g. [0, 0.8, 0.85, 0.9, 0.95]
+K = 200
+riskFree = 0.0          # Yearly risk-free rate for Sharpe and Sortino
+
+risk = dbe_metrics.runRiskGrid(origDataDF, Mrange, Nrange, K, series,
+                               reentryPcts, riskFree)
+
+# Best cell by Sharpe ratio
+best = np.unravel_index(np.nanargmax(risk['sharpe']), risk['sharpe'].shape)
+print('Max Sharpe = ', risk['sharpe'][best], ' M = ', Mrange[best[0]],
+      ' N = ', Nrange[best[1]])
+print('Max drawdown = ', risk['maxDrawdown'][best])
+
+#%% Adaptive search
+#   Instead of every cell, evaluates a coarse grid and then refines around
+#   the best cells (see dbe_search.py). Finds the same best (M, N) as the
+#   full grid on far fewer cells. evaluated lists every cell that was run.
+
+# Parameters
+series = 'Adj Close'
+Mrange = range(1,501)
+Nrange = range(1,501)
+reentryPcts = None      # Or a list, e.g. [0, 0.8, 0.85, 0.9, 0.95]
+K = 1000
+budget = 5000           # Most cells to evaluate
+
+import dbe_search
+best, evaluated = dbe_search.searchGrid(origDataDF, Mrange, Nrange, K,
+                                        series, reentryPcts, budget)
+print('Cells evaluated = ', len(evaluated), ' of ',
+      len(Mrange) * len(Nrange) * len(reentryPcts or [0]))
+print('Max CAGR = ', best['cagr'])
+print('M = ', best['M'], ' N = ', best['N'], ' Reentry Pct = ',
+      best['reentryPct'])
+
+#%% Walk-forward
+#   The grid above is fit over the whole history. Here (M, N) is picked on a
+#   rolling training window, used on the following test window, and the test
+#   windows are chained into one out-of-sample equity curve (see
+#   dbe_walkforward.py).
+
+import dbe_walkforward
+
+# Parameters
+series = 'Adj Close'
+Mrange = range(20,301,10)
+Nrange = range(20,301,10)
+trainDays = 2520      # Training window, market days (about 10 years)
+testDays = 252        # Test window, market days (about 1 year)
+anchored = False      # True: training windows all start at the first day
+
+folds, oosEquity = dbe_walkforward.walkForward(origDataDF, Mrange, Nrange,
+                                               trainDays, testDays,
+                                               anchored = anchored,
+                                               series = series)
+print(folds)
+print('Out-of-sample CAGR = ',
+      dbe_walkforward.oosCAGR(origDataDF, oosEquity))
+
+#%% Start-date sweep
+#   How much do the results depend on the tracking start K? Computes CAGR,
+#   trades and time in the market for every start date in one pass (see
+#   dbe_startsweep.py). The reentry rule is not included.
+
+import dbe_startsweep
+
+# Parameters
+series = 'Adj Close'
+M = 122
+N = 214
+stride = 1            # Every stride-th start day, starting at M+N
+
+startDF = dbe_startsweep.startCurve(origDataDF, M, N, stride = stride,
+                                    series = series)
+print(startDF[['cagr', 'tkrCAGR', 'tradesPerYr', 'pctInMkt']].describe())
+print('Beat buy and hold from ', 100 * (startDF['cagr'] >
+                                         startDF['tkrCAGR']).mean(),
+      '% of the start dates')
+
 #%%############################################## 
-# Run this cell to write output to an Excel file.
-# Kind of slow.
+# Run this cell to write output to a file (see dbe_export.py).
+# .csv, .parquet and .npz are fast. .xlsx is slower but handy for sharing;
+# it is written in constant memory.
+
+import dbe_export
 
 # Parameters
-excelOut = 'dbeStats.xlsx'       # Excel file name
-sheet0 = 'dbe'                   # Sheet name
-sheet1 = 'cagr'                  # Sheet name
-sheet2 = 'trades'
-sheet3 = 'pctInMkt'
+gridOut = 'dbeStats.csv'         # Grid results, one row per (M, N).
+                                 # .npz keeps cagr, trades and pctInMkt
+                                 # as arrays.
+detailOut = 'dbeDetail.csv'      # Per-day detail (what eodDF holds)
+detailM = None                   # Set these to write the per-day detail
+detailN = None                   # for that (M, N). It is recalculated, so
+                                 # any cell of the grid can be picked.
 
-# Write to Excel file
+# Write to file
 # IF you don't know which folder this is writing to try typing "pwd" at the 
 # prompt. It should return the current working directory.
-writerObj = pd.ExcelWriter(excelOut)
-eodDF.to_excel(writerObj, sheet0)       # writes to an excel sheet
-cagr.to_excel(writerObj, sheet1)        # writes to an excel sheet
-trades.to_excel(writerObj, sheet2) 
-pctInMkt.to_excel(writerObj, sheet3) 
-writerObj.save()                        # saves the excel workbook to disk
+dbe_export.exportGrid(gridOut, cagr, trades, pctInMkt)
+if detailM is not None:
+    dbe_export.exportDayDetail(detailOut, origDataDF, detailM, detailN, K,
+                               0, series)
@@ -0,0 +1,201 @@
+# Persistent cache of grid results for the DBE programs.
+
+# Grids are rerun over and over with overlapping ranges: a wider Nrange, a
+# different K or series. Every (M, N, reentryPct) cell's results are kept in
+# a SQLite database keyed by
+#   (data hash, series, M, N, K, reentryPct)
+# so a rerun only computes the cells that are missing. The data hash covers
+# the dates and the price columns the calculation reads, so editing or
+# extending the spreadsheet gives new keys.
+
+# Each row also records dbe_grid.logicVersion. When the calculation changes
+# and the version is bumped, old rows are deleted the next time the cache is
+# opened. The cache is kept under maxRows rows by dropping the least recently
+# used ones.
+
+# Usage (same results as dbe_grid.runGrid / runReentryGrid):
+#   cagr, trades, pctInMkt = dbe_memo.runGridCached(origDataDF, Mrange,
+#                                                   Nrange, K)
+
+# Import Modules
+import os
+import time
+import sqlite3
+import hashlib
+import numpy as np
+import pandas as pd
+import dbe_grid
+import dbe_data
+
+# Default database file, in cacheDir under the working directory
+cacheFile = os.path.join(dbe_data.cacheDir, 'results.sqlite')
+
+# Bump this if the table layout or the way keys are written changes. Caches
+# written by an older version are emptied when opened. (Version 1 stored K
+# and reentryPct in each other's columns.)
+cacheVersion = 2
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS results (
+    dataHash TEXT, series TEXT, M INTEGER, N INTEGER, K INTEGER,
+    reentryPct REAL, version INTEGER, cagr REAL, tradesPerYr REAL,
+    pctInMkt REAL, lastUsed REAL,
+    PRIMARY KEY (dataHash, series, M, N, K, reentryPct));
+CREATE INDEX IF NOT EXISTS resultsLastUsed ON results (lastUsed);
+'''
+
+
+# Hash of the data a grid reads: the dates, the price series, 'Adj Close'
+# (returns) and, for a reentry grid, 'Low'.
+def dataHash(origDataDF, series='Adj Close', reentry=False):
+    h = hashlib.sha256()
+    h.update(np.asarray(origDataDF.index.values,
+                        dtype='datetime64[ns]').tobytes())
+    columns = [series, 'Adj Close'] + (['Low'] if reentry else [])
+    for col in dict.fromkeys(columns):
+        h.update(col.encode())
+        h.update(np.ascontiguousarray(origDataDF[col].values,
+                                      dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+
+# reentryPct as stored in the key, so 0.9 and 0.9000000000000001 match
+def _pctKey(pct):
+    return round(float(pct), 10)
+
+
+class ResultCache:
+
+    def __init__(self, fileName=cacheFile, maxRows=5000000):
+        parent = os.path.dirname(os.path.abspath(fileName))
+        os.makedirs(parent, exist_ok=True)
+        self.maxRows = maxRows
+        self.db = sqlite3.connect(fileName)
+        # A results cache does not need every commit flushed to disk
+        self.db.execute('PRAGMA journal_mode = WAL')
+        self.db.execute('PRAGMA synchronous = NORMAL')
+        self.db.executescript(_schema)
+        (version,) = self.db.execute('PRAGMA user_version').fetchone()
+        if version != cacheVersion:
+            with self.db:
+                self.db.execute('DELETE FROM results')
+            self.db.execute('PRAGMA user_version = {:d}'.format(cacheVersion))
+        # Drop results from older versions of the calculation
+        with self.db:
+            self.db.execute('DELETE FROM results WHERE version != ?',
+                            (dbe_grid.logicVersion,))
+
+    # Cached results for one dataset, series and K. Returns a dictionary
+    # (M, N, reentryPct) -> (cagr, tradesPerYr, pctInMkt) for the cells in
+    # Mvals, and marks them as used.
+    def lookup(self, key, series, K, Mvals):
+        rows = {}
+        Mvals = [int(M) for M in Mvals]
+        now = time.time()
+        with self.db:
+            for i in range(0, len(Mvals), 500):
+                part = Mvals[i:i+500]
+                where = ('WHERE dataHash = ? AND series = ? AND K = ? AND '
+                         'M IN ({})'.format(','.join('?' * len(part))))
+                args = [key, series, int(K)] + part
+                for M, N, pct, c, t, p in self.db.execute(
+                        'SELECT M, N, reentryPct, cagr, tradesPerYr, '
+                        'pctInMkt FROM results ' + where, args):
+                    rows[M, N, pct] = (c, t, p)
+                self.db.execute('UPDATE results SET lastUsed = ? ' + where,
+                                [now] + args)
+        return rows
+
+    # Store results. cells is a list of (M, N, reentryPct, cagr,
+    # tradesPerYr, pctInMkt) tuples.
+    def store(self, key, series, K, cells):
+        now = time.time()
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO results (dataHash, series, M, N, '
+                'K, reentryPct, version, cagr, tradesPerYr, pctInMkt, '
+                'lastUsed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(key, series, int(M), int(N), int(K), _pctKey(pct),
+                  dbe_grid.logicVersion, float(c), float(t), float(p), now)
+                 for M, N, pct, c, t, p in cells])
+        self.evict()
+
+    # Drop the least recently used rows above maxRows.
+    def evict(self):
+        (numRows,) = self.db.execute('SELECT COUNT(*) FROM results').fetchone()
+        if numRows > self.maxRows:
+            with self.db:
+                self.db.execute('DELETE FROM results WHERE rowid IN '
+                                '(SELECT rowid FROM results '
+                                'ORDER BY lastUsed LIMIT ?)',
+                                (numRows - self.maxRows,))
+
+    def clear(self):
+        with self.db:
+            self.db.execute('DELETE FROM results')
+
+    def close(self):
+        self.db.close()
+
+
+# Same as dbe_grid.runGrid (reentryPcts=None) or dbe_grid.runReentryGrid,
+# but cells already in the cache are not recomputed. For each M only the
+# missing N and reentryPct values are run. cache is a ResultCache or a file
+# name.
+def runGridCached(origDataDF, Mrange, Nrange, K, series='Adj Close',
+                  reentryPcts=None, cache=cacheFile):
+    own = not isinstance(cache, ResultCache)
+    if own:
+        cache = ResultCache(cache)
+
+    pcts = [0] if reentryPcts is None else list(reentryPcts)
+    Nvals = np.asarray(Nrange)
+    key = dataHash(origDataDF, series, reentryPcts is not None)
+    out = np.empty((3, len(Mrange), len(Nvals), len(pcts)))
+
+    try:
+        found = cache.lookup(key, series, K, Mrange)
+        missing = np.ones(out.shape[1:], dtype=bool)
+        for i, M in enumerate(Mrange):
+            for j, N in enumerate(Nvals):
+                for k, pct in enumerate(pcts):
+                    hit = found.get((int(M), int(N), _pctKey(pct)))
+                    if hit is not None:
+                        out[:, i, j, k] = hit
+                        missing[i, j, k] = False
+
+        if missing.any():
+            reach, tkrRtnDay, yrs = dbe_grid.gridInputs(origDataDF, K, series)
+            if reentryPcts is not None:
+                prices = origDataDF[series].values.astype(np.float64)
+                low = origDataDF['Low'].values.astype(np.float64)
+        cells = []
+        for i, M in enumerate(Mrange):
+            if not missing[i].any():
+                continue
+            # Rerun the N and reentryPct values with any missing cell
+            js = np.flatnonzero(missing[i].any(axis=1))
+            ks = np.flatnonzero(missing[i].any(axis=0))
+            if reentryPcts is None:
+                res = dbe_grid.statsForM(reach, M, Nvals[js], tkrRtnDay, yrs,
+                                         K)
+                res = np.asarray(res)[:, :, np.newaxis]
+            else:
+                res = dbe_grid.statsForMReentry(reach, M, Nvals[js],
+                                                [pcts[k] for k in ks], prices,
+                                                low, tkrRtnDay, yrs, K)
+            out[:, i, js[:, np.newaxis], ks] = res
+            cells += [(M, Nvals[j], pcts[k]) + tuple(out[:, i, j, k])
+                      for j in js for k in ks]
+        if cells:
+            cache.store(key, series, K, cells)
+    finally:
+        if own:
+            cache.close()
+
+    cagr, trades, pctInMkt = out
+    if reentryPcts is not None:
+        return cagr, trades, pctInMkt
+    return tuple(pd.DataFrame(g[:, :, 0], index=Mrange, columns=Nrange,
+                              dtype=np.float64)
+                 for g in (cagr, trades, pctInMkt))
@@ -0,0 +1,157 @@
+# Risk metrics for every cell of the DBE grid.
+
+# The grids only give CAGR, trades per year and percent in the market. To
+# choose parameters we also want to know how rough the ride was. For every
+# (M, N) (and reentryPct) cell this computes, from day K on:
+#   * maxDrawdown  largest drop of the equity curve from its running max,
+#                  as a fraction (0.3 = 30% below the previous peak)
+#   * volatility   annualized standard deviation of the daily DBE returns
+#   * sharpe       annualized mean / standard deviation of the daily returns
+#                  in excess of the risk-free rate
+#   * sortino      same, but dividing by the downside deviation
+#   * longestOut   longest stretch out of the market, in days (bars)
+#   * worstTrade   return of the worst round trip (entry to exit), as a
+#                  growth factor (0.8 = lost 20%). An open position at the
+#                  end of the data counts as a trade, and so does one already
+#                  open on day K (the reentry rule can do that).
+# along with cagr, tradesPerYr and pctInMkt (same numbers as dbe_grid.py).
+
+# Everything comes from one equity curve per cell, built for all N values of
+# an M at once as a 2-D array (rows = N, columns = days), so the extra
+# metrics cost a few more passes over an array that is already there. The
+# results go into preallocated arrays, one per metric.
+
+# "Annualized" uses the number of days per year in the data, so it also
+# works for bars that are not daily.
+
+# Import Modules
+import numpy as np
+import dbe_grid
+import dbe_newhi
+
+# Metric names and the type of their result arrays
+riskMetrics = [('cagr', np.float64), ('tradesPerYr', np.float64),
+               ('pctInMkt', np.float64), ('maxDrawdown', np.float64),
+               ('volatility', np.float64), ('sharpe', np.float64),
+               ('sortino', np.float64), ('longestOut', np.int64),
+               ('worstTrade', np.float64)]
+
+
+# All metrics for every row of a signal grid. signal and inMkt are 2-D
+# (rows, days), riskFree is a yearly rate. Returns a dictionary with an
+# array of one value per row for every metric.
+def riskStats(signal, inMkt, tkrRtnDay, yrs, K, riskFree=0.0):
+    inMkt = inMkt[:, K:]
+    numRows, numDays = inMkt.shape
+    daysPerYr = (numDays - 1) / yrs[-1]
+    stats = {}
+
+    # Equity curve from 1 before day K (day K earns its return if the
+    # reentry rule already has us in the market)
+    dbeRtnDay = np.where(inMkt, tkrRtnDay[K:], 1.0)
+    equity = np.cumprod(dbeRtnDay, axis=-1)
+    stats['cagr'] = equity[:, -1]**(1 / yrs[-1])
+    stats['pctInMkt'] = 100 * np.count_nonzero(signal[:, K:], axis=-1) / (
+        numDays)
+
+    # Drawdown from the running max
+    peak = np.maximum.accumulate(equity, axis=-1)
+    stats['maxDrawdown'] = 1 - np.min(equity / peak, axis=-1)
+
+    # Daily returns after day K. Sums instead of np.std saves passes over
+    # the array.
+    rtn = dbeRtnDay[:, 1:]
+    rtn -= 1
+    numRtn = rtn.shape[-1]
+    dailyFree = (1 + riskFree)**(1 / daysPerYr) - 1
+    mean = rtn.sum(axis=-1) / numRtn
+    std = np.sqrt(np.maximum(np.einsum('ij,ij->i', rtn, rtn) / numRtn -
+                             mean**2, 0))
+    rtn -= dailyFree
+    np.minimum(rtn, 0, out=rtn)
+    downside = np.sqrt(np.einsum('ij,ij->i', rtn, rtn) / numRtn)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stats['volatility'] = std * np.sqrt(daysPerYr)
+        stats['sharpe'] = (mean - dailyFree) / std * np.sqrt(daysPerYr)
+        stats['sortino'] = (mean - dailyFree) / downside * np.sqrt(daysPerYr)
+
+    # Trades, as in dbe_grid.gridStats: changes of inMkt after day K
+    stats['tradesPerYr'] = np.count_nonzero(inMkt[:, 1:] != inMkt[:, :-1],
+                                            axis=-1) / yrs[-1]
+
+    # Worst trade: equity on the last day in the market over equity the day
+    # before the first (1 for a position already open on day K). A position
+    # still open at the end exits on the last day.
+    rows, first, last = _runs(inMkt)
+    before = np.ones(len(first))
+    later = first > 0
+    before[later] = equity[rows[later], first[later] - 1]
+    worst = np.full(numRows, np.inf)
+    np.minimum.at(worst, rows, equity[rows, last] / before)
+    stats['worstTrade'] = np.where(np.isinf(worst), np.nan, worst)
+
+    # Longest time out: gaps between the end of one trade (or the start)
+    # and the next entry, and after the last trade
+    prevLast = np.full_like(last, -1)
+    sameRow = rows[1:] == rows[:-1]
+    prevLast[1:][sameRow] = last[:-1][sameRow]
+    longest = np.zeros(numRows, dtype=np.int64)
+    np.maximum.at(longest, rows, first - prevLast - 1)
+    lastExit = np.full(numRows, -1, dtype=np.int64)
+    np.maximum.at(lastExit, rows, last)
+    stats['longestOut'] = np.maximum(longest, numDays - 1 - lastExit)
+    return stats
+
+
+# Runs of True in every row of a 2-D array. Returns the row, first and last
+# column of each run, sorted by row and column. Runs are rare, so only their
+# end points are kept.
+def _runs(x):
+    edges = np.zeros((x.shape[0], x.shape[1] + 1), dtype=np.int8)
+    edges[:, 1:] = x
+    edges[:, :-1] -= x
+    # edges[t] is -1 where a run starts at t, 1 where one ends at t-1
+    rows, days = np.nonzero(edges)
+    start = edges[rows, days] < 0
+    return rows[start], days[start], days[~start] - 1
+
+
+# Preallocated result arrays, one per metric
+def _emptyStats(shape):
+    return {name: np.empty(shape, dtype=dtype) for name, dtype in riskMetrics}
+
+
+# Run the (M, N) grid, or the (M, N, reentryPct) grid if reentryPcts is
+# given, and return a dictionary with one array per metric indexed [M, N]
+# or [M, N, reentryPct].
+def runRiskGrid(origDataDF, Mrange, Nrange, K, series='Adj Close',
+                reentryPcts=None, riskFree=0.0):
+    reach, tkrRtnDay, yrs = dbe_grid.gridInputs(origDataDF, K, series)
+    if reentryPcts is None:
+        out = _emptyStats((len(Mrange), len(Nrange)))
+    else:
+        out = _emptyStats((len(Mrange), len(Nrange), len(reentryPcts)))
+        prices = origDataDF[series].values.astype(np.float64)
+        low = origDataDF['Low'].values.astype(np.float64)
+
+    for i, M in enumerate(Mrange):
+        dSinceNewHi = dbe_grid.daysSinceNewHi(dbe_newhi.isNewHi(reach, M))
+        signal = dbe_grid.signalGrid(dSinceNewHi, Nrange)
+        inMkt = dbe_grid.inMktGrid(signal, K)
+        if reentryPcts is None:
+            stats = riskStats(signal, inMkt, tkrRtnDay, yrs, K, riskFree)
+            for name in out:
+                out[name][i] = stats[name]
+            continue
+
+        # One reentryPct at a time keeps memory at one (N, day) grid
+        dip = dbe_grid.dipGrid(low, dbe_grid.rollingMax(prices, M),
+                               reentryPcts)
+        for k in range(len(reentryPcts)):
+            reentrySignal = dbe_grid.reentryGrid(dSinceNewHi, dip[k:k+1],
+                                                 Nrange, K)[0]
+            stats = riskStats(signal, inMkt | reentrySignal, tkrRtnDay, yrs,
+                              K, riskFree)
+            for name in out:
+                out[name][i, :, k] = stats[name]
+    return out
@@ -0,0 +1,51 @@
+# One-pass "new M-day high for every M" index.
+
+# The scripts find new M-day highs with eodDF[series].rolling(M).max(), which
+# has to be redone for every M. Instead we make a single pass over the prices
+# and find, for every day, the most recent earlier day with a strictly higher
+# price (a "previous greater element" search with a stack). The distance back
+# to that day is how far back today's high reaches:
+#
+#   reach[t] = t - (last day before t with a higher price)
+#
+# If no earlier day is higher, reach[t] = t + 1 (the whole history). Day t is a
+# new M-day high exactly when reach[t] >= M, the same as
+# prices[t] == prices.rolling(M).max()[t]. Ties count as a new high, just like
+# the rolling max test. So once the index is built, checking any M is a single
+# comparison.
+
+# Import Modules
+import numpy as np
+
+
+# Build the index. Each day is pushed onto and popped off the stack at most
+# once, so this is O(n) no matter how many M values are checked later.
+# A missing price (NaN) acts like a price higher than anything else: the
+# rolling max is NaN for any window that contains it, so no window may reach
+# back past it. The NaN day itself gets reach 0 and is never a new high.
+def highReach(prices):
+    prices = np.asarray(prices, dtype=np.float64).tolist()
+    reach = np.empty(len(prices), dtype=np.int64)
+    stackIdx = []          # days with prices in decreasing order
+    stackPx = []
+    lastNaN = -1           # most recent day with a missing price
+    for t, p in enumerate(prices):
+        if p != p:         # NaN
+            lastNaN = t
+            stackIdx = []
+            stackPx = []
+            reach[t] = 0
+            continue
+        while stackPx and stackPx[-1] <= p:
+            stackIdx.pop()
+            stackPx.pop()
+        reach[t] = t - (stackIdx[-1] if stackIdx else lastNaN)
+        stackIdx.append(t)
+        stackPx.append(p)
+    return reach
+
+
+# Is each day a new M-day high? Same result as
+#   prices == prices.rolling(M).max()
+def isNewHi(reach, M):
+    return reach >= M
@@ -0,0 +1,133 @@
+# Parallel grid search for the "dying bullish euphoria" (DBE) strategy.
+
+# Splits the M values (and reentryPct values, if any) of the grid across a
+# pool of worker processes. Each worker evaluates all N values for its block
+# with the vectorized engine in dbe_grid.py. The arrays every worker needs
+# (new-high index, daily returns and years since K) are published once
+# through shared memory, so they are not pickled and sent with every task;
+# a worker attaches to them when it starts.
+
+# Every cell is computed by exactly the same code no matter which worker gets
+# it, and results are placed back by row number, so the output does not
+# depend on the number of workers.
+
+# NOTE: on Windows (and in Spyder) the pool starts fresh Python processes, so
+# this module must be importable from the working directory.
+
+# Import Modules
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import dbe_grid
+
+# Arrays attached by each worker process. Filled in by _attach().
+_shared = {}
+
+
+# Copy an array into a new shared memory block. Returns the block and a small
+# description (name, shape, dtype) that is cheap to send to the workers.
+def _publish(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+    view[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+# Split range(n) into numBlocks contiguous, nonempty slices
+def _blocks(n, numBlocks):
+    edges = np.linspace(0, n, numBlocks + 1).round().astype(int)
+    return [slice(a, b) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+# Worker initializer: attach to the shared arrays once per process.
+def _attach(specs, K, Nvals, reentryPcts):
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key + 'Shm'] = shm      # keep the block open
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _shared['K'] = K
+    _shared['Nvals'] = Nvals
+    _shared['reentryPcts'] = reentryPcts
+
+
+# Worker task: evaluate every N for a block of M values (and a block of
+# reentryPct values, if any). Returns the block position along with the
+# results so they can be put back in order.
+def _runBlock(Mvals, cols):
+    s = _shared
+    if s['reentryPcts'] is None:
+        out = np.empty((3, len(Mvals), len(s['Nvals'])))
+        for i, M in enumerate(Mvals):
+            out[:, i, :] = dbe_grid.statsForM(s['reach'], M, s['Nvals'],
+                                              s['tkrRtnDay'], s['yrs'],
+                                              s['K'])
+    else:
+        pcts = s['reentryPcts'][cols]
+        out = np.empty((3, len(Mvals), len(s['Nvals']), len(pcts)))
+        for i, M in enumerate(Mvals):
+            out[:, i] = dbe_grid.statsForMReentry(s['reach'], M, s['Nvals'],
+                                                  pcts, s['prices'], s['low'],
+                                                  s['tkrRtnDay'], s['yrs'],
+                                                  s['K'])
+    return out
+
+
+# Run the whole (M, N) grid on a process pool. Returns the cagr, trades and
+# pctInMkt dataframes, same as dbe_grid.runGrid. workers defaults to the
+# number of cores. blocksPerWorker > 1 evens out the load, since large M
+# values don't cost the same as small ones.
+# If reentryPcts is given the (M, N, reentryPct) grid is run instead, and
+# the results are 3-D arrays indexed [M, N, reentryPct], the same as
+# dbe_grid.runReentryGrid. The M and reentryPct values are both split up.
+def runGridParallel(origDataDF, Mrange, Nrange, K, series='Adj Close',
+                    workers=None, blocksPerWorker=4, reentryPcts=None):
+    workers = workers or os.cpu_count() or 1
+    reach, tkrRtnDay, yrs = dbe_grid.gridInputs(origDataDF, K, series)
+    Mvals = np.asarray(Mrange)
+    Nvals = np.asarray(Nrange)
+    arrays = [('reach', reach), ('tkrRtnDay', tkrRtnDay), ('yrs', yrs)]
+
+    # Contiguous blocks of M values, and of reentryPct values if there are
+    # fewer M blocks than we'd like. Blocks are slices into the results.
+    numBlocks = max(1, min(len(Mvals), workers * blocksPerWorker))
+    mBlocks = _blocks(len(Mvals), numBlocks)
+    if reentryPcts is None:
+        pBlocks = [slice(None)]
+        results = np.empty((3, len(Mvals), len(Nvals)))
+    else:
+        reentryPcts = np.asarray(reentryPcts, dtype=np.float64)
+        numPBlocks = max(1, min(len(reentryPcts),
+                                workers * blocksPerWorker // numBlocks))
+        pBlocks = _blocks(len(reentryPcts), numPBlocks)
+        results = np.empty((3, len(Mvals), len(Nvals), len(reentryPcts)))
+        arrays += [('prices', origDataDF[series].values.astype(np.float64)),
+                   ('low', origDataDF['Low'].values.astype(np.float64))]
+
+    shms = []
+    try:
+        specs = {}
+        for key, arr in arrays:
+            shm, specs[key] = _publish(arr)
+            shms.append(shm)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(specs, K, Nvals, reentryPcts)
+                                 ) as pool:
+            tasks = [(rows, cols) for rows in mBlocks for cols in pBlocks]
+            futures = [pool.submit(_runBlock, Mvals[rows], cols)
+                       for rows, cols in tasks]
+            for (rows, cols), f in zip(tasks, futures):
+                results[:, rows, ..., cols] = f.result()
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    if reentryPcts is not None:
+        cagr, trades, pctInMkt = results
+        return cagr, trades, pctInMkt
+    cagr, trades, pctInMkt = (pd.DataFrame(r, index=Mrange, columns=Nrange)
+                              for r in results)
+    return cagr, trades, pctInMkt
@@ -0,0 +1,131 @@
+# Plotting for the DBE programs.
+
+# The plotting cells in dbe_2.0.py split the DBE curve into in-market and
+# out-of-market pieces with groupby and draw each piece with its own
+# ax.plot call. With thousands of trades that is slow, and since each piece
+# stops at its own last day there is a gap at every trade.
+
+# Here the curve is cut into one segment per day (from the close of day t-1
+# to the close of day t) and the segments are drawn as one LineCollection
+# per color: green for days we were in the market (inMkt[t], so the day's
+# return was earned), red for days we were out. Neighbouring segments share
+# their end points, so the curve is continuous.
+
+# Long histories have far more days than the plot has pixels, so curves are
+# downsampled first: the days are split into buckets and only the lowest
+# and highest day of each bucket are kept, which keeps every spike visible.
+# The days around every trade are always kept, so the colors stay exact.
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.collections import LineCollection
+
+
+# Indexes of the days to keep when drawing y with about maxPoints points:
+# the min and max of each bucket, plus the first and last day.
+def minMaxIndexes(y, maxPoints=4000):
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= maxPoints:
+        return np.arange(n)
+    size = -(-n // max(1, maxPoints // 2))       # days per bucket
+    numBuckets = -(-n // size)
+    padded = np.full(numBuckets * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(numBuckets, size)
+    start = np.arange(numBuckets) * size
+    lo = start + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), 1)
+    hi = start + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), 1)
+    return np.unique(np.concatenate([lo, hi, [0, n - 1]]))
+
+
+# Draw a curve as a LineCollection per color. colorIdx[t] picks the color of
+# the segment ending at point t from colors. Returns the collections.
+def coloredLine(ax, x, y, colorIdx, colors, linewidth=1, zorder=3):
+    points = np.column_stack([x, y])
+    segments = np.stack([points[:-1], points[1:]], axis=1)
+    collections = []
+    for c, color in enumerate(colors):
+        mask = colorIdx[1:] == c
+        if mask.any():
+            lc = LineCollection(segments[mask], colors=color,
+                                linewidths=linewidth, zorder=zorder)
+            ax.add_collection(lc)
+            collections.append(lc)
+    ax.autoscale_view()
+    return collections
+
+
+# Plot the two-colored DBE equity curve and the buy and hold curve between
+# startDate and endDate (None = first/last day). eodDF is the per-day
+# dataframe of dbe_2.0.py (or dbe_export.dayDetail); it needs dbeRtnDay,
+# tkrRtnDay and inMkt. Both curves start at 1. Returns the axes.
+def plotDBE(eodDF, startDate=None, endDate=None, ax=None, maxPoints=4000,
+            colors=('r', 'g'), tkrColor='blue', logScale=False):
+    start = None if startDate is None else pd.Timestamp(startDate)
+    end = None if endDate is None else pd.Timestamp(endDate)
+    window = eodDF.loc[start:end]
+    dates = mdates.date2num(window.index.values)
+    inMkt = np.asarray(window['inMkt'], dtype=bool)
+
+    # Missing returns (the first day of the data) count as no change
+    dbe = np.cumprod(np.nan_to_num(
+        window['dbeRtnDay'].values.astype(np.float64), nan=1.0))
+    tkr = np.cumprod(np.nan_to_num(
+        window['tkrRtnDay'].values.astype(np.float64), nan=1.0))
+
+    if ax is None:
+        fig, ax = plt.subplots()
+
+    # Buy and hold underneath, DBE on top
+    keep = minMaxIndexes(tkr, maxPoints)
+    ax.plot(dates[keep], tkr[keep], color=tkrColor, linewidth=1, zorder=2)
+
+    # Keep the min/max days plus both sides of every trade
+    change = np.flatnonzero(inMkt[1:] != inMkt[:-1])
+    keep = np.union1d(minMaxIndexes(dbe, maxPoints),
+                      np.concatenate([change, change + 1]))
+    # The segment ending at a kept day spans several days. All of them have
+    # the same inMkt, since both sides of every trade are kept.
+    coloredLine(ax, dates[keep], dbe[keep], inMkt[keep].astype(int), colors)
+
+    ax.xaxis_date()
+    if logScale:
+        ax.set_yscale('log')
+    return ax
+
+
+# Heatmap of a grid result, rows = M, columns = N (the layout of the cagr,
+# trades and pctInMkt dataframes of dbe_loop_1.1.py). grid can also be a
+# 2-D array with Mrange and Nrange given. Returns the axes.
+def heatmap(grid, Mrange=None, Nrange=None, ax=None, title=None,
+            cmap='viridis'):
+    if isinstance(grid, pd.DataFrame):
+        Mrange, Nrange = grid.index, grid.columns
+    values = np.asarray(grid, dtype=np.float64)
+    Mvals = np.asarray(Mrange)
+    Nvals = np.asarray(Nrange)
+
+    if ax is None:
+        fig, ax = plt.subplots()
+    # Cell edges halfway between values (values need not be evenly spaced)
+    image = ax.pcolormesh(_edges(Nvals), _edges(Mvals), values, cmap=cmap,
+                          shading='flat')
+    ax.figure.colorbar(image, ax=ax)
+    ax.set_xlabel('N')
+    ax.set_ylabel('M')
+    if title:
+        ax.set_title(title)
+    return ax
+
+
+def _edges(vals):
+    vals = vals.astype(np.float64)
+    if len(vals) == 1:
+        return np.array([vals[0] - 0.5, vals[0] + 0.5])
+    mid = (vals[1:] + vals[:-1]) / 2
+    return np.concatenate([[2 * vals[0] - mid[0]], mid,
+                           [2 * vals[-1] - mid[-1]]])
@@ -0,0 +1,186 @@
+# Local price store for downloaded tickers.
+
+# The download cells fetch a ticker's whole history from Yahoo! every time,
+# one ticker at a time. Here every fetched ticker is kept on disk (one
+# binary store per ticker, the same format as dbe_data.py) and a refresh
+# only asks for the bars after the last stored date. Many tickers are
+# refreshed at the same time by a pool of threads, at most `workers`
+# requests in flight.
+
+# Adjusted closes of old bars change after every dividend or split. So a
+# refresh asks for the last stored day again, and if its adjusted close no
+# longer matches, the whole history of that ticker is downloaded again (from
+# start, or the first stored day if that is earlier or start is None). A
+# start date before the first stored day fetches the missing bars in front
+# (checked against the first stored day the same way).
+
+# Where the bars come from is up to the provider, any object with a method
+#   fetch(ticker, start, end) -> dataframe
+# returning daily bars (index = dates, columns 'Open', 'High', 'Low',
+# 'Close', 'Adj Close', 'Volume') from start to end inclusive (end None =
+# up to today). Included:
+#   YahooProvider    pandas_datareader, as in the download cells
+#   CsvUrlProvider   CSV files from a URL, e.g. a local server
+#   FrameProvider    dataframes already in memory, for testing
+
+# Import Modules
+import os
+import io
+import shutil
+import urllib.request
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import dbe_data
+
+# Default folder for the stored tickers
+priceDir = '.dbe_prices'
+
+priceColumns = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+###########################################################################
+# Providers
+
+class YahooProvider:
+
+    def __init__(self, source='yahoo'):
+        self.source = source
+
+    def fetch(self, ticker, start, end):
+        import pandas_datareader as web
+        return web.DataReader(ticker, self.source, start, end)
+
+
+# CSV in the Yahoo! download layout (Date, Open, High, Low, Close,
+# Adj Close, Volume) from a URL. url is a template with {ticker}, {start}
+# and {end} (YYYY-MM-DD, end empty for "up to today"). Rows outside
+# [start, end] are dropped, so a plain file server works too.
+class CsvUrlProvider:
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, ticker, start, end):
+        url = self.url.format(ticker=urllib.parse.quote(ticker),
+                              start=_day(start), end=_day(end))
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            df = pd.read_csv(io.BytesIO(response.read()), index_col=0,
+                             parse_dates=True)
+        return _window(df, start, end)
+
+
+# Bars from dataframes in memory, one per ticker.
+class FrameProvider:
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def fetch(self, ticker, start, end):
+        return _window(self.frames[ticker], start, end)
+
+
+def _day(date):
+    return '' if date is None else str(pd.Timestamp(date).date())
+
+
+def _window(df, start, end):
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+    return df.sort_index().loc[start:end]
+
+
+###########################################################################
+# Store
+
+# Folder of one ticker's store
+def tickerPath(ticker, store=priceDir):
+    safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in ticker)
+    return os.path.join(store, safe)
+
+
+# A stored ticker as a read-only dataframe (see dbe_data.readStore), or None
+# if it has not been fetched yet.
+def loadTicker(ticker, store=priceDir):
+    path = tickerPath(ticker, store)
+    if not os.path.isdir(path):
+        return None
+    return dbe_data.readStore(path)
+
+
+# Replace a ticker's store with df. The new store is written next to the
+# old one and then swapped in. Folders left over by an interrupted save are
+# removed first (dbe_data.writeStore keeps a store that is already there).
+def saveTicker(df, ticker, store=priceDir):
+    path = tickerPath(ticker, store)
+    for stale in (path + '.new', path + '.old'):
+        shutil.rmtree(stale, ignore_errors=True)
+    dbe_data.writeStore(df, path + '.new', meta={'ticker': ticker})
+    if not os.path.isfile(os.path.join(path + '.new', 'meta.json')):
+        raise OSError('Could not write the store {}.new'.format(path))
+    if os.path.isdir(path):
+        os.replace(path, path + '.old')
+    os.replace(path + '.new', path)
+    shutil.rmtree(path + '.old', ignore_errors=True)
+
+
+# True if the adjusted close of day in new no longer matches the stored one
+def _adjusted(new, old, day):
+    return day in new.index and not np.isclose(
+        new.loc[day, 'Adj Close'], old.loc[day, 'Adj Close'], rtol=1e-9)
+
+
+# Bring one ticker up to date, and back to start if the store begins later.
+# Returns the number of new bars.
+def refreshTicker(ticker, provider, store=priceDir, start=None, end=None):
+    old = loadTicker(ticker, store)
+    head = None
+    if old is not None and len(old) > 0:
+        old = old.copy()         # don't keep the memory map open
+        first, last = old.index[0], old.index[-1]
+        new = provider.fetch(ticker, last, end)
+        if start is not None and pd.Timestamp(start) < first:
+            head = provider.fetch(ticker, start, first)
+        # Adjusted closes changed since the last refresh: start over,
+        # without losing stored days before start
+        if _adjusted(new, old, last) or (head is not None and
+                                         _adjusted(head, old, first)):
+            old = head = None
+            since = first if start is None else min(pd.Timestamp(start),
+                                                    first)
+            new = provider.fetch(ticker, since, end)
+        else:
+            new = new[new.index > last]
+            if head is not None:
+                head = head[head.index < first]
+    else:
+        old = None
+        new = provider.fetch(ticker, start, end)
+
+    parts = [part for part in (head, old, new) if part is not None]
+    numNew = sum(len(part) for part in parts) - (0 if old is None
+                                                 else len(old))
+    if numNew == 0:
+        return 0
+    columns = [c for c in priceColumns
+               if all(c in part.columns for part in parts)]
+    saveTicker(pd.concat([part[columns] for part in parts]), ticker, store)
+    return numNew
+
+
+# Refresh many tickers at once, with at most workers requests in flight.
+# Returns a dataframe with the number of new bars (or the error) per ticker.
+def refresh(tickers, provider, store=priceDir, start=None, end=None,
+            workers=8):
+    def one(ticker):
+        try:
+            return (ticker, refreshTicker(ticker, provider, store, start, end),
+                    '')
+        except Exception as err:
+            return ticker, 0, '{}: {}'.format(type(err).__name__, err)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        rows = list(pool.map(one, tickers))
+    return pd.DataFrame(rows, columns=['ticker', 'newBars', 'error'])
@@ -0,0 +1,175 @@
+# Per-stage profiling for the DBE pipeline.
+
+# The library modules wrap each pipeline stage (loading, rolling max, signal
+# construction, shift/where steps, cumprod/CAGR, trade counting, export) in
+#
+#   with dbe_profile.stage('name'):
+#       ...
+#
+# When profiling is off (the default) stage() hands back one shared object
+# whose __enter__/__exit__ do nothing, so the hooks cost well under a
+# microsecond per call and can stay in production sweeps. Stages are only
+# entered once per M (or per file), never per day.
+
+# When profiling is on, each stage records wall time and number of calls,
+# and optionally the peak memory allocated inside it (through tracemalloc,
+# which slows things down). For long sweeps only every sampleEvery-th
+# configuration needs to be recorded; the grid engine loops over its
+# configurations (one M row of the grid each) through configs(), which calls
+# nextConfig() before each one. Stages outside that loop are always recorded.
+
+# Stages may be nested. A nested stage's time is also counted in the outer
+# stage, and the outer stage's peak memory still covers the nested one.
+
+# Only the calling process is recorded, so profile grids with workers=1.
+
+# Usage:
+#   dbe_profile.enable(memory=True, sampleEvery=10)
+#   ... run a grid ...
+#   print(dbe_profile.report())
+#   dbe_profile.saveReport('dbeProfile.json')
+
+# Import Modules
+import json
+import time
+import tracemalloc
+import pandas as pd
+
+enabled = False
+_memory = False
+_sampleEvery = 1
+_configCount = 0
+_sampledCount = 0
+_sampling = True
+_stats = {}           # stage name -> [calls, seconds, peak bytes]
+_open = []            # stages entered and not yet left, innermost last
+
+
+class _NoStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_noStage = _NoStage()
+
+
+class _Stage:
+
+    def __init__(self, name):
+        self.name = name
+        self.peak = 0         # highest traced memory seen before a reset
+
+    def __enter__(self):
+        if _memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # reset_peak() below would lose the outer stage's peak so far
+            if _open:
+                _open[-1].peak = max(_open[-1].peak, peak)
+            self.mem0 = current
+            tracemalloc.reset_peak()
+        _open.append(self)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        secs = time.perf_counter() - self.t0
+        _open.pop()
+        rec = _stats.setdefault(self.name, [0, 0.0, 0])
+        rec[0] += 1
+        rec[1] += secs
+        if _memory:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            rec[2] = max(rec[2], peak - self.mem0)
+            if _open:
+                _open[-1].peak = max(_open[-1].peak, peak)
+        return False
+
+
+# Context manager for one stage. Does nothing unless profiling is on and the
+# current configuration is sampled.
+def stage(name):
+    if enabled and _sampling:
+        return _Stage(name)
+    return _noStage
+
+
+# Mark the start of a new configuration, for sampling.
+def nextConfig():
+    global _configCount, _sampledCount, _sampling
+    if enabled:
+        _sampling = _configCount % _sampleEvery == 0
+        _configCount += 1
+        _sampledCount += _sampling
+
+
+# Mark the end of the configurations. Later stages are recorded again.
+def endConfigs():
+    global _sampling
+    _sampling = True
+
+
+# Loop over configurations: yields the values, calling nextConfig() before
+# each one and endConfigs() when the loop ends (also on break or error).
+def configs(values):
+    try:
+        for value in values:
+            nextConfig()
+            yield value
+    finally:
+        endConfigs()
+
+
+# Turn profiling on. memory=True also records the peak allocation of each
+# stage. sampleEvery=n records only every n-th configuration.
+def enable(memory=False, sampleEvery=1):
+    global enabled, _memory, _sampleEvery
+    reset()
+    enabled = True
+    _memory = memory
+    _sampleEvery = max(1, int(sampleEvery))
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global enabled, _memory
+    enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _memory = False
+
+
+def reset():
+    global _configCount, _sampledCount, _sampling
+    _stats.clear()
+    _open.clear()
+    _configCount = 0
+    _sampledCount = 0
+    _sampling = True
+
+
+# Summary table, slowest stage first. With sampling, the per-configuration
+# stages only cover the sampled configurations.
+def report():
+    rows = []
+    for name, (calls, secs, peak) in _stats.items():
+        rows.append(dict(stage=name, calls=calls, totalSecs=secs,
+                         meanMs=1000 * secs / calls, peakAllocMB=peak / 1e6))
+    table = pd.DataFrame(rows, columns=['stage', 'calls', 'totalSecs',
+                                        'meanMs', 'peakAllocMB'])
+    total = table['totalSecs'].sum()
+    table['pctTime'] = 100 * table['totalSecs'] / total if total else 0.0
+    table = table.sort_values('totalSecs', ascending=False)
+    return table.reset_index(drop=True)
+
+
+def saveReport(fileName):
+    info = dict(sampleEvery=_sampleEvery, configs=_configCount,
+                sampledConfigs=_sampledCount, memory=_memory,
+                stages=report().to_dict(orient='records'))
+    with open(fileName, 'w') as f:
+        json.dump(info, f, indent=1)
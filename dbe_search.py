@@ -0,0 +1,133 @@
+# Coarse-to-fine search for the best (M, N, reentryPct) of the DBE strategy.
+
+# The grid cells of dbe_loop_1.1.py evaluate every (M, N) pair. The CAGR
+# surface is made of broad plateaus (the README's M=138-142 / N=214 region),
+# so most of those cells are far from anything interesting. Here:
+#   1. a coarse grid is evaluated, every step-th M and N (about a quarter of
+#      the evaluation budget)
+#   2. the step is halved and the neighbours of the top cells (by CAGR) at
+#      that step are evaluated. This repeats down to a step of 1.
+#   3. at step 1 it keeps climbing: the neighbours of the top cells are
+#      evaluated until none are new, or the budget runs out.
+# reentryPct values (usually only a few) are searched one step at a time.
+
+# A cell is one (M, N, reentryPct) triple. The budget counts cells, and the
+# result lists every evaluated cell and the round it was evaluated in. Cells
+# of the same M are evaluated together with dbe_grid.statsForM, so each
+# round costs about one grid row per M it touches.
+
+# Import Modules
+import math
+import bisect
+import numpy as np
+import pandas as pd
+import dbe_grid
+
+
+# Search the (M, N, reentryPct) space. Mrange and Nrange are any increasing
+# sequences of values, reentryPcts None (no reentry) or a list. top is the
+# number of best cells refined in each round. Returns the best cell as a
+# dictionary and a dataframe of every evaluated cell, best first.
+def searchGrid(origDataDF, Mrange, Nrange, K, series='Adj Close',
+               reentryPcts=None, budget=5000, coarseCells=None, top=10):
+    Mvals = np.asarray(Mrange)
+    Nvals = np.asarray(Nrange)
+    pcts = [0] if reentryPcts is None else list(reentryPcts)
+    numM, numN, numP = len(Mvals), len(Nvals), len(pcts)
+
+    reach, tkrRtnDay, yrs = dbe_grid.gridInputs(origDataDF, K, series)
+    if reentryPcts is not None:
+        prices = origDataDF[series].values.astype(np.float64)
+        low = origDataDF['Low'].values.astype(np.float64)
+
+    done = {}       # (i, j, k) index into Mvals, Nvals, pcts -> results
+
+    # Evaluate new cells, as many as the budget allows
+    def evaluate(cells, rnd):
+        cells = [c for c in dict.fromkeys(cells) if c not in done]
+        cells = cells[:budget - len(done)]
+        byM = {}
+        for i, j, k in cells:
+            byM.setdefault(i, []).append((j, k))
+        for i, jk in byM.items():
+            js = sorted({j for j, k in jk})
+            ks = sorted({k for j, k in jk})
+            if reentryPcts is None:
+                res = dbe_grid.statsForM(reach, Mvals[i], Nvals[js],
+                                         tkrRtnDay, yrs, K)
+                res = np.asarray(res)[:, :, np.newaxis]
+            else:
+                res = dbe_grid.statsForMReentry(reach, Mvals[i], Nvals[js],
+                                                [pcts[k] for k in ks], prices,
+                                                low, tkrRtnDay, yrs, K)
+            row = {j: a for a, j in enumerate(js)}
+            col = {k: b for b, k in enumerate(ks)}
+            for j, k in jk:
+                done[i, j, k] = tuple(res[:, row[j], col[k]]) + (rnd,)
+        return len(cells)
+
+    # Best evaluated cells. NaN CAGRs go last, ties go to the smaller indexes.
+    def best(count):
+        def rank(c):
+            cagr = done[c][0]
+            return (cagr != cagr, -cagr if cagr == cagr else 0, c)
+        return sorted(done, key=rank)[:count]
+
+    # Coarse grid with about coarseCells cells. Along M and N half of the
+    # points are evenly spaced and half geometrically spaced, since results
+    # change fastest at small M and N.
+    if coarseCells is None:
+        coarseCells = max(1, budget // 4)
+    perAxis = max(2, math.isqrt(max(1, coarseCells // numP)))
+    sampled = [_coarseAxis(numM, perAxis), _coarseAxis(numN, perAxis),
+               list(range(numP))]
+    evaluate([(i, j, k) for i in sampled[0] for j in sampled[1]
+              for k in sampled[2]], 0)
+
+    # Refine around the top cells: along each axis, add the points halfway
+    # to the nearest sampled points on either side (the next point over once
+    # they are adjacent) and evaluate all the combinations.
+    rnd = 0
+    while len(done) < budget:
+        rnd += 1
+        cells = []
+        for cell in best(top):
+            near = [_between(sampled[a], cell[a]) for a in range(3)]
+            cells += [(i, j, k) for i in near[0] for j in near[1]
+                      for k in near[2]]
+        grown = False
+        for a in range(3):
+            points = sorted(set(sampled[a]).union(c[a] for c in cells))
+            grown |= len(points) > len(sampled[a])
+            sampled[a] = points
+        if evaluate(cells, rnd) == 0 and not grown:
+            break
+
+    rows = [dict(M=Mvals[i], N=Nvals[j], reentryPct=pcts[k], cagr=c,
+                 tradesPerYr=t, pctInMkt=p, round=r)
+            for (i, j, k), (c, t, p, r) in ((c, done[c]) for c in best(None))]
+    evaluated = pd.DataFrame(rows, columns=['M', 'N', 'reentryPct', 'cagr',
+                                            'tradesPerYr', 'pctInMkt',
+                                            'round'])
+    return rows[0], evaluated
+
+
+# Coarse points along an axis of n values: half evenly spaced, half
+# geometrically spaced, always including both ends.
+def _coarseAxis(n, count):
+    even = np.linspace(0, n - 1, count // 2 + 1)
+    geom = np.geomspace(1, n, count - count // 2 + 1) - 1
+    idx = np.round(np.concatenate([even, geom])).astype(int)
+    return sorted(set(idx.tolist()))
+
+
+# The point x itself and the points halfway to its sampled neighbours on
+# either side (the neighbours themselves once they are adjacent).
+def _between(points, x):
+    pos = bisect.bisect_left(points, x)
+    near = [x]
+    if pos > 0:
+        near.append((points[pos - 1] + x) // 2)
+    if pos + 1 < len(points):
+        near.append((points[pos + 1] + x + 1) // 2)
+    return near
@@ -0,0 +1,108 @@
+# Results for every tracking start K in one pass.
+
+# The scripts fix one start point K, so checking how much the results depend
+# on the start date means a full rerun per K. But the signal does not depend
+# on K at all; K only decides where we start counting. With a start at K:
+#   * we hold on days t > K where the signal at t-1 was 'bull', so the final
+#     cumulative return is the product of the DBE daily returns from day K+1
+#     to the end. A running product taken from the end backwards gives that
+#     for every K at once.
+#   * trades are the entry on day K+1 (if the signal at K is 'bull') plus
+#     every change of the signal after K, a running count from the end.
+#   * pctInMkt counts 'bull' days from K on, again a running count.
+# So the whole "results vs. start date" curve costs about as much as one
+# backtest. The numbers equal a dbe_grid.runGrid run with that K (the
+# product is taken in the other order, so CAGR can differ in the last digit).
+
+# The reentry rule is not covered: its state depends on K, which breaks the
+# running totals.
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import dbe_grid
+import dbe_newhi
+
+
+# Years from every day to the last day, the same as
+# dbe_grid.yearsSince(dates, K)[-1] for each K.
+def yearsToEnd(dates):
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    return (dates[-1] - dates) / (dbe_grid.days_per_yr *
+                                  np.timedelta64(1, 'D'))
+
+
+# Running total along the last axis, taken from the end backwards, with an
+# extra 0 (or 1 for a product) at the end for "nothing left".
+def _fromEnd(x, op):
+    out = np.empty(x.shape[:-1] + (x.shape[-1] + 1,), dtype=x.dtype)
+    out[..., -1] = 0 if op is np.add else 1
+    op.accumulate(x[..., ::-1], axis=-1, out=out[..., -2::-1])
+    return out
+
+
+# Final cumulative return, number of trades and number of 'bull' days for
+# every start K in Kvals and every row of a signal grid. Returns three
+# (rows, K) arrays.
+def sweepStats(signal, tkrRtnDay, Kvals):
+    Kvals = np.asarray(Kvals)
+    n = signal.shape[-1]
+
+    # DBE daily return, day t earns tkrRtnDay[t] if signal[t-1] is 'bull'
+    dbeRtnDay = np.ones(signal.shape)
+    dbeRtnDay[..., 1:] = np.where(signal[..., :-1], tkrRtnDay[1:], 1.0)
+    cumRtn = _fromEnd(dbeRtnDay, np.multiply)[..., Kvals + 1]
+
+    # Signal changes on days 1 to n-2 (a change on the last day has no
+    # trade yet)
+    change = np.zeros(signal.shape, dtype=np.int64)
+    change[..., 1:n-1] = signal[..., 1:n-1] != signal[..., :n-2]
+    numTrades = ((signal[..., Kvals] & (Kvals < n - 1)) +
+                 _fromEnd(change, np.add)[..., Kvals + 1])
+
+    numBulls = _fromEnd(signal.astype(np.int64), np.add)[..., Kvals]
+    return cumRtn, numTrades, numBulls
+
+
+# CAGR, trades per year and percent in the market for every (M, N) and
+# every start in Kvals, as 3-D arrays indexed [M, N, K].
+def startSweep(origDataDF, Mrange, Nrange, Kvals, series='Adj Close'):
+    Kvals = np.asarray(Kvals)
+    prices = origDataDF[series].values.astype(np.float64)
+    reach = dbe_newhi.highReach(prices)
+    tkrRtnDay = dbe_grid.dailyReturns(origDataDF['Adj Close'].values)
+    yrs = yearsToEnd(origDataDF.index.values)[Kvals]
+    daysTracked = len(prices) - Kvals
+
+    out = np.empty((3, len(Mrange), len(Nrange), len(Kvals)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, M in enumerate(Mrange):
+            dSinceNewHi = dbe_grid.daysSinceNewHi(
+                dbe_newhi.isNewHi(reach, M))
+            signal = dbe_grid.signalGrid(dSinceNewHi, Nrange)
+            cumRtn, numTrades, numBulls = sweepStats(signal, tkrRtnDay,
+                                                     Kvals)
+            out[0, i] = cumRtn**(1 / yrs)
+            out[1, i] = numTrades / yrs
+            out[2, i] = 100 * numBulls / daysTracked
+    cagr, trades, pctInMkt = out
+    return cagr, trades, pctInMkt
+
+
+# Results against start date for one (M, N). Kvals defaults to every day
+# from M+N on, every stride-th day. Returns a dataframe indexed by the start
+# date, with the ticker's own CAGR from the same start for comparison.
+def startCurve(origDataDF, M, N, Kvals=None, stride=1, series='Adj Close'):
+    numDays = len(origDataDF)
+    if Kvals is None:
+        Kvals = np.arange(M + N, numDays - 1, stride)
+    Kvals = np.asarray(Kvals)
+    cagr, trades, pctInMkt = startSweep(origDataDF, [M], [N], Kvals, series)
+
+    adjClose = origDataDF['Adj Close'].values.astype(np.float64)
+    yrs = yearsToEnd(origDataDF.index.values)[Kvals]
+    return pd.DataFrame({'K': Kvals, 'yrs': yrs,
+                         'cagr': cagr[0, 0], 'tradesPerYr': trades[0, 0],
+                         'pctInMkt': pctInMkt[0, 0],
+                         'tkrCAGR': (adjClose[-1] / adjClose[Kvals])**(1/yrs)},
+                        index=origDataDF.index[Kvals])
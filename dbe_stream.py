@@ -0,0 +1,217 @@
+# Chunked (out-of-core) DBE backtest for long bar histories.
+
+# dbe_grid.py and dbe_export.py need the whole price history in memory, and
+# dbe_2.0.py adds a dozen columns to it. With minute bars that is tens of
+# millions of rows per ticker. DbeStream instead takes the bars a chunk at a
+# time and carries just enough state across the chunk boundaries:
+#
+#   * the last M-1 prices, so the rolling M-bar max of the next chunk sees
+#     its full window
+#   * the index of the last new M-bar high (days since new high) and of the
+#     last reentry dip
+#   * the last bar's signal, inMkt and reentry marker (inMkt lags the
+#     signal by a bar, and the reentry rule extends each run by a bar)
+#   * the last adjusted close and the running cumulative return, trade and
+#     bull counts from the tracking start K on
+#
+# Within a chunk everything is vectorized the same way as in dbe_grid.py,
+# with one row per N value. So peak memory is set by the chunk size (times
+# the number of N values), not by the length of the history.
+
+# The results equal the in-memory path bar for bar: the per-chunk columns
+# match dbe_export.detailColumns and the statistics match dbe_grid.runGrid
+# and runReentryGrid (those take the final return with np.prod instead of a
+# running product, so CAGR can differ in the last digit).
+
+# Chunks can come from a binary store (storeChunks, the dbe_data.py format,
+# memory-mapped so only one chunk is read at a time), a CSV file
+# (csvChunks) or a dataframe already in memory (frameChunks).
+
+# Import Modules
+import os
+import json
+import numpy as np
+import pandas as pd
+import dbe_data
+import dbe_grid
+
+
+class DbeStream:
+
+    def __init__(self, M, Nvals, K, reentryPct=0):
+        # Parameters (same meaning as in dbe_2.0.py). Nvals can be one N or
+        # a list, every N is a row.
+        self.M = M
+        self.Nvals = np.atleast_1d(np.asarray(Nvals))
+        self.K = K
+        self.reentryPct = reentryPct
+        numRows = len(self.Nvals)
+
+        self.t = -1                    # index of the last bar
+        self.tail = np.empty(0)        # last M-1 prices
+        self.lastHi = -1               # index of the last new high
+        self.lastDip = -1              # index of the last reentry dip
+        self.bull = np.zeros(numRows, dtype=bool)     # last bar, per N
+        self.inMkt = np.zeros(numRows, dtype=bool)
+        self.marker = np.zeros(numRows, dtype=bool)   # reentry marker
+        self.defined = np.zeros(numRows, dtype=bool)  # marker not NaN
+        self.lastAdj = np.nan          # last adjusted close
+        self.startDate = None          # date at index K
+        self.startAdj = np.nan         # adjusted close at index K
+        self.lastDate = None
+
+        # Running statistics from index K on
+        self.dbeCumRtn = np.ones(numRows)
+        self.numTrades = np.zeros(numRows, dtype=np.int64)
+        self.numBulls = np.zeros(numRows, dtype=np.int64)
+        self.numDays = 0
+
+    # Absorb the next chunk of bars (a dataframe with the series, 'Low' and
+    # 'Adj Close' columns). Returns a dictionary with the chunk's columns
+    # of dbe_export.detailColumns; signal, inMkt, reentrySignal, dbeRtnDay
+    # and dbeCumRtn have one row per N.
+    def update(self, chunk, series='Adj Close'):
+        prices = chunk[series].values.astype(np.float64)
+        low = chunk['Low'].values.astype(np.float64)
+        adjClose = chunk['Adj Close'].values.astype(np.float64)
+        dates = chunk.index.values
+        numBars = len(prices)
+        if numBars == 0:
+            return None
+        idx = np.arange(self.t + 1, self.t + 1 + numBars)
+        K = self.K
+        Nvals = self.Nvals[:, np.newaxis]
+
+        # Rolling M-bar max, with the end of the last chunk in front
+        ext = np.concatenate([self.tail, prices])
+        MdayHi = dbe_grid.rollingMax(ext, self.M)[len(self.tail):]
+        self.tail = ext[-(self.M - 1):] if self.M > 1 else ext[:0]
+        newHi = prices == MdayHi
+
+        # Days since the last new high and the signal for every N
+        lastHi = np.maximum.accumulate(np.where(newHi, idx, self.lastHi))
+        dSinceNewHi = idx - lastHi
+        bull = dSinceNewHi[np.newaxis, :] < Nvals
+
+        # One bar lag between the signal and being in the market
+        inMkt = _shifted(bull, self.bull)
+        inMkt &= idx > K
+
+        # Reentry: the same rule as dbe_grid.reentryGrid. The marker is True
+        # when there was a dip since the signal turned 'bear' (and not
+        # before K), otherwise False after the first new high.
+        reentrySignal = np.zeros(bull.shape, dtype=bool)
+        if self.reentryPct:
+            dip = dbe_grid.dipGrid(low, MdayHi, [self.reentryPct])[0]
+            lastDip = np.maximum.accumulate(np.where(dip, idx, self.lastDip))
+            start = np.maximum(lastHi[np.newaxis, :] + Nvals, K)
+            marker = lastDip[np.newaxis, :] >= start
+            defined = marker | (lastHi >= 0)
+            reentrySignal = (defined & _shifted(defined, self.defined) &
+                             (marker | _shifted(marker, self.marker)))
+            inMkt |= reentrySignal
+            self.lastDip = lastDip[-1]
+            self.marker = marker[:, -1]
+            self.defined = defined[:, -1]
+
+        # Returns, and the running statistics from K on
+        tkrRtnDay = adjClose / np.concatenate([[self.lastAdj],
+                                               adjClose[:-1]])
+        dbeRtnDay = np.where(inMkt, tkrRtnDay, 1.0)
+        tracked = idx >= K
+        first = np.argmax(tracked) if tracked.any() else numBars
+        dbeCumRtn = np.full(bull.shape, np.nan)
+        if first < numBars:
+            # Continue the running product, in the same order as cumprod
+            cum = np.concatenate([self.dbeCumRtn[:, np.newaxis],
+                                  dbeRtnDay[:, first:]], axis=1)
+            dbeCumRtn[:, first:] = np.cumprod(cum, axis=1)[:, 1:]
+            self.dbeCumRtn = dbeCumRtn[:, -1].copy()
+            self.numTrades += np.count_nonzero(
+                (inMkt != _shifted(inMkt, self.inMkt))[:, first:] &
+                (idx[first:] > K), axis=1)
+            self.numBulls += np.count_nonzero(bull[:, first:], axis=1)
+            self.numDays += numBars - first
+            if idx[first] == K:
+                self.startDate = np.datetime64(dates[first], 'D')
+                self.startAdj = adjClose[first]
+            self.lastDate = np.datetime64(dates[-1], 'D')
+
+        self.t += numBars
+        self.lastHi = lastHi[-1]
+        self.bull = bull[:, -1]
+        self.inMkt = inMkt[:, -1]
+        self.lastAdj = adjClose[-1]
+
+        return {'dates': dates, 'MdayHi': MdayHi, 'newHi': newHi,
+                'rePt': self.reentryPct * MdayHi, 'dSinceNewHi': dSinceNewHi,
+                'signal': bull, 'inMkt': inMkt,
+                'reentrySignal': reentrySignal, 'tkrRtnDay': tkrRtnDay,
+                'dbeRtnDay': dbeRtnDay, 'dbeCumRtn': dbeCumRtn}
+
+    # Statistics so far, one row per N. NaN until we are past the tracking
+    # start K.
+    def stats(self):
+        out = pd.DataFrame(index=pd.Index(self.Nvals, name='N'),
+                           columns=['dbeCumRtn', 'cagr', 'tradesPerYr',
+                                    'pctInMkt', 'tkrCAGR', 'yrs'],
+                           dtype=np.float64)
+        if self.numDays == 0:
+            return out
+        yrs = ((self.lastDate - self.startDate) /
+               (dbe_grid.days_per_yr * np.timedelta64(1, 'D')))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['dbeCumRtn'] = self.dbeCumRtn
+            out['cagr'] = self.dbeCumRtn**(1 / yrs)
+            out['tradesPerYr'] = self.numTrades / yrs
+            out['pctInMkt'] = 100 * self.numBulls / self.numDays
+            out['tkrCAGR'] = (self.lastAdj / self.startAdj)**(1 / yrs)
+        out['yrs'] = yrs
+        return out
+
+
+# Rows of x moved one bar later, with first in front
+def _shifted(x, first):
+    return np.concatenate([first[:, np.newaxis], x[:, :-1]], axis=1)
+
+
+###########################################################################
+# Chunk sources
+
+# Chunks of a dataframe already in memory
+def frameChunks(df, chunkBars=250000):
+    for start in range(0, len(df), chunkBars):
+        yield df.iloc[start:start + chunkBars]
+
+
+# Chunks of a binary store written by dbe_data.writeStore. Values and dates
+# are both memory-mapped, so only the current chunk is read from disk.
+def storeChunks(path, chunkBars=250000):
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != dbe_data.storeVersion:
+        raise ValueError('Store {} has an old layout'.format(path))
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    dates = np.load(os.path.join(path, 'dates.npy'), mmap_mode='r')
+    for start in range(0, meta['numDays'], chunkBars):
+        stop = start + chunkBars
+        index = pd.DatetimeIndex(np.array(dates[start:stop]),
+                                 name=meta['indexName'])
+        yield pd.DataFrame(np.array(values[:, start:stop].T), index=index,
+                           columns=meta['columns'])
+
+
+# Chunks of a CSV file in the Yahoo! download layout (date first)
+def csvChunks(fileName, chunkBars=250000):
+    with pd.read_csv(fileName, index_col=0, parse_dates=True,
+                     chunksize=chunkBars) as reader:
+        yield from reader
+
+
+# Run one M (and reentryPct) for every N over a sequence of chunks. Returns
+# the statistics dataframe of DbeStream.stats().
+def streamBacktest(chunks, M, Nvals, K, reentryPct=0, series='Adj Close'):
+    stream = DbeStream(M, Nvals, K, reentryPct)
+    for chunk in chunks:
+        stream.update(chunk, series)
+    return stream.stats()
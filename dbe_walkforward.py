@@ -0,0 +1,122 @@
+# Walk-forward optimization of the DBE strategy.
+
+# The README's M=138-142 / N=214 optimum is fit over the whole history. Here
+# (M, N) is chosen on a rolling training window, the winner is applied to the
+# next (out-of-sample) test window, and the out-of-sample pieces are chained
+# into one equity curve.
+
+# Signals only depend on past prices, so the new highs and signals for every
+# (M, N) are computed once on the full history. For each M we keep the running
+# sum of the strategy's log returns, sampled only at the fold boundaries. The
+# log return of any window is then the difference of two numbers, so each
+# fold just compares a few (M, N) arrays and a 50-fold walk-forward costs
+# about the same as one grid.
+
+# Windows are in market days. A window [s, e) counts the returns of days s to
+# e-1. As in the scripts, the return of day t is earned if the signal at the
+# close of day t-1 was 'bull'. So on the first day of a test window we hold
+# the position the new winner called at the previous close.
+
+# Import Modules
+import numpy as np
+import pandas as pd
+import dbe_grid
+import dbe_newhi
+
+
+# Fold boundaries: (trainStart, trainEnd = testStart, testEnd) day indexes.
+# The first training window starts at K. Rolling windows keep trainDays of
+# history, anchored windows always start at K.
+def foldBounds(numDays, K, trainDays, testDays, anchored=False):
+    folds = []
+    testStart = K + trainDays
+    while testStart < numDays:
+        testEnd = min(testStart + testDays, numDays)
+        trainStart = K if anchored else testStart - trainDays
+        folds.append((trainStart, testStart, testEnd))
+        testStart = testEnd
+    return folds
+
+
+# Daily log return earned by each row of a signal grid: day t gets the log of
+# the ticker return if signal[t-1] is 'bull', otherwise 0. Returns the running
+# sum with a leading 0, so the sum over days [s, e) is run[e] - run[s].
+def runningLogRtn(signal, logRtnDay):
+    run = np.zeros(signal.shape[:-1] + (signal.shape[-1] + 1,))
+    contrib = np.where(signal[..., :-1], logRtnDay[1:], 0.0)
+    np.cumsum(contrib, axis=-1, out=run[..., 2:])
+    return run
+
+
+# Run the walk-forward. Returns a dataframe with one row per fold (window
+# dates, winning M and N, in- and out-of-sample CAGR) and the chained
+# out-of-sample equity curve as a series.
+def walkForward(origDataDF, Mrange, Nrange, trainDays, testDays, K=None,
+                anchored=False, series='Adj Close'):
+    Mvals = np.asarray(Mrange)
+    Nvals = np.asarray(Nrange)
+    if K is None:
+        K = Mvals.max() + Nvals.max()     # room for the first M-day high and N
+
+    reach, tkrRtnDay, _ = dbe_grid.gridInputs(origDataDF, K, series)
+    logRtnDay = np.log(tkrRtnDay)
+    dates = origDataDF.index.values
+    numDays = len(dates)
+
+    folds = foldBounds(numDays, K, trainDays, testDays, anchored)
+    if not folds:
+        raise ValueError('Not enough data for one training window')
+
+    # Running log returns at the fold boundaries for every (M, N)
+    bounds = np.unique(np.ravel(folds))
+    where = {b: i for i, b in enumerate(bounds)}
+    runAt = np.empty((len(Mvals), len(Nvals), len(bounds)))
+    for i, M in enumerate(Mvals):
+        dSinceNewHi = dbe_grid.daysSinceNewHi(dbe_newhi.isNewHi(reach, M))
+        signal = dbe_grid.signalGrid(dSinceNewHi, Nvals)
+        runAt[i] = runningLogRtn(signal, logRtnDay)[:, bounds]
+
+    # Years spanned by a window [s, e): from the close before s to the close
+    # of e-1
+    def years(s, e):
+        return dbe_grid.yearsSince(dates[[max(s - 1, 0), e - 1]], 0)[-1]
+
+    rows = []
+    pieces = []
+    for trainStart, testStart, testEnd in folds:
+        a, b, c = where[trainStart], where[testStart], where[testEnd]
+
+        # Pick the (M, N) with the best training return
+        train = runAt[:, :, b] - runAt[:, :, a]
+        i, j = np.unravel_index(np.argmax(train), train.shape)
+        test = runAt[i, j, c] - runAt[i, j, b]
+
+        # Out-of-sample daily returns of the winner
+        dSinceNewHi = dbe_grid.daysSinceNewHi(
+            dbe_newhi.isNewHi(reach, Mvals[i]))
+        bull = dSinceNewHi[testStart - 1:testEnd - 1] < Nvals[j]
+        pieces.append(np.where(bull, tkrRtnDay[testStart:testEnd], 1.0))
+
+        rows.append(dict(trainStart=dates[trainStart],
+                         trainEnd=dates[testStart - 1],
+                         testStart=dates[testStart],
+                         testEnd=dates[testEnd - 1],
+                         M=Mvals[i], N=Nvals[j],
+                         trainCAGR=np.exp(train[i, j])**(
+                             1 / years(trainStart, testStart)),
+                         testCAGR=np.exp(test)**(
+                             1 / years(testStart, testEnd))))
+
+    foldsDF = pd.DataFrame(rows)
+    firstTest = folds[0][1]
+    equity = pd.Series(np.cumprod(np.concatenate(pieces)),
+                       index=origDataDF.index[firstTest:], name='dbeCumRtn')
+    return foldsDF, equity
+
+
+# CAGR of the chained out-of-sample equity curve, measured from the close
+# before the first test day.
+def oosCAGR(origDataDF, equity):
+    start = origDataDF.index.get_loc(equity.index[0]) - 1
+    yrs = dbe_grid.yearsSince(origDataDF.index.values[start:], 0)[-1]
+    return equity.iloc[-1]**(1 / yrs)
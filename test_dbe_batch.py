@@ -0,0 +1,48 @@
+# Checks for the batch backtest in dbe_batch.py: sources that can't be read
+# (no 'Data' sheet, not a spreadsheet, a cut off spreadsheet) are skipped and
+# listed in attrs['failed'], and the good ones still give the same results
+# as dbe_grid, with one worker and with a process pool.
+
+# Run with pytest, or as a script: python test_dbe_batch.py
+
+# Import Modules
+import os
+import tempfile
+import numpy as np
+import dbe_batch
+import dbe_bench
+import dbe_grid
+
+Mrange, Nrange, K = range(5, 30, 4), range(5, 40, 6), 200
+
+
+def writeSources(folder, df):
+    df.to_csv(os.path.join(folder, 'good.csv'))
+    df.to_excel(os.path.join(folder, 'sheet.xlsx'), sheet_name='Prices')
+    with open(os.path.join(folder, 'sheet.xlsx'), 'rb') as f:
+        workbook = f.read()
+    with open(os.path.join(folder, 'cut.xlsx'), 'wb') as f:
+        f.write(workbook[:len(workbook) // 2])
+    with open(os.path.join(folder, 'text.xlsx'), 'w') as f:
+        f.write('not a spreadsheet')
+
+
+def test_badSourcesSkipped():
+    df = dbe_bench.randomWalk(1000, seed=1)
+    cagr = dbe_grid.runReentryGrid(df, Mrange, Nrange, [0], K)[0]
+    with tempfile.TemporaryDirectory() as folder:
+        writeSources(folder, df)
+        for workers in (1, 2):
+            results = dbe_batch.runBatchGrid(folder, Mrange, Nrange, K,
+                                             workers=workers)
+            assert set(results['ticker']) == {'good'}
+            assert np.allclose(results['cagr'], cagr.ravel(), rtol=1e-12)
+            failed = results.attrs['failed']
+            assert sorted(os.path.basename(s) for s in failed) == [
+                'cut.xlsx', 'sheet.xlsx', 'text.xlsx']
+            assert all(e.startswith('SourceError') for e in failed.values())
+
+
+if __name__ == '__main__':
+    test_badSourcesSkipped()
+    print('dbe_batch checks passed')
@@ -0,0 +1,82 @@
+# Checks for the job runner in dbe_cli.py: a job file with a scenario of
+# every mode runs without errors, the output files land next to the job
+# file (not in the working directory), and the grid and risk modes give the
+# same best cell as dbe_grid, with the results cache and with reentry. A
+# ticker source goes through the dbe_prices store in the job's folder.
+
+# Run with pytest, or as a script: python test_dbe_cli.py
+
+# Import Modules
+import os
+import json
+import pathlib
+import tempfile
+import numpy as np
+import pandas as pd
+import dbe_bench
+import dbe_cli
+import dbe_grid
+
+Mrange, Nrange, pcts, K = range(5, 30), range(5, 40), [0, 0.97, 0.999], 200
+
+job = {
+    'defaults': {'data': 'walk.csv', 'K': K},
+    'scenarios': [
+        {'name': 'signal', 'mode': 'signal', 'M': 17, 'N': 5,
+         'reentryPct': 0.97, 'out': 'detail.csv'},
+        {'name': 'ticker', 'mode': 'signal', 'data': 'walkTicker', 'M': 17,
+         'N': 5, 'reentryPct': 0.97},
+        {'name': 'grid', 'mode': 'grid', 'M': '5:30', 'N': '5:40',
+         'reentryPct': pcts, 'out': 'grid.csv', 'cache': 'results.sqlite'},
+        {'name': 'cached', 'mode': 'grid', 'M': '5:30', 'N': '5:40',
+         'reentryPct': pcts, 'cache': 'results.sqlite'},
+        {'name': 'risk', 'mode': 'risk', 'M': '5:30', 'N': '5:40',
+         'reentryPct': pcts},
+        {'name': 'search', 'mode': 'search', 'M': '5:30', 'N': '5:40',
+         'reentryPct': pcts, 'budget': 200},
+        {'name': 'bootstrap', 'mode': 'bootstrap', 'M': 17, 'N': 5,
+         'reentryPct': 0.97, 'numPaths': 20},
+        {'name': 'startsweep', 'mode': 'startsweep', 'M': 17, 'N': 5,
+         'stride': 100, 'out': 'sweep.csv'},
+        {'name': 'plot', 'mode': 'plot', 'M': 17, 'N': 5}]}
+
+
+def test_jobFile():
+    df = dbe_bench.randomWalk(3000, seed=1)
+    cagr = dbe_grid.runReentryGrid(df, Mrange, Nrange, pcts, K)[0]
+    i, j, k = np.unravel_index(np.nanargmax(cagr), cagr.shape)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as jobDir, \
+            tempfile.TemporaryDirectory() as runDir:
+        df.to_csv(os.path.join(jobDir, 'walk.csv'))
+        url = pathlib.Path(jobDir).as_uri() + '/{ticker}.csv'
+        jobFile = os.path.join(jobDir, 'job.json')
+        with open(jobFile, 'w') as f:
+            json.dump(dict(job, data={'walkTicker': {'ticker': 'walk',
+                                                     'url': url}}), f)
+        os.chdir(runDir)
+        try:
+            assert dbe_cli.main([jobFile, '--json', 'results.json']) == 0
+        finally:
+            os.chdir(cwd)
+
+        results = pd.read_json(os.path.join(runDir, 'results.json'))
+        assert list(results['name']) == [s['name'] for s in job['scenarios']]
+        for name in ('detail.csv', 'grid.csv', 'results.sqlite', 'sweep.csv',
+                     'dbePlot.png', '.dbe_prices'):
+            assert os.path.exists(os.path.join(jobDir, name))
+        assert os.listdir(runDir) == ['results.json']
+
+        results = results.set_index('name')
+        assert np.isclose(results.loc['ticker', 'cagr'],
+                          results.loc['signal', 'cagr'], rtol=1e-12)
+        for name in ('grid', 'cached', 'risk'):
+            best = results.loc[name]
+            assert (best['M'], best['N'], best['reentryPct']) == (
+                Mrange[i], Nrange[j], pcts[k])
+            assert np.isclose(best['cagr'], cagr[i, j, k], rtol=1e-12)
+
+
+if __name__ == '__main__':
+    test_jobFile()
+    print('dbe_cli checks passed')
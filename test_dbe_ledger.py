@@ -0,0 +1,48 @@
+# Checks for the trade ledger in dbe_ledger.py: the trades of every
+# configuration match a plain loop over the inMkt column of dbe_backtest,
+# also when the reentry rule already has us in the market on day K.
+
+# Run with pytest, or as a script: python test_dbe_ledger.py
+
+# Import Modules
+import numpy as np
+import dbe_backtest
+import dbe_bench
+import dbe_ledger
+
+
+# (entry, exit, open, reason, rtn) of every trade, one day at a time
+def loopTrades(df, M, N, K, reentryPct):
+    bt = dbe_backtest.DbeBacktest(df, M, N, K, reentryPct)
+    inMkt, adjClose = bt.inMkt, bt.adjClose
+    trades = []
+    for t in range(K, len(inMkt)):
+        if inMkt[t] and (t == K or not inMkt[t - 1]):
+            entry = max(t - 1, K)
+            reason = 'signal' if t > K and bt.bull[entry] else 'reentry'
+        if inMkt[t] and (t == len(inMkt) - 1 or not inMkt[t + 1]):
+            trades.append((entry, t, t == len(inMkt) - 1, reason,
+                           adjClose[t] / adjClose[entry]))
+    return trades
+
+
+def test_ledgerMatchesLoop():
+    df = dbe_bench.randomWalk(3000, seed=1)
+    configs = dbe_ledger.gridConfigs(range(5, 30, 4), range(5, 40, 6),
+                                     [0, 0.97, 0.999])
+    for K in (200, 250):
+        ledger = dbe_ledger.runLedger(df, configs, K)
+        assert (ledger['entry'] == K).any()
+        for c, (M, N, reentryPct) in enumerate(configs):
+            want = loopTrades(df, M, N, K, reentryPct)
+            got = ledger[ledger['config'] == c]
+            assert len(got) == len(want)
+            for row, trade in zip(got.itertuples(), want):
+                assert (row.entry, row.exit, row.open,
+                        row.reason) == trade[:4]
+                assert np.isclose(row.rtn, trade[4], rtol=1e-12)
+
+
+if __name__ == '__main__':
+    test_ledgerMatchesLoop()
+    print('dbe_ledger checks passed')
@@ -0,0 +1,73 @@
+# Checks that the live (one bar at a time) calculation in dbe_live.py gives
+# the same results as the batch calculation in dbe_grid.py, bar for bar, and
+# that saving and loading the state partway through changes nothing.
+
+# Run with pytest, or as a script: python test_dbe_live.py
+
+# Import Modules
+import os
+import tempfile
+import numpy as np
+import dbe_data
+import dbe_export
+import dbe_grid
+import dbe_live
+
+sampleFile = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'snp500data_2019-6-18.xlsx')
+
+# (M, N, K, reentryPct) to check
+configs = [(107, 134, 250, 0.9), (122, 214, 250, 0), (5, 10, 250, 0.97),
+           (300, 20, 1000, 0.99)]
+
+
+def sampleData():
+    return dbe_data.loadPrices(sampleFile)
+
+
+# Feed the whole history through DbeSignal, saving and loading the state
+# after resumeAt bars. Returns the rows and the final statistics.
+def liveRun(df, M, N, K, reentryPct, resumeAt):
+    live = dbe_live.DbeSignal(M, N, K, reentryPct)
+    rows = live.updateFromDF(df.iloc[:resumeAt])
+    with tempfile.TemporaryDirectory() as tmp:
+        stateFile = os.path.join(tmp, 'dbeState.json')
+        live.save(stateFile)
+        live = dbe_live.DbeSignal.load(stateFile)
+    rows += live.updateFromDF(df.iloc[resumeAt:])
+    return rows, live.stats()
+
+
+def checkConfig(df, M, N, K, reentryPct):
+    rows, stats = liveRun(df, M, N, K, reentryPct, len(df) // 2)
+    cols = dbe_export.detailColumns(df, M, N, K, reentryPct)
+    cagr, trades, pctInMkt = dbe_grid.runReentryGrid(df, [M], [N],
+                                                     [reentryPct], K)
+
+    # Bar for bar
+    signal = np.array([{'bull': 1, 'bear': 0}.get(r['signal'], -1)
+                       for r in rows])
+    assert np.array_equal(signal, cols['signal'])
+    assert np.array_equal([r['dSinceNewHi'] for r in rows],
+                          cols['dSinceNewHi'])
+    assert np.array_equal([r['inMkt'] for r in rows], cols['inMkt'])
+    assert np.array_equal([r['reentrySignal'] for r in rows],
+                          cols['reentrySignal'])
+    assert np.allclose([r['dbeCumRtn'] for r in rows], cols['dbeCumRtn'],
+                       rtol=1e-12, equal_nan=True)
+
+    # Final statistics
+    assert np.isclose(stats['dbeCAGR'], cagr[0, 0, 0], rtol=1e-12)
+    assert np.isclose(stats['tradesPerYr'], trades[0, 0, 0], rtol=1e-12)
+    assert np.isclose(stats['pctInMkt'], pctInMkt[0, 0, 0], rtol=1e-12)
+
+
+def test_liveMatchesBatch():
+    df = sampleData()
+    for M, N, K, reentryPct in configs:
+        checkConfig(df, M, N, K, reentryPct)
+
+
+if __name__ == '__main__':
+    test_liveMatchesBatch()
+    print('dbe_live checks passed')
@@ -0,0 +1,88 @@
+# Checks for the grid results cache in dbe_memo.py: cached runs give the
+# same numbers as dbe_grid, and a second run over the same cells computes
+# nothing (no grid stage shows up in the dbe_profile report).
+
+# Run with pytest, or as a script: python test_dbe_memo.py
+
+# Import Modules
+import os
+import tempfile
+import numpy as np
+import dbe_bench
+import dbe_grid
+import dbe_memo
+import dbe_profile
+
+
+# Stages that ran during fn(), from the dbe_profile report
+def stagesRun(fn):
+    dbe_profile.enable()
+    try:
+        fn()
+        return set(dbe_profile.report()['stage'])
+    finally:
+        dbe_profile.disable()
+
+
+def test_secondRunComputesNothing():
+    df = dbe_bench.randomWalk(3000, seed=1)
+    Mrange, Nrange, K = range(5, 40), range(5, 40, 5), 200
+    want = dbe_grid.runGrid(df, Mrange, Nrange, K)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = dbe_memo.ResultCache(os.path.join(tmp, 'results.sqlite'))
+        try:
+            first = []
+            assert 'newHi' in stagesRun(lambda: first.extend(
+                dbe_memo.runGridCached(df, Mrange, Nrange, K, cache=cache)))
+            second = []
+            assert stagesRun(lambda: second.extend(
+                dbe_memo.runGridCached(df, Mrange, Nrange, K,
+                                       cache=cache))) == set()
+            for w, a, b in zip(want, first, second):
+                assert np.array_equal(w.values, a.values)
+                assert np.array_equal(w.values, b.values)
+
+            # A wider N range only computes the new N values
+            more = dbe_memo.runGridCached(df, Mrange, range(5, 50, 5), K,
+                                          cache=cache)
+            want = dbe_grid.runGrid(df, Mrange, range(5, 50, 5), K)
+            for w, a in zip(want, more):
+                assert np.array_equal(w.values, a.values)
+        finally:
+            cache.close()
+
+
+def test_reentryCached():
+    df = dbe_bench.randomWalk(3000, seed=1)
+    Mrange, Nrange, pcts, K = range(5, 30), range(5, 40, 5), [0, 0.97], 200
+    want = dbe_grid.runReentryGrid(df, Mrange, Nrange, pcts, K)
+    with tempfile.TemporaryDirectory() as tmp:
+        fileName = os.path.join(tmp, 'results.sqlite')
+        dbe_memo.runGridCached(df, Mrange, Nrange, K, reentryPcts=pcts,
+                               cache=fileName)
+        got = []
+        assert stagesRun(lambda: got.extend(dbe_memo.runGridCached(
+            df, Mrange, Nrange, K, reentryPcts=pcts, cache=fileName))) == set()
+        for w, g in zip(want, got):
+            assert np.array_equal(w, g)
+
+
+# The plain grid needs no 'Low' column, with or without the cache
+def test_noLowColumn():
+    df = dbe_bench.randomWalk(1000, seed=1)[['Adj Close']]
+    Mrange, Nrange, K = range(5, 30), range(5, 40, 5), 200
+    want = dbe_grid.runGrid(df, Mrange, Nrange, K)
+    with tempfile.TemporaryDirectory() as tmp:
+        fileName = os.path.join(tmp, 'results.sqlite')
+        for _ in range(2):
+            got = dbe_memo.runGridCached(df, Mrange, Nrange, K,
+                                         cache=fileName)
+            for w, g in zip(want, got):
+                assert np.array_equal(w.values, g.values)
+
+
+if __name__ == '__main__':
+    test_secondRunComputesNothing()
+    test_reentryCached()
+    test_noLowColumn()
+    print('dbe_memo checks passed')
@@ -0,0 +1,65 @@
+# Checks for the risk metrics in dbe_metrics.py: worstTrade and longestOut
+# match a plain loop over each row, also when the reentry rule already has
+# us in the market on day K, and cagr and tradesPerYr match dbe_grid.
+
+# Run with pytest, or as a script: python test_dbe_metrics.py
+
+# Import Modules
+import numpy as np
+import dbe_bench
+import dbe_grid
+import dbe_metrics
+import dbe_newhi
+
+
+# worstTrade and longestOut of one inMkt row, one day at a time
+def loopStats(inMkt, tkrRtnDay, K):
+    held = inMkt[K:]
+    equity = np.cumprod(np.where(held, tkrRtnDay[K:], 1.0))
+    worst, longest, out = np.inf, 0, 0
+    for t in range(len(held)):
+        if held[t] and (t == 0 or not held[t - 1]):
+            before = equity[t - 1] if t > 0 else 1.0
+        if held[t] and (t == len(held) - 1 or not held[t + 1]):
+            worst = min(worst, equity[t] / before)
+        out = 0 if held[t] else out + 1
+        longest = max(longest, out)
+    return (np.nan if np.isinf(worst) else worst), longest
+
+
+def test_reentryOpenAtK():
+    df = dbe_bench.randomWalk(3000, seed=1)
+    Mrange, Nrange, pcts = range(5, 30), range(5, 40), [0, 0.97, 0.999]
+    reach, tkrRtnDay, yrs = dbe_grid.gridInputs(df, 0, 'Adj Close')
+    prices = df['Adj Close'].values
+    low = df['Low'].values
+    for K in (200, 250):
+        risk = dbe_metrics.runRiskGrid(df, Mrange, Nrange, K,
+                                       reentryPcts=pcts)
+        cagr, trades, _ = dbe_grid.runReentryGrid(df, Mrange, Nrange, pcts,
+                                                  K)
+        assert np.allclose(risk['cagr'], cagr, rtol=1e-12)
+        assert np.allclose(risk['tradesPerYr'], trades, rtol=1e-12)
+
+        numOpen = 0
+        for i, M in enumerate(Mrange):
+            dSinceNewHi = dbe_grid.daysSinceNewHi(dbe_newhi.isNewHi(reach,
+                                                                    M))
+            inMkt = dbe_grid.inMktGrid(dbe_grid.signalGrid(dSinceNewHi,
+                                                           Nrange), K)
+            dip = dbe_grid.dipGrid(low, dbe_grid.rollingMax(prices, M), pcts)
+            for k in range(len(pcts)):
+                rows = inMkt | dbe_grid.reentryGrid(dSinceNewHi, dip[k:k+1],
+                                                    Nrange, K)[0]
+                numOpen += np.count_nonzero(rows[:, K])
+                for j, row in enumerate(rows):
+                    worst, longest = loopStats(row, tkrRtnDay, K)
+                    assert np.isclose(risk['worstTrade'][i, j, k], worst,
+                                      rtol=1e-12, equal_nan=True)
+                    assert risk['longestOut'][i, j, k] == longest
+        assert numOpen > 0
+
+
+if __name__ == '__main__':
+    test_reentryOpenAtK()
+    print('dbe_metrics checks passed')
@@ -0,0 +1,85 @@
+# Checks for the local price store in dbe_prices.py: refreshes append the
+# new bars, fetch the missing bars in front of the store for an earlier
+# start date, start over when adjusted closes changed, and a store folder
+# left over by an interrupted save is never swapped in.
+
+# Run with pytest, or as a script: python test_dbe_prices.py
+
+# Import Modules
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import dbe_bench
+import dbe_prices
+
+
+def sampleData():
+    df = dbe_bench.randomWalk(400, seed=1)
+    df.index = pd.date_range('2000-01-03', periods=len(df), freq='D',
+                             name='Date')
+    return df
+
+
+def checkStored(store, want):
+    got = dbe_prices.loadTicker('TKR', store)
+    assert got.index.equals(want.index)
+    assert np.array_equal(got.values, want[got.columns].values)
+
+
+def test_refresh():
+    df = sampleData()
+    dates = df.index
+    with tempfile.TemporaryDirectory() as store:
+        # First refresh, then the days after the stored ones
+        provider = dbe_prices.FrameProvider({'TKR': df.iloc[:300]})
+        assert dbe_prices.refreshTicker('TKR', provider, store,
+                                        start=dates[100]) == 200
+        provider.frames['TKR'] = df
+        assert dbe_prices.refreshTicker('TKR', provider, store,
+                                        start=dates[100]) == 100
+        checkStored(store, df.iloc[100:])
+
+        # An earlier start fetches the bars in front
+        assert dbe_prices.refreshTicker('TKR', provider, store,
+                                        start=dates[20]) == 80
+        checkStored(store, df.iloc[20:])
+        assert dbe_prices.refreshTicker('TKR', provider, store,
+                                        start=dates[20]) == 0
+
+        # Adjusted closes changed (a dividend): the whole history again,
+        # keeping the stored days before a later start
+        changed = df.copy()
+        changed['Adj Close'] *= 0.99
+        provider.frames['TKR'] = changed
+        assert dbe_prices.refreshTicker('TKR', provider, store) == 380
+        checkStored(store, changed.iloc[20:])
+        changed['Adj Close'] *= 0.99
+        assert dbe_prices.refreshTicker('TKR', provider, store,
+                                        start=dates[50]) == 380
+        checkStored(store, changed.iloc[20:])
+        changed['Adj Close'] *= 0.99
+        assert dbe_prices.refreshTicker('TKR', provider, store,
+                                        start=dates[0]) == len(df)
+        checkStored(store, changed)
+
+
+def test_staleNewStore():
+    df = sampleData()
+    with tempfile.TemporaryDirectory() as store:
+        provider = dbe_prices.FrameProvider({'TKR': df.iloc[:200]})
+        dbe_prices.refreshTicker('TKR', provider, store)
+        # A save interrupted after writing the new store
+        dbe_prices.saveTicker(df.iloc[:50], 'TKR', store + '/stale')
+        os.replace(dbe_prices.tickerPath('TKR', store + '/stale'),
+                   dbe_prices.tickerPath('TKR', store) + '.new')
+
+        provider.frames['TKR'] = df
+        assert dbe_prices.refreshTicker('TKR', provider, store) == 200
+        checkStored(store, df)
+
+
+if __name__ == '__main__':
+    test_refresh()
+    test_staleNewStore()
+    print('dbe_prices checks passed')
@@ -0,0 +1,89 @@
+# Checks for the chunked backtest in dbe_stream.py: whatever the chunk size
+# (down to one bar, and sizes that don't line up with M or N) and whatever
+# the chunk source (dataframe, binary store, CSV file), the per-bar columns
+# equal dbe_backtest.DbeBacktest and the statistics equal DbeBacktest.stats
+# and dbe_grid.runReentryGrid, with and without reentry.
+
+# Run with pytest, or as a script: python test_dbe_stream.py
+
+# Import Modules
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import dbe_backtest
+import dbe_bench
+import dbe_data
+import dbe_grid
+import dbe_stream
+
+M, Nvals, K = 17, [5, 12, 40], 200
+chunkSizes = [1, 7, 16, 97, 1000, 5000]
+
+# Columns of DbeStream.update with one row per N
+rowColumns = ['signal', 'inMkt', 'reentrySignal', 'dbeRtnDay', 'dbeCumRtn']
+
+
+# Sources of the same bars: name -> function(chunkBars) giving the chunks,
+# and the bars as the sources read them back
+def chunkSources(df, folder):
+    storePath = os.path.join(folder, 'walk')
+    dbe_data.writeStore(df, storePath)
+    csvFile = os.path.join(folder, 'walk.csv')
+    df.to_csv(csvFile)
+    return {
+        'frame': (lambda n: dbe_stream.frameChunks(df, n), df),
+        'store': (lambda n: dbe_stream.storeChunks(storePath, n),
+                  dbe_data.readStore(storePath)),
+        'csv': (lambda n: dbe_stream.csvChunks(csvFile, n),
+                pd.read_csv(csvFile, index_col=0, parse_dates=True))}
+
+
+# All the chunks through one DbeStream. Returns the columns, joined, and the
+# statistics.
+def streamRun(chunks, reentryPct):
+    stream = dbe_stream.DbeStream(M, Nvals, K, reentryPct)
+    parts = [stream.update(chunk) for chunk in chunks]
+    cols = {name: np.concatenate([p[name] for p in parts], axis=-1)
+            for name in parts[0] if name != 'dates'}
+    return cols, stream.stats()
+
+
+def checkSource(makeChunks, df, reentryPct):
+    bts = [dbe_backtest.DbeBacktest(df, M, N, K, reentryPct) for N in Nvals]
+    cagr, trades, pctInMkt = dbe_grid.runReentryGrid(df, [M], Nvals,
+                                                     [reentryPct], K)
+    for chunkBars in chunkSizes:
+        cols, stats = streamRun(makeChunks(chunkBars), reentryPct)
+        for name in ('MdayHi', 'newHi', 'rePt', 'dSinceNewHi', 'tkrRtnDay'):
+            assert np.array_equal(cols[name], getattr(bts[0], name),
+                                  equal_nan=True), (chunkBars, name)
+        for j, bt in enumerate(bts):
+            want = dict(bt.columns(rowColumns), signal=bt.bull)
+            for name in rowColumns:
+                assert np.allclose(cols[name][j], want[name], rtol=1e-12,
+                                   equal_nan=True), (chunkBars, name)
+            btStats = bt.stats()
+            row = stats.iloc[j]
+            for name, btName in (('dbeCumRtn', 'dbeCumRtn'),
+                                 ('cagr', 'dbeCAGR'), ('yrs', 'yrs'),
+                                 ('tradesPerYr', 'tradesPerYr'),
+                                 ('pctInMkt', 'pctInMkt'),
+                                 ('tkrCAGR', 'tkrCAGR')):
+                assert np.isclose(row[name], btStats[btName], rtol=1e-12)
+        assert np.allclose(stats['cagr'], cagr[0, :, 0], rtol=1e-12)
+        assert np.allclose(stats['tradesPerYr'], trades[0, :, 0], rtol=1e-12)
+        assert np.allclose(stats['pctInMkt'], pctInMkt[0, :, 0], rtol=1e-12)
+
+
+def test_streamMatchesInMemory():
+    df = dbe_bench.randomWalk(3000, seed=1)
+    with tempfile.TemporaryDirectory() as folder:
+        for name, (makeChunks, data) in chunkSources(df, folder).items():
+            for reentryPct in (0, 0.97):
+                checkSource(makeChunks, data, reentryPct)
+
+
+if __name__ == '__main__':
+    test_streamMatchesInMemory()
+    print('dbe_stream checks passed')